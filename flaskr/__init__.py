@@ -1,6 +1,13 @@
 from flaskr import pages
+from flaskr.backend import create_backend
 
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+# Number of proxies in front of the app that append the client's address to
+# X-Forwarded-For (PROXY_FIX_X_FOR config key). App Engine's front end is one; set it
+# to 0 when clients connect directly, so they cannot pick their own address.
+PROXY_FIX_X_FOR = 1
 
 # import logging
 # logging.basicConfig(level=logging.DEBUG)
@@ -25,11 +32,17 @@ def create_app(test_config=None):
         # Load the test config if passed in.
         app.config.from_mapping(test_config)
 
-    #> Ibby: Here you should create everything that should only be created once (i.e. backend)
+    # request.remote_addr is the client's address, not the proxy's, so the rate limits
+    # count each client separately.
+    proxies = app.config.get("PROXY_FIX_X_FOR", PROXY_FIX_X_FOR)
+    if proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies)
 
-    # TODO(Project 1): Make additional modifications here for logging in, backends
-    # and additional endpoints.
+    # The backend (and its pooled storage client) is created once per process and
+    # shared by every request. See create_backend for the storage config keys.
+    backend = create_backend(app.config)
+    app.extensions["backend"] = backend
 
-    pages.make_endpoints(app)
+    pages.make_endpoints(app, backend)
 
     return app
@@ -1,6 +1,12 @@
 from google.cloud import storage
-import hashlib, os, logging
-import json
+from flaskr.blobstore import GcsBlobStore, LocalBlobStore, PreconditionFailed, make_gcs_client
+from flaskr.translations import TranslationCache, WORD_PATTERN
+from flaskr.deltas import apply_delta, make_delta
+from flaskr.images import ImageCache, IMAGE_LIST_TTL, SIGNED_URL_SECONDS
+from flaskr.username_filter import UsernameFilter, FILTER_FP_RATE, FILTER_MAX_BYTES, FILTER_REFRESH_SECONDS
+from flaskr.passwords import PasswordHasher, SCRYPT_N, HASH_WORKERS, HASH_QUEUE_LIMIT, is_scrypt_hash
+from concurrent.futures import ThreadPoolExecutor
+import hashlib, os, logging, threading
 from werkzeug.utils import secure_filename
 
 DEFAULT_IMAGE_URL = "https://storage.cloud.google.com/wikis-content/DEFAULT%20IMG.png"
@@ -9,6 +15,31 @@ SITE_SECRET = "siam"
 # Content bucket folders
 USER_PASSWORD_FOLDER = "users-data/"
 UPLOADED_PAGES_FOLDER = "uploaded-pages/"
+FLASHCARDS_FOLDER = "flashcards/"
+ABOUT_IMAGES_FOLDER = "About-content/"
+
+# Flashcards grouped by first letter: flashcard-decks/<letter> maps card names to
+# contributions (see flaskr.flashcard.get_deck)
+FLASHCARD_DECKS_FOLDER = "flashcard-decks/"
+
+# Manifest holding one summary per uploaded page, kept up to date on every page write
+PAGE_CATALOG = "catalog/pages.json"
+
+# Per-user index of edits made by the user and edits made on the user's pages
+EDIT_INBOX_FOLDER = "edit-inbox/"
+
+# Written once the inboxes of edits made before inboxes existed have been built
+# (see Backend.migrate_edit_inboxes)
+EDIT_INBOX_MIGRATION = "migrations/edit-inbox"
+
+# Append-only edit history: one object per edit at page-edits/<page name>/<index>
+PAGE_EDITS_FOLDER = "page-edits/"
+
+# Content revisions of each page: page-revisions/<page name>/<revision>. A revision
+# records the accepted edit that produced it; every SNAPSHOT_INTERVAL revisions it
+# also holds the full content, so rebuilding an old revision reads a bounded chain.
+PAGE_REVISIONS_FOLDER = "page-revisions/"
+SNAPSHOT_INTERVAL = 20
 
 # Uploaded page access keys
 PAGE_EDITS = "Edits"
@@ -16,16 +47,327 @@ PAGE_NAME = "Name"
 PAGE_CONTENT = "Content"
 EDIT_CONTENT = "Content"
 PAGE_AUTHOR = "Author"
+PAGE_IMAGE = "Image"
 DATE = "Date"
 EDIT_STATUS = "Status"
 EDIT_AUTHOR = "Editor"
+EDIT_COUNT = "EditCount"
+LAST_EDIT = "LastEdit"
+PAGE_REVISION = "Revision"
+# Revision whose content was uploaded rather than produced by an accepted edit. It has
+# no revision record until the page moves past it.
+UPLOAD_REVISION = "UploadRevision"
+EDIT_BASE = "Base"
+EDIT_DELTA = "Delta"
+REVISION_EDIT = "Edit"
 EN_ES_BUCKET_ADDRESS = 'translations/en-es.json'
 
+# Page catalog summary keys (in addition to name, author, date and image)
+CONTENT_SIZE = "Size"
+LAST_EDIT_STATUS = "LastEditStatus"
+PAGE_SUMMARY_FIELDS = [
+    PAGE_NAME, PAGE_AUTHOR, DATE, PAGE_IMAGE, CONTENT_SIZE, LAST_EDIT_STATUS
+]
+
+# Edit inbox keys. Outgoing holds the user's own edits, Incoming the edits made on
+# the user's pages. Entries are identified by page name and position in the page's edits.
+INBOX_OUTGOING = "Outgoing"
+INBOX_INCOMING = "Incoming"
+EDIT_INDEX = "Index"
+
+# Ways get_all_uploaded_pages handles a page that fails to download
+RAISE_ERRORS = "raise"
+SKIP_ERRORS = "skip"
+
 # Page edit status keys
 PENDING = 1
 ACCEPTED = 2
 DECLINED = 3
 
+# Precomputed translations of each page, kept when precompute_translations is on:
+# page-variants/<lang>/<page name> holds the page with its content translated to lang.
+PAGE_VARIANTS_FOLDER = "page-variants/"
+VARIANT_LANGUAGES = {"ES": EN_ES_BUCKET_ADDRESS}
+VARIANT_SOURCE = "SourceGeneration"
+VARIANT_DICTIONARY = "DictionaryGeneration"
+VARIANT_WORDS = "Words"
+
+# translation-changes/<dictionary key> lists the last TRANSLATION_CHANGES_KEPT writes of
+# a dictionary as {From, To, Words}: the generations before and after the write and the
+# first words of the phrases it added. A variant made with an older dictionary is still
+# current if none of the changes since then added a phrase starting with one of its words.
+TRANSLATION_CHANGES_FOLDER = "translation-changes/"
+TRANSLATION_CHANGES_KEPT = 100
+CHANGE_FROM = "From"
+CHANGE_TO = "To"
+CHANGE_WORDS = "Words"
+
+# Uploaded page files are read in chunks of UPLOAD_CHUNK_BYTES and rejected as soon as
+# they grow past the configured maximum (MAX_UPLOAD_BYTES).
+UPLOAD_CHUNK_BYTES = 64 * 1024
+MAX_UPLOAD_BYTES = 1024 * 1024
+
+# Storage engines selectable with the STORAGE_ENGINE config key
+GCS_ENGINE = "gcs"
+LOCAL_ENGINE = "local"
+
+
+class UploadTooLarge(ValueError):
+    '''
+        Raised when an uploaded page file is larger than the backend's max_upload_bytes.
+    '''
+
+
+def page_edit_key(page_name, index):
+    '''
+        Page_edit_key returns the key of the edit object at position index of a page's edits.
+        Indexes are zero padded so that listing the folder returns edits in order.
+    '''
+    return f"{PAGE_EDITS_FOLDER}{page_name}/{index:08d}"
+
+
+def page_variant_key(lang, page_name):
+    '''
+        Page_variant_key returns the key of the precomputed lang translation of a page.
+    '''
+    return f"{PAGE_VARIANTS_FOLDER}{lang}/{page_name}"
+
+
+def translation_changes_key(translation_bucket):
+    '''
+        Translation_changes_key returns the key of the change log of a translation dictionary.
+    '''
+    return TRANSLATION_CHANGES_FOLDER + translation_bucket
+
+
+def changed_words(changes, since, current):
+    '''
+        Changed_words returns the set of first words added to a dictionary between its
+        generations since and current, following the writes recorded in changes.
+
+        Returns:
+            The set of words, or None if a write in between was not recorded (it was made
+            without add_translations_bulk or dropped from the log).
+    '''
+    links = {change[CHANGE_FROM]: change for change in changes}
+    words = set()
+    generation = since
+    while generation != current:
+        change = links.get(generation)
+        if change is None or change[CHANGE_TO] <= generation:
+            return None
+        words.update(change[CHANGE_WORDS])
+        generation = change[CHANGE_TO]
+    return words
+
+
+def page_revision_key(page_name, revision):
+    '''
+        Page_revision_key returns the key of the record of a page's content revision.
+    '''
+    return f"{PAGE_REVISIONS_FOLDER}{page_name}/{revision:08d}"
+
+
+def split_page(page_data):
+    '''
+        Split_page separates a page's json object into its header and its embedded edits.
+
+        Pages only hold their content and a small header: the number of edits (EditCount),
+        the editor, date and status of the last one (LastEdit) and the number of accepted
+        edits applied to the content (Revision). The edits themselves
+        live in separate objects (see page_edit_key). Pages written before this layout
+        still embed all edits in an "Edits" list; those are removed from the header and
+        returned so the caller can move them out.
+
+        Args:
+            page_data: the page's json object. It is modified in place.
+
+        Returns:
+            A tuple of the page header and the list of embedded edits ([] for pages using
+            the separate edit objects).
+    '''
+    edits = page_data.pop(PAGE_EDITS, None)
+    if edits is not None:
+        page_data[EDIT_COUNT] = len(edits)
+        page_data[LAST_EDIT] = edit_header(edits[-1]) if edits else None
+    page_data.setdefault(EDIT_COUNT, 0)
+    page_data.setdefault(LAST_EDIT, None)
+    page_data.setdefault(PAGE_REVISION, 0)
+    return page_data, edits or []
+
+
+def edit_header(edit_data):
+    '''
+        Edit_header returns the part of an edit kept in its page's header.
+    '''
+    return {
+        EDIT_AUTHOR: edit_data[EDIT_AUTHOR],
+        DATE: edit_data[DATE],
+        EDIT_STATUS: edit_data[EDIT_STATUS]
+    }
+
+
+def has_pending_edit(page_data):
+    '''
+        Has_pending_edit returns True if the last edit of the page is waiting for its
+        author's review.
+    '''
+    return last_edit_status(page_data) == PENDING
+
+
+def last_edit_status(page_data):
+    '''
+        Last_edit_status returns the status of a page's last edit, or None if the page was
+        never edited. It accepts both page headers and pages with embedded edits.
+    '''
+    edits = page_data.get(PAGE_EDITS)
+    if edits is not None:
+        return edits[-1][EDIT_STATUS] if edits else None
+    last_edit = page_data.get(LAST_EDIT)
+    return last_edit[EDIT_STATUS] if last_edit else None
+
+
+def empty_edit_inbox():
+    '''
+        Empty_edit_inbox returns the edit inbox of a user without any edits.
+    '''
+    return {INBOX_OUTGOING: [], INBOX_INCOMING: []}
+
+
+def merge_edit_inbox(inbox, scanned):
+    '''
+        Merge_edit_inbox adds the entries of the inbox scanned from the pages that are
+        missing in the stored inbox. Scanned entries are older, so they go first.
+
+        Returns:
+            The merged inbox, or None if the stored inbox already had every entry.
+    '''
+    if inbox is None:
+        return scanned
+    changed = False
+    for box in (INBOX_OUTGOING, INBOX_INCOMING):
+        known = {(entry[PAGE_NAME], entry[EDIT_INDEX]) for entry in inbox[box]}
+        missing = [
+            entry for entry in scanned[box]
+            if (entry[PAGE_NAME], entry[EDIT_INDEX]) not in known
+        ]
+        if missing:
+            inbox[box] = missing + inbox[box]
+            changed = True
+    return inbox if changed else None
+
+
+def page_summary(page_data):
+    '''
+        Page_summary returns the catalog entry for an uploaded page.
+
+        Args:
+            page_data: the page's json object.
+
+        Returns:
+            A dictionary with the page's name, author, date, display image, content size in
+            bytes and the status of its last edit (None if it was never edited).
+    '''
+    return {
+        PAGE_NAME: page_data[PAGE_NAME],
+        PAGE_AUTHOR: page_data[PAGE_AUTHOR],
+        DATE: page_data[DATE],
+        PAGE_IMAGE: page_data[PAGE_IMAGE],
+        CONTENT_SIZE: len(page_data[PAGE_CONTENT].encode("utf-8")),
+        LAST_EDIT_STATUS: last_edit_status(page_data)
+    }
+
+
+def create_backend(config):
+    '''
+        Create_backend builds a Backend from the flask app configuration.
+
+        STORAGE_ENGINE selects where the wiki data lives: "gcs" (default) uses the google cloud
+        storage buckets USER_BUCKET and CONTENT_BUCKET through one pooled client holding up to
+        STORAGE_POOL_SIZE connections, "local" stores each bucket as a folder below STORAGE_ROOT
+        using the same key layout.
+
+        STORAGE_COMPRESSION (on by default) gzips the objects written to the content bucket.
+        Objects are decompressed transparently on read, whether they were compressed or not.
+
+        TRANSLATION_REFRESH_SECONDS sets how often the cached translation dictionary is
+        revalidated against the stored one, PAGE_FETCH_WORKERS how many pages full scans
+        download in parallel and MAX_UPLOAD_BYTES the largest accepted page file.
+        PRECOMPUTE_TRANSLATIONS turns on precomputed page translations (see get_wiki_page).
+
+        Passwords are hashed with scrypt at cost PASSWORD_HASH_COST by PASSWORD_HASH_WORKERS
+        worker processes, with at most PASSWORD_HASH_QUEUE hashes waiting at once (see
+        flaskr/passwords.py).
+
+        Sign ins for unknown usernames are answered from an in-memory filter of the existing
+        usernames, rebuilt every USERNAME_FILTER_REFRESH_SECONDS, sized for a false positive
+        rate of USERNAME_FILTER_FP_RATE and using at most USERNAME_FILTER_BYTES bytes (see
+        flaskr/username_filter.py).
+
+        The about page images are listed at most every ABOUT_IMAGES_TTL_SECONDS and served
+        from signed URLs valid for SIGNED_URL_SECONDS (see flaskr/images.py).
+
+        The backend is meant to be created once per process (see create_app) and shared by
+        all requests.
+
+        Args:
+            config: the flask app config (or any mapping).
+
+        Returns:
+            A Backend instance.
+    '''
+    user_bucket = config.get("USER_BUCKET", "user-pw-bucket")
+    content_bucket = config.get("CONTENT_BUCKET", "wikis-content")
+    engine = config.get("STORAGE_ENGINE", GCS_ENGINE)
+    compress = config.get("STORAGE_COMPRESSION", True)
+    options = {
+        "translation_refresh":
+            config.get("TRANSLATION_REFRESH_SECONDS", 30),
+        "fetch_workers":
+            config.get("PAGE_FETCH_WORKERS", 8),
+        "max_upload_bytes":
+            config.get("MAX_UPLOAD_BYTES", MAX_UPLOAD_BYTES),
+        "precompute_translations":
+            config.get("PRECOMPUTE_TRANSLATIONS", False),
+        "password_hasher":
+            PasswordHasher(n=config.get("PASSWORD_HASH_COST", SCRYPT_N),
+                           workers=config.get("PASSWORD_HASH_WORKERS",
+                                              HASH_WORKERS),
+                           max_queue=config.get("PASSWORD_HASH_QUEUE",
+                                                HASH_QUEUE_LIMIT)),
+        "username_filter_fp_rate":
+            config.get("USERNAME_FILTER_FP_RATE", FILTER_FP_RATE),
+        "username_filter_bytes":
+            config.get("USERNAME_FILTER_BYTES", FILTER_MAX_BYTES),
+        "username_filter_refresh":
+            config.get("USERNAME_FILTER_REFRESH_SECONDS",
+                       FILTER_REFRESH_SECONDS),
+        "image_list_ttl":
+            config.get("ABOUT_IMAGES_TTL_SECONDS", IMAGE_LIST_TTL),
+        "signed_url_seconds":
+            config.get("SIGNED_URL_SECONDS", SIGNED_URL_SECONDS),
+    }
+
+    if engine == LOCAL_ENGINE:
+        root = config.get("STORAGE_ROOT", "wiki-data")
+        return Backend(
+            user_bucket,
+            content_bucket,
+            user_store=LocalBlobStore(os.path.join(root, user_bucket)),
+            content_store=LocalBlobStore(os.path.join(root, content_bucket),
+                                         compress=compress),
+            **options)
+    if engine != GCS_ENGINE:
+        raise ValueError(f"Unknown storage engine: {engine}")
+    storage_client = make_gcs_client(config.get("STORAGE_POOL_SIZE", 10))
+    return Backend(user_bucket,
+                   content_bucket,
+                   content_store=GcsBlobStore(storage_client,
+                                              content_bucket,
+                                              compress=compress),
+                   storage_client=storage_client,
+                   **options)
+
 
 class Backend:
     '''
@@ -34,91 +376,527 @@ class Backend:
         The Backend class functions to retrieve the web application pages and images from the google cloud storage, 
         uploads files to the google cloud storage, authenticates a user who is trying to log in or sign up.
 
+        All storage access goes through two BlobStore objects (see flaskr/blobstore.py), so the
+        same code runs against google cloud storage or a local directory.
+
         Attributes:
-        storage_client: Initializes the google cloud storage client
         user_bucket: GCS bucket that stores users passwords
         content_bucket: GCS bucket that stores the application contents
+        user_store: BlobStore holding the user bucket's objects
+        content_store: BlobStore holding the content bucket's objects
         bucket_prefix: Attribute variable that stores the name of user data folder which contains users' passwords
         site_secret: Site secret used in hashing users' passwords
+        password_hasher: PasswordHasher used for new password hashes
     '''
 
     def __init__(self,
                  user_bucket="user-pw-bucket",
-                 content_bucket="wikis-content"):
+                 content_bucket="wikis-content",
+                 user_store=None,
+                 content_store=None,
+                 storage_client=None,
+                 translation_refresh=30,
+                 fetch_workers=8,
+                 max_upload_bytes=MAX_UPLOAD_BYTES,
+                 precompute_translations=False,
+                 password_hasher=None,
+                 username_filter_fp_rate=FILTER_FP_RATE,
+                 username_filter_bytes=FILTER_MAX_BYTES,
+                 username_filter_refresh=FILTER_REFRESH_SECONDS,
+                 image_list_ttl=IMAGE_LIST_TTL,
+                 signed_url_seconds=SIGNED_URL_SECONDS):
         ''' Initializes the instance of the backend class with the names of buckets entered.
         Args:
           user_bucket: This stands for the GCS bucket where we store users sensitive information such as passwords.
           content_bucket: This stands for the GCS bucket where we store the web application content.
+          user_store: BlobStore to use for the user bucket. Defaults to the GCS bucket user_bucket.
+          content_store: BlobStore to use for the content bucket. Defaults to the GCS bucket content_bucket,
+            with compression enabled.
+          storage_client: google cloud storage client shared by the default GCS stores. A new client
+            is created if it is not given.
+          translation_refresh: seconds between checks of the translation dictionary's generation.
+          fetch_workers: default number of pages downloaded in parallel by full scans.
+          max_upload_bytes: size limit of uploaded page files.
+          precompute_translations: whether page writes also store the translated variants of
+            the page (see get_wiki_page).
+          password_hasher: PasswordHasher hashing users' passwords. Defaults to scrypt with
+            the default cost and worker pool.
+          username_filter_fp_rate: false positive rate of the filter of existing usernames.
+          username_filter_bytes: memory budget of the filter of existing usernames.
+          username_filter_refresh: seconds between rebuilds of the filter of existing usernames.
+          image_list_ttl: seconds the listing of the about page images is reused.
+          signed_url_seconds: lifetime of the signed URLs of the about page images.
     
         '''
-        #>Ibby wrapping this is its own class would make this code + test code simpler to read
-        self.storage_client = storage.Client()
         self.user_bucket = user_bucket
         self.content_bucket = content_bucket
+
+        if user_store is None or content_store is None:
+            if storage_client is None:
+                storage_client = storage.Client()
+            if user_store is None:
+                user_store = GcsBlobStore(storage_client, user_bucket)
+            if content_store is None:
+                content_store = GcsBlobStore(storage_client,
+                                             content_bucket,
+                                             compress=True)
+        self.user_store = user_store
+        self.content_store = content_store
+
         # Ibby> Constants should be defined on the file level to make sure that future developers don't change them
-        self.bucket_prefix = "users-data/"
-        self.card_prefix = "flashcards/"
+        self.bucket_prefix = USER_PASSWORD_FOLDER
+        self.card_prefix = FLASHCARDS_FOLDER
+        self.deck_prefix = FLASHCARD_DECKS_FOLDER
+
+        self.translation_refresh = translation_refresh
+        self.fetch_workers = fetch_workers
+        self.max_upload_bytes = max_upload_bytes
+        self.precompute_translations = precompute_translations
+        self.password_hasher = password_hasher or PasswordHasher()
+        self.username_filter = UsernameFilter(user_store, USER_PASSWORD_FOLDER,
+                                              username_filter_fp_rate,
+                                              username_filter_bytes,
+                                              username_filter_refresh)
+        self.about_images = ImageCache(content_store, ABOUT_IMAGES_FOLDER,
+                                       image_list_ttl, signed_url_seconds)
+        # Outdated variants found by page views are rewritten one at a time, off the
+        # request path.
+        self._variant_executor = ThreadPoolExecutor(max_workers=1)
+        self._pending_variants = set()
+        self._pending_variants_lock = threading.Lock()
+        self._translation_changes = {}
+        self._translation_changes_lock = threading.Lock()
+        self._translation_caches = {}
+        self._translation_caches_lock = threading.Lock()
+        self._inboxes_migrated = False
+        self._inbox_migration_lock = threading.Lock()
+
+    def get_translations(self, translation_bucket=EN_ES_BUCKET_ADDRESS):
+        '''
+            Get_translations returns the translation dictionary stored at translation_bucket.
 
-    def get_content_bucket(self):
-        return self.storage_client.bucket(self.content_bucket)
+            The parsed dictionary is cached per process and only downloaded again when the
+            blob's generation changes (checked every translation_refresh seconds).
 
-    def get_content_blob(self, filename):
-        return self.get_content_bucket().blob(filename)
+            Returns:
+                A tuple of the dictionary and the generation of the blob it was read from.
+        '''
+        return self._translation_cache(translation_bucket).get()
+
+    def get_translator(self, translation_bucket=EN_ES_BUCKET_ADDRESS):
+        '''
+            Get_translator returns the Translator compiled from the dictionary stored at
+            translation_bucket, and the dictionary's generation. It is rebuilt only when
+            the dictionary changes.
+        '''
+        return self._translation_cache(translation_bucket).get_translator()
+
+    def _translation_cache(self, translation_bucket):
+        with self._translation_caches_lock:
+            cache = self._translation_caches.get(translation_bucket)
+            if cache is None:
+                cache = TranslationCache(self.content_store, translation_bucket,
+                                         self.translation_refresh)
+                self._translation_caches[translation_bucket] = cache
+        return cache
 
     def add_translations(self,
                          word1,
                          word2,
                          translation_bucket=EN_ES_BUCKET_ADDRESS):
-        jsonblob = self.get_content_blob(translation_bucket)
+        '''
+            Add_translations adds a single word1 -> word2 translation to the dictionary.
+            Existing translations are kept.
+        '''
+        self.add_translations_bulk([(word1, word2)], translation_bucket)
+
+    def add_translations_bulk(self,
+                              pairs,
+                              translation_bucket=EN_ES_BUCKET_ADDRESS):
+        '''
+            Add_translations_bulk adds many translations to the dictionary in one
+            read-modify-write.
 
-        with jsonblob.open("r") as json_file:
-            data = json.load(json_file)
+            The write is conditional on the dictionary's generation and retried if another
+            writer changed it in between, so concurrent ingestions do not lose entries.
+            Words that already have a translation keep it. The first words of the added
+            phrases are then recorded in the dictionary's change log (see
+            TRANSLATION_CHANGES_FOLDER), which keeps the page variants that do not use
+            them current.
 
-        with jsonblob.open("w") as json_file:
-            if word1 not in data:
-                data[word1] = word2
+            Args:
+                pairs: iterable of (word, translation) tuples.
+                translation_bucket: key of the translation dictionary.
 
-            json.dump(data, json_file)
+            Returns:
+                The number of translations that were added.
+        '''
+        pairs = list(pairs)
+        added = []
+
+        def merge():
+            data, generation = self.content_store.get_json(translation_bucket)
+            data = data if data is not None else {}
+            added.clear()
+            for word, translation in pairs:
+                if word not in data:
+                    data[word] = translation
+                    added.append(word)
+            if not added:
+                return generation, generation
+            return generation, self.content_store.put_json(
+                translation_bucket, data, if_generation_match=generation)
+
+        old_generation, new_generation = self.content_store.retry(merge)
+        if added:
+            self._invalidate_translations(translation_bucket)
+            self._log_translation_change(translation_bucket, old_generation,
+                                         new_generation, added)
+        return len(added)
+
+    def _log_translation_change(self, translation_bucket, old_generation,
+                                new_generation, words):
+        first_words = {
+            match.group() for match in map(WORD_PATTERN.search, words) if match
+        }
+        change = {
+            CHANGE_FROM: old_generation,
+            CHANGE_TO: new_generation,
+            CHANGE_WORDS: sorted(first_words)
+        }
+
+        def append(changes):
+            changes = changes if changes is not None else []
+            return (changes + [change])[-TRANSLATION_CHANGES_KEPT:]
+
+        try:
+            self.content_store.update_json(
+                translation_changes_key(translation_bucket), append)
+        except Exception:
+            # The dictionary is already written. Without this record, variants made
+            # before the change are not served and get translated again when viewed.
+            logging.exception("Could not record the change of %s",
+                              translation_bucket)
+
+    def _invalidate_translations(self, translation_bucket):
+        with self._translation_caches_lock:
+            cache = self._translation_caches.get(translation_bucket)
+        if cache is not None:
+            cache.invalidate()
 
     def translate_page(self,
                        content,
                        lang,
                        translation_bucket=EN_ES_BUCKET_ADDRESS):
+        '''
+            Translate_page translates content with the dictionary stored at translation_bucket.
+
+            Multi-word dictionary phrases are matched longest-first and the original whitespace
+            and punctuation are kept (see flaskr.translations.Translator).
+
+            Args:
+                content: page content to translate.
+                lang: target language code. "EN" returns the content unchanged.
+                translation_bucket: key of the translation dictionary.
+
+            Returns:
+                The translated content.
+        '''
         if lang == "EN":
             return content
-        lines = []
-        file_content = content.split()
 
-        #OPEN/LOAD JSON DATA WITH EN-ES TRANSLATIONS
-        jsonblob = self.get_content_blob(translation_bucket)
+        translator, _ = self.get_translator(translation_bucket)
+        return translator.translate(content)
+
+    def get_page_version(self, name, lang):
+        '''
+            Get_page_version identifies the version of a page as it would be shown in lang,
+            using only metadata requests.
 
-        with jsonblob.open("r") as json_file:
-            data = json.load(json_file)
-            for word in file_content:
-                if word in data:
-                    word = data[word]
-                lines.append(word)
+            The version changes whenever the page object is written and, for translated
+            views, whenever the translation dictionary changes. It is meant for HTTP
+            validators (ETag and Last-Modified).
 
-            return " ".join(lines)
+            Args:
+                name: name of the page.
+                lang: language the page is shown in.
+
+            Returns:
+                A tuple of the version string and the time the page was last written, or
+                None if the page does not exist.
+        '''
+        info = self.content_store.stat(UPLOADED_PAGES_FOLDER + name)
+        if info is None:
+            return None
+        version = f"{info.generation}-{lang}"
+        if lang != "EN":
+            _, dictionary_generation = self.get_translator()
+            version += f"-{dictionary_generation}"
+        return version, info.updated
 
     def get_wiki_page(self, name, lang):
         '''
-            This method returns the data of a uploaded page. 
+            This method returns the data of a uploaded page, with its content translated
+            to lang. It returns None if the page does not exist.
+
+            Only the page object is read: it holds the content and a header with the number
+            of edits and the last edit's editor, date and status (see split_page), so the
+            cost does not depend on how many edits the page has.
+
+            With precompute_translations, every page write also stores the page translated
+            to each language of VARIANT_LANGUAGES, and translated views read that variant
+            with no translation work. A variant is only served if it was made from the
+            page's current generation (a metadata lookup) and either the current
+            dictionary or an older one whose later changes add no phrase starting with a
+            word of the page (see changed_words). Otherwise the page is translated on the
+            fly and its variants are rewritten in the background, so a dictionary change
+            only costs work on the pages it affects, when they are next viewed.
 
         '''
-        bucket = self.storage_client.bucket(self.content_bucket)
-        blob = bucket.blob(UPLOADED_PAGES_FOLDER + name)
-        page_data = json.loads(blob.download_as_text())
+        precomputed = self.precompute_translations and lang in VARIANT_LANGUAGES
+        if precomputed:
+            variant = self._get_page_variant(name, lang)
+            if variant is not None:
+                return variant
+
+        page_data, generation = self.content_store.get_json(
+            UPLOADED_PAGES_FOLDER + name)
+        if page_data is None:
+            return None
+        page_data, _ = split_page(page_data)
+        if precomputed:
+            self._schedule_page_variants(dict(page_data), generation)
         page_data["Content"] = self.translate_page(page_data["Content"], lang)
         return page_data
 
+    def _get_page_variant(self, name, lang):
+        variant, _ = self.content_store.get_json(page_variant_key(lang, name))
+        if variant is None:
+            return None
+        translation_bucket = VARIANT_LANGUAGES[lang]
+        _, dictionary_generation = self.get_translator(translation_bucket)
+        made_with = variant.pop(VARIANT_DICTIONARY)
+        words = variant.pop(VARIANT_WORDS, None)
+        if made_with != dictionary_generation:
+            changed = self._changed_words(translation_bucket, made_with,
+                                          dictionary_generation)
+            if changed is None or words is None or not changed.isdisjoint(
+                    words):
+                return None
+        info = self.content_store.stat(UPLOADED_PAGES_FOLDER + name)
+        if info is None or variant.pop(VARIANT_SOURCE) != info.generation:
+            return None
+        return variant
+
+    def _changed_words(self, translation_bucket, since, current):
+        '''
+            Returns the words changed in a dictionary between two generations (see
+            changed_words), reading its change log again only if the copy kept in memory
+            does not reach current.
+        '''
+        with self._translation_changes_lock:
+            changes = self._translation_changes.get(translation_bucket)
+        if changes is not None:
+            words = changed_words(changes, since, current)
+            if words is not None:
+                return words
+        changes, _ = self.content_store.get_json(
+            translation_changes_key(translation_bucket))
+        changes = changes or []
+        with self._translation_changes_lock:
+            self._translation_changes[translation_bucket] = changes
+        return changed_words(changes, since, current)
+
+    def _schedule_page_variants(self, page_data, generation):
+        '''
+            Rewrites the variants of a page in the background, once per page generation
+            however many views find them outdated meanwhile.
+        '''
+        pending = (page_data[PAGE_NAME], generation)
+        with self._pending_variants_lock:
+            if pending in self._pending_variants:
+                return
+            self._pending_variants.add(pending)
+
+        def store():
+            try:
+                self._store_page_variants(page_data, generation)
+            except Exception:
+                logging.exception("Could not store the variants of page %s",
+                                  page_data[PAGE_NAME])
+            finally:
+                with self._pending_variants_lock:
+                    self._pending_variants.discard(pending)
+
+        self._variant_executor.submit(store)
+
+    def _store_page_variants(self, page_data, generation):
+        '''
+            Stores the translated variants of a page written with the given generation.
+            A variant is only replaced by one made from a newer page or dictionary, so
+            concurrent writers cannot leave an outdated variant behind.
+        '''
+        for lang, translation_bucket in VARIANT_LANGUAGES.items():
+            translator, dictionary_generation = self.get_translator(
+                translation_bucket)
+            variant = dict(page_data,
+                           Content=translator.translate(
+                               page_data[PAGE_CONTENT]))
+            variant[VARIANT_SOURCE] = generation
+            variant[VARIANT_DICTIONARY] = dictionary_generation
+            variant[VARIANT_WORDS] = sorted(
+                set(WORD_PATTERN.findall(page_data[PAGE_CONTENT])))
+
+            def replace(stored, variant=variant):
+                if stored is not None and (
+                        stored[VARIANT_SOURCE], stored[VARIANT_DICTIONARY]) >= (
+                            generation, dictionary_generation):
+                    return None
+                return variant
+
+            self.content_store.update_json(
+                page_variant_key(lang, page_data[PAGE_NAME]), replace)
+
+    def refresh_page_variants(self, words=None):
+        '''
+            Refresh_page_variants re-translates the stored variants of the pages that use
+            any of words (every page if words is None) with the current dictionaries.
+
+            Dictionary changes do not need it: outdated variants are rewritten when their
+            page is viewed (see get_wiki_page). It reads every page, and is meant for
+            building the variants of existing pages ahead of time, for example when
+            turning precompute_translations on.
+
+            Args:
+                words: words or phrases whose translation changed.
+
+            Returns:
+                The number of pages whose variants were refreshed.
+        '''
+        first_words = None
+        if words is not None:
+            first_words = {
+                match.group() for match in (WORD_PATTERN.search(word)
+                                            for word in words) if match
+            }
+        refreshed = 0
+        for info in self.content_store.list(UPLOADED_PAGES_FOLDER):
+            page_data, generation = self.content_store.get_json(info.name)
+            if page_data is None:
+                continue
+            if first_words is not None and first_words.isdisjoint(
+                    WORD_PATTERN.findall(page_data[PAGE_CONTENT])):
+                continue
+            page_data, _ = split_page(page_data)
+            self._store_page_variants(page_data, generation)
+            refreshed += 1
+        return refreshed
+
+    def wait_for_page_variants(self):
+        '''
+            Wait_for_page_variants blocks until the background variant rewrites that were
+            already scheduled are done.
+        '''
+        self._variant_executor.submit(lambda: None).result()
+
+    def get_page_edits(self, page_name):
+        '''
+            Get_page_edits returns all edits ever made on a page, oldest first.
+
+            Args:
+                page_name: name of the page.
+
+            Returns:
+                A list of dictionaries with the editor's name, the date of the edit, its
+                status and the edited content.
+        '''
+        page_data, _ = self.content_store.get_json(UPLOADED_PAGES_FOLDER +
+                                                   page_name)
+        if page_data is None:
+            return []
+        return self._page_edits(page_data)
+
+    def _page_edits(self, page_data):
+        page_data, edits = split_page(page_data)
+        if not edits and page_data[EDIT_COUNT]:
+            edits = self._read_page_edits(page_data[PAGE_NAME])
+        revisions = {}
+        return [{
+            EDIT_CONTENT: self._edit_content(page_data, edit, revisions),
+            DATE: edit[DATE],
+            EDIT_STATUS: edit[EDIT_STATUS],
+            EDIT_AUTHOR: edit[EDIT_AUTHOR]
+        } for edit in edits]
+
+    def _edit_content(self, page_data, edit_data, revisions=None):
+        '''
+            Rebuilds the content proposed by an edit from its delta and the revision it was
+            made on. Edits written before deltas were introduced hold the full content.
+
+            Args:
+                page_data: header of the edited page.
+                edit_data: the edit's json object.
+                revisions: optional dictionary caching rebuilt revisions between calls.
+        '''
+        if EDIT_CONTENT in edit_data:
+            return edit_data[EDIT_CONTENT]
+        base = self._revision_content(page_data, edit_data[EDIT_BASE],
+                                      revisions)
+        return apply_delta(base, edit_data[EDIT_DELTA])
+
+    def _revision_content(self, page_data, revision, revisions=None):
+        '''
+            Returns the content of a page at a given revision. The current revision is the
+            page's content; older ones are rebuilt from the accepted edits that produced
+            them, back to the closest snapshot.
+        '''
+        if revisions is None:
+            revisions = {}
+        if revision == page_data[PAGE_REVISION]:
+            return page_data[PAGE_CONTENT]
+        if revision not in revisions:
+            page_name = page_data[PAGE_NAME]
+            record, _ = self.content_store.get_json(
+                page_revision_key(page_name, revision))
+            if PAGE_CONTENT in record:
+                revisions[revision] = record[PAGE_CONTENT]
+            else:
+                edit_data, _ = self.content_store.get_json(
+                    page_edit_key(page_name, record[REVISION_EDIT]))
+                revisions[revision] = self._edit_content(
+                    page_data, edit_data, revisions)
+        return revisions[revision]
+
+    def _read_page_edits(self, page_name):
+        edits = []
+        for blob in self.content_store.list(PAGE_EDITS_FOLDER + page_name +
+                                            "/"):
+            edit_data, _ = self.content_store.get_json(blob.name)
+            edits.append(edit_data)
+        return edits
+
+    def _read_page(self, page_name):
+        '''
+            Reads a page for an update. Edits still embedded in the page (see split_page)
+            are moved to their own objects first so the page can be written back as a header.
+            Returns (None, 0) if the page does not exist.
+        '''
+        page_data, generation = self.content_store.get_json(
+            UPLOADED_PAGES_FOLDER + page_name)
+        if page_data is None:
+            return None, 0
+        page_data, edits = split_page(page_data)
+        for index, edit_data in enumerate(edits):
+            self.content_store.put_json(page_edit_key(page_name, index),
+                                        edit_data)
+        return page_data, generation
+
     def get_all_page_names(self):
         '''
         This method is used to list links to uploaded wiki content.
         '''
         nombre = []
-        pages = set(
-            self.get_content_bucket().list_blobs(prefix=UPLOADED_PAGES_FOLDER))
+        pages = self.content_store.list(UPLOADED_PAGES_FOLDER)
         for page in pages:
             name = page.name.split(UPLOADED_PAGES_FOLDER)[1]
             if name == '':
@@ -138,6 +916,15 @@ class Backend:
             It accepts a page name, display image link and a file which holds the page content from the user
             and uploads it to the uploaded-pages folder in our content bucket.
 
+            The file is read in chunks and rejected as soon as it exceeds max_upload_bytes.
+            Web uploads are already capped while the request is parsed (see UploadRequest in
+            flaskr/pages.py), so the file object is in memory by then.
+
+            Uploading over an existing page keeps its edit history: the edit numbering goes
+            on and the new content becomes the page's next revision, after a snapshot of the
+            replaced content is recorded. The page is written conditionally and the upload
+            retried on a conflict, like in edit_page_data.
+
             Args:
                 page_name: name for the page to be created from the user's content.
                 username:  username of the user.
@@ -145,52 +932,224 @@ class Backend:
                 upload_datee: date of the upload
                 image_url: display image url for the page. This would be set to a default image if the user did not upload one.
 
-            
+            Raises:
+                UploadTooLarge: if the file is larger than max_upload_bytes.
+                UnicodeDecodeError: if the file is not utf-8 text.
         '''
-        user_file.save(user_file.filename)
-        content = open(user_file.filename, "r")
+        content = self._read_upload(user_file)
+
+        def write():
+            page_info = {
+                "Name": page_name,
+                "Author": username,
+                "Content": content,
+                "Image": image_url,
+                "Date": upload_date,
+                "EditCount": 0,
+                "LastEdit": None,
+                "Revision": 0,
+                "UploadRevision": 0
+            }
+            previous, generation = self._read_page(page_name)
+            if previous is not None:
+                self._add_snapshot(previous)
+                page_info[EDIT_COUNT] = previous[EDIT_COUNT]
+                page_info[LAST_EDIT] = previous[LAST_EDIT]
+                page_info[PAGE_REVISION] = previous[PAGE_REVISION] + 1
+                page_info[UPLOAD_REVISION] = page_info[PAGE_REVISION]
+            generation = self.content_store.put_json(
+                UPLOADED_PAGES_FOLDER + page_name,
+                page_info,
+                if_generation_match=generation)
+            return page_info, generation
+
+        page_info, generation = self.content_store.retry(write)
+        self._update_page_indexes(page_info, generation)
+
+    def _read_upload(self, user_file):
+        if user_file.content_length > self.max_upload_bytes:
+            raise UploadTooLarge(user_file.filename)
+        chunks = []
+        size = 0
+        while True:
+            chunk = user_file.stream.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > self.max_upload_bytes:
+                raise UploadTooLarge(user_file.filename)
+            chunks.append(chunk)
+        return b"".join(chunks).decode("utf-8")
 
-        page_info = {
-            "Name": page_name,
-            "Author": username,
-            "Content": content.read(),
-            "Image": image_url,
-            "Date": upload_date,
-            "Edits": []
-        }
-        content.close()
-        page_json = json.dumps(page_info)
-        blob = self.get_content_bucket().blob(UPLOADED_PAGES_FOLDER + page_name)
+    def edit_page_data(self, page_name, content, edit_date, editor):
+        '''
+            Edit_page_data adds a pending edit to a page.
 
-        blob.upload_from_string(data=page_json, content_type="application/json")
+            The edit is written as a new object next to the page's earlier edits, and only
+            the page header (edit count and last edit) is updated. The edit stores a delta
+            against the page's current revision rather than a copy of the whole content.
 
-        os.remove(user_file.filename)
+            Both writes are conditional, so concurrent editors and reviewers never drop
+            each other's changes: the edit object must not exist yet and the page must not
+            have changed since it was read. On a conflict the page is read again and the
+            write retried with backoff (see BlobStore.retry).
 
-    def edit_page_data(self, page_name, content, edit_date, editor):
-        bucket = self.storage_client.bucket(self.content_bucket)
+            Raises:
+                PreconditionFailed: if the page kept changing during every attempt.
 
-        blob = bucket.get_blob(UPLOADED_PAGES_FOLDER + page_name)
+            Args:
+                page_name: name of the page.
+                content: the edited content suggested by the editor.
+                edit_date: date of the edit.
+                editor: username of the editor.
+        '''
+        created = None
+
+        def add_edit():
+            nonlocal created
+            page_data, generation = self._read_page(page_name)
+            if created is None:
+                edit_data = {
+                    "Base": page_data[PAGE_REVISION],
+                    "Delta": make_delta(page_data[PAGE_CONTENT], content),
+                    "Date": edit_date,
+                    "Status": 1,
+                    "Editor": editor
+                }
+                created = self._create_edit(page_name, page_data[EDIT_COUNT],
+                                            edit_data)
+            # A retry after losing the header write reuses the edit object already
+            # written. Other editors may have claimed later slots meanwhile, so the
+            # count never goes down and the last edit stays the newest one.
+            index, edit_data = created
+            if index + 1 >= page_data[EDIT_COUNT]:
+                page_data[EDIT_COUNT] = index + 1
+                page_data[LAST_EDIT] = edit_header(edit_data)
+            generation = self.content_store.put_json(
+                UPLOADED_PAGES_FOLDER + page_name,
+                page_data,
+                if_generation_match=generation)
+            return page_data, generation, index, edit_data
+
+        page_data, generation, index, edit_data = self.content_store.retry(
+            add_edit)
+        self._update_page_indexes(page_data, generation, (index, edit_data))
+
+    def _update_page_indexes(self, page_data, generation, edit=None):
+        '''
+            Updates what is derived from a page after page_data was written with
+            generation: its catalog entry, its translated variants and, when edit is an
+            (index, edit_data) tuple, the edit inboxes.
 
-        page_data = json.loads(blob.download_as_text())
+            The page write has already succeeded by then, so a failed update is logged
+            rather than raised, and does not keep the later ones from running. The caller
+            must not report the write as failed (and have it retried) because of them.
+        '''
+        updates = [lambda: self._update_page_catalog(page_data)]
+        if self.precompute_translations:
+            updates.append(
+                lambda: self._store_page_variants(page_data, generation))
+        if edit is not None:
+            updates.append(lambda: self._record_edit(page_data, *edit))
+        for update in updates:
+            try:
+                update()
+            except Exception:
+                logging.exception("Could not update the indexes of page %s",
+                                  page_data[PAGE_NAME])
+
+    def _create_edit(self, page_name, index, edit_data):
+        '''
+            Writes a new edit object in the first free slot from index on.
 
-        edit_data = {
-            "Content": content,
-            "Date": edit_date,
-            "Status": 1,
-            "Editor": editor
-        }
+            Slots past the page's edit count are already taken when another editor is
+            about to count theirs, or when an editor's header write never happened (it
+            lost every retry or its process died). Either way the slot is skipped, so a
+            leftover edit object cannot block the page's later edits.
 
-        page_data["Edits"].append(edit_data)
-        blob.upload_from_string(data=json.dumps(page_data),
-                                content_type="application/json")
+            Returns:
+                A tuple of the index of the slot written and edit_data.
+        '''
+        while True:
+            try:
+                self.content_store.put_json(page_edit_key(page_name, index),
+                                            edit_data,
+                                            if_generation_match=0)
+                return index, edit_data
+            except PreconditionFailed:
+                index += 1
+
+    def get_write_conflicts(self):
+        '''
+            Get_write_conflicts returns how many conditional writes of this backend were
+            rejected because of a concurrent writer and had to be retried.
+        '''
+        return self.user_store.conflicts + self.content_store.conflicts
+
+    def get_page_catalog(self):
+        '''
+            Get_page_catalog returns the summaries of all uploaded pages from the catalog
+            manifest, which costs a single read however many pages the wiki has.
+
+            If the manifest does not exist yet it is rebuilt from the uploaded pages.
+
+            Returns:
+                A list of page summaries (see page_summary), sorted by page name.
+        '''
+        catalog, _ = self.content_store.get_json(PAGE_CATALOG)
+        if catalog is None:
+            catalog = self.rebuild_page_catalog()
+        return [catalog[name] for name in sorted(catalog)]
+
+    def rebuild_page_catalog(self):
+        '''
+            Rebuild_page_catalog recreates the catalog manifest by reading every uploaded page.
+
+            Pages written while the rebuild runs update the stored catalog themselves (see
+            _update_page_catalog). The rebuilt catalog is written conditionally and, if the
+            stored one changed during the scan, the entries changed meanwhile are kept over
+            the scanned ones, so those writes are not lost.
+
+            Returns:
+                The catalog as a dictionary mapping page names to summaries.
+        '''
+        before, _ = self.content_store.get_json(PAGE_CATALOG)
+        before = before or {}
+        scanned = {}
+        for page_data in self.iter_uploaded_pages():
+            scanned[page_data[PAGE_NAME]] = page_summary(page_data)
+
+        def write():
+            stored, generation = self.content_store.get_json(PAGE_CATALOG)
+            catalog = dict(scanned)
+            for name, summary in (stored or {}).items():
+                if before.get(name) != summary:
+                    catalog[name] = summary
+            self.content_store.put_json(PAGE_CATALOG,
+                                        catalog,
+                                        if_generation_match=generation)
+            return catalog
+
+        return self.content_store.retry(write)
+
+    def _update_page_catalog(self, page_data):
+        summary = page_summary(page_data)
+
+        def update(catalog):
+            catalog = catalog if catalog is not None else {}
+            if catalog.get(summary[PAGE_NAME]) == summary:
+                return None
+            catalog[summary[PAGE_NAME]] = summary
+            return catalog
+
+        self.content_store.update_json(PAGE_CATALOG, update)
 
     def get_users(self):
         '''
         This method returns a list of all user blobs.
         '''
         users = set()
-        bucket = self.storage_client.bucket(self.user_bucket)
-        blobs = bucket.list_blobs(prefix=USER_PASSWORD_FOLDER)
+        blobs = self.user_store.list(USER_PASSWORD_FOLDER)
         for blob in blobs:
             users.add(blob.name.removeprefix(USER_PASSWORD_FOLDER))
 
@@ -198,7 +1157,9 @@ class Backend:
 
     def hash_pwd(self, username, password):
         '''
-        This method takes in a username and password, and returns the hashed password.
+        This method takes in a username and password, and returns the legacy blake2b hash of the
+        password. It is only used to check accounts created before passwords were hashed with
+        scrypt (see sign_in).
         '''
         # Ibby> Consider lowering before passing to the backend in all cases
         user_name = username.lower()
@@ -211,28 +1172,37 @@ class Backend:
         '''
         This method is used to check if a username is valid.
         If an account exists with the user name, it returns False, otherwise, it returns True.
+        It costs a single lookup of the user's key, however many users exist.
         '''
-        user_name = username.lower()
-        user_list = self.get_users()
-
-        if user_name in user_list:
-            return False
-
-        return True
+        user_name = (username.strip()).lower()
+        return not self.user_store.exists(USER_PASSWORD_FOLDER + user_name)
 
     def sign_up(self, username, password):
         '''
         This method takes in a username and password and stores the username(in lowercase)
         as an object in the users-data folder in the user_bucket.
-        This object contains the hashed password
+        This object contains the password's scrypt hash, with its salt and cost parameters.
+
+        The account is created with a single conditional write, so when two people sign up
+        with the same username at once only one of them gets the account.
+
+        Returns:
+            True if the account was created, False if the username is already taken.
+
+        Raises:
+            HasherBusy: if too many passwords are being hashed already.
         '''
         user_name = (username.strip()).lower()
-        bucket = self.storage_client.bucket(self.user_bucket)
-        new_user = bucket.blob(USER_PASSWORD_FOLDER + user_name)
-        hashed_pwd = self.hash_pwd(user_name, password)
+        hashed_pwd = self.password_hasher.hash(password)
 
-        with new_user.open("w") as f:
-            f.write(hashed_pwd)
+        try:
+            self.user_store.put_text(USER_PASSWORD_FOLDER + user_name,
+                                     hashed_pwd,
+                                     if_generation_match=0)
+        except PreconditionFailed:
+            return False
+        self.username_filter.add(user_name)
+        return True
 
     def sign_in(self, username, password):
         '''
@@ -242,54 +1212,175 @@ class Backend:
           if it exists, it hashes the password passed in by the user and checks if that hashed password matches
           the one saved in that blob.
 
+          Accounts still holding a legacy blake2b hash, or a scrypt hash made with an older
+          cost, are rehashed with the current parameters after a successful sign in. The
+          rehash is a conditional write, so it is skipped if the password changed meanwhile.
+
+          Usernames that the username filter knows do not exist are rejected without reading
+          the user bucket.
+
           Args:
             username: username passed in by the user
             password: password passed in by the user
 
           Returns:
             A boolean indicating if the sign in was successful and an error message if the sign in was not successful. 
+
+          Raises:
+            HasherBusy: if too many passwords are being hashed already.
         '''
-        bucket = self.storage_client.bucket(self.user_bucket)
-        blob_obj = bucket.get_blob(f"{USER_PASSWORD_FOLDER}{username}")
-        if blob_obj:
-            hashed_password = self.hash_pwd(username, password)
-            content = blob_obj.download_as_text()
-            if content == hashed_password:
-                return True, None
+        if not self.username_filter.might_exist(username):
+            return False, "User not found"
+        key = f"{USER_PASSWORD_FOLDER}{username}"
+        content, generation = self.user_store.get_text(key)
+        if content is None:
+            return False, "User not found"
+
+        if is_scrypt_hash(content):
+            valid = self.password_hasher.verify(password, content)
+        else:
+            valid = content == self.hash_pwd(username, password)
+        if not valid:
             return False, "Wrong password"
-        return False, "User not found"
 
-    #Fix up to actually retrieve from bucket
+        if self.password_hasher.needs_rehash(content):
+            try:
+                self.user_store.put_text(key,
+                                         self.password_hasher.hash(password),
+                                         if_generation_match=generation)
+            except PreconditionFailed:
+                pass
+        return True, None
+
     #>Ibby this should be named `get_all_images` to be clear it returns many
     def get_image(self):
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(self.content_bucket)
-        # Ibby> typo (sp)
-        picture_lst = list(bucket.list_blobs(prefix='About-content/'))
-        for blob in picture_lst:
-            pic = bucket.get_blob(blob.name)
-            #Ibby> remove prints
-        return picture_lst
+        '''
+            Get_image returns the about page images as a list of Image tuples (file name,
+            signed URL, size and update time), sorted by file name.
+
+            The images come from a single listing of the About-content folder, cached for
+            image_list_ttl seconds together with their signed URLs, so while the cache is
+            fresh no storage call is made.
+        '''
+        return self.about_images.get()
 
-    def get_all_uploaded_pages(self):
+    def get_all_uploaded_pages(self, max_workers=None, errors=RAISE_ERRORS):
         '''
             Get_all_uploaded_pages method gets all the pages that have been uploaded
             in our wiki.
 
+            The pages are downloaded concurrently by a bounded thread pool, so a full scan takes
+            about as long as the slowest downloads instead of the sum of all of them. The
+            result is in page name order regardless of which download finishes first.
+
+            Args:
+                max_workers: number of pages downloaded in parallel. Defaults to fetch_workers.
+                errors: "raise" to fail the whole scan if a page cannot be downloaded, or "skip"
+                    to log the failure and leave that page out.
+
             Returns:
                 A list of json objects which hold the data of all uploaded pages.
                 They contain the name, author, date uploaded,page's content, author's username 
-                and a list of dictionaries which contain the information of all edits made to the page.
+                and the page header (see split_page). Pages written before edits were stored
+                separately still contain an "Edits" list.
 
         '''
+        if errors not in (RAISE_ERRORS, SKIP_ERRORS):
+            raise ValueError(f"Unknown errors mode: {errors}")
+
+        def fetch(blob):
+            try:
+                page_data, _ = self.content_store.get_json(blob.name)
+            except Exception:
+                if errors == RAISE_ERRORS:
+                    raise
+                logging.exception("Skipping page %s", blob.name)
+                return None
+            return page_data
+
+        blobs = self.content_store.list(UPLOADED_PAGES_FOLDER)
+        if not blobs:
+            return []
+
+        with ThreadPoolExecutor(
+                max_workers=max_workers or self.fetch_workers) as executor:
+            pages = list(executor.map(fetch, blobs))
+        return [page_data for page_data in pages if page_data is not None]
+
+    def iter_uploaded_pages(self,
+                            author=None,
+                            pending_edit=None,
+                            name_prefix="",
+                            fields=None):
+        '''
+            Iter_uploaded_pages yields uploaded pages one at a time, so a scan only ever holds
+            one page in memory and callers can stop early.
 
-        blobs = list(
-            self.storage_client.list_blobs(self.content_bucket,
-                                           prefix=UPLOADED_PAGES_FOLDER))
-        uploaded_pages = []
-        for blob in blobs[1:]:
-            uploaded_pages.append(json.loads(blob.download_as_text()))
-        return uploaded_pages
+            Pages are filtered as early as possible: name_prefix narrows the listing itself, and
+            author and pending_edit are checked against the page catalog so that pages which
+            cannot match are never downloaded.
+
+            Args:
+                author: only yield pages uploaded by this user (case insensitive).
+                pending_edit: if True only yield pages whose last edit is pending, if False
+                    only pages without a pending edit.
+                name_prefix: only yield pages whose name starts with this prefix.
+                fields: if given, only these keys of each page are yielded. When all of them
+                    are catalog fields (see page_summary) they are read from the catalog and
+                    the pages themselves are not downloaded.
+
+            Yields:
+                The json object of each matching page, in page name order.
+        '''
+        catalog = None
+        metadata_only = fields is not None and set(fields) <= set(
+            PAGE_SUMMARY_FIELDS)
+        if metadata_only or author is not None or pending_edit is not None:
+            catalog, _ = self.content_store.get_json(PAGE_CATALOG)
+
+        if metadata_only and catalog is not None:
+            for name in sorted(catalog):
+                summary = catalog[name]
+                if name.startswith(name_prefix) and self._page_matches(
+                        summary[PAGE_AUTHOR], summary[LAST_EDIT_STATUS], author,
+                        pending_edit):
+                    yield {field: summary[field] for field in fields}
+            return
+
+        for blob in self.content_store.list(UPLOADED_PAGES_FOLDER +
+                                            name_prefix):
+            summary = catalog.get(
+                blob.name[len(UPLOADED_PAGES_FOLDER):]) if catalog else None
+            if summary is not None and not self._page_matches(
+                    summary[PAGE_AUTHOR], summary[LAST_EDIT_STATUS], author,
+                    pending_edit):
+                continue
+
+            page_data, _ = self.content_store.get_json(blob.name)
+            if page_data is None:
+                continue
+            if not self._page_matches(page_data[PAGE_AUTHOR],
+                                      last_edit_status(page_data), author,
+                                      pending_edit):
+                continue
+            if metadata_only:
+                page_data = page_summary(page_data)
+            if fields is not None:
+                page_data = {
+                    field: page_data[field]
+                    for field in fields
+                    if field in page_data
+                }
+            yield page_data
+
+    def _page_matches(self, page_author, last_edit_status, author,
+                      pending_edit):
+        if author is not None and page_author.lower() != author.lower():
+            return False
+        if pending_edit is not None and (last_edit_status
+                                         == PENDING) != pending_edit:
+            return False
+        return True
 
     def get_user_edits(self, username):
         '''
@@ -305,21 +1396,19 @@ class Backend:
                 suggested by the user, and the date of the edit.
         '''
 
-        uploaded_pages = self.get_all_uploaded_pages()
+        inbox = self._get_edit_inbox(username)
+        entries = list(reversed(inbox[INBOX_OUTGOING]))
         user_edits = []
 
-        for page in uploaded_pages:
-            page[PAGE_EDITS].reverse()
-            for edit in page[PAGE_EDITS]:
-                if edit[EDIT_AUTHOR].lower() == username.lower():
-                    user_edit = {
-                        "Name": page[PAGE_NAME],
-                        "Author": page[PAGE_AUTHOR],
-                        "Status": edit[EDIT_STATUS],
-                        "Edit": edit[EDIT_CONTENT],
-                        "Date": edit[DATE]
-                    }
-                    user_edits.append(user_edit)
+        for entry, content in zip(entries, self._inbox_contents(entries)):
+            user_edit = {
+                "Name": entry[PAGE_NAME],
+                "Author": entry[PAGE_AUTHOR],
+                "Status": entry[EDIT_STATUS],
+                "Edit": content,
+                "Date": entry[DATE]
+            }
+            user_edits.append(user_edit)
 
         return user_edits
 
@@ -332,19 +1421,169 @@ class Backend:
                 username: username of the user.
 
             Returns:
-                A list of json objects which contain the name of the page, author's name (user), 
-                page content, date of upload, the page's display image url, and a list of dictionaries
-                which contain all edits ever made on the page. The dictionaries comprises
-                of the editor's name, the date of the edit, the status of the edit and the edited content.
+                A list of dictionaries which contain the name of the page, author's name (user)
+                and a list of dictionaries which contain all edits ever made on the page. The
+                dictionaries comprises of the editor's name, the date of the edit, the status of
+                the edit and the edited content.
+        '''
+        inbox = self._get_edit_inbox(username)
+        entries = inbox[INBOX_INCOMING]
+        user_pages = {}
+        for entry, content in zip(entries, self._inbox_contents(entries)):
+            page = user_pages.setdefault(
+                entry[PAGE_NAME], {
+                    PAGE_NAME: entry[PAGE_NAME],
+                    PAGE_AUTHOR: username.lower(),
+                    PAGE_EDITS: []
+                })
+            page[PAGE_EDITS].append({
+                EDIT_CONTENT: content,
+                DATE: entry[DATE],
+                EDIT_STATUS: entry[EDIT_STATUS],
+                EDIT_AUTHOR: entry[EDIT_AUTHOR]
+            })
+
+        return list(user_pages.values())
+
+    def _get_edit_inbox(self, username):
+        key = EDIT_INBOX_FOLDER + username.lower()
+        inbox, _ = self.content_store.get_json(key)
+        if inbox is None and self._migrate_edit_inboxes_once():
+            inbox, _ = self.content_store.get_json(key)
+        return inbox if inbox is not None else empty_edit_inbox()
+
+    def migrate_edit_inboxes(self):
+        '''
+            Migrate_edit_inboxes builds the edit inboxes of every user from the uploaded
+            pages, for edits made before the inboxes existed.
+
+            All inboxes are built in a single pass over the wiki. Entries already in a stored
+            inbox are kept, so edits recorded while the migration runs are not lost. A
+            marker object is written at the end; the backend runs the migration by itself
+            the first time an inbox is needed and the marker is missing (see
+            _migrate_edit_inboxes_once).
         '''
-        uploaded_pages = self.get_all_uploaded_pages()
-        user_pages = []
-        for page in uploaded_pages:
-            if page[PAGE_AUTHOR].lower() == username.lower():
-                if len(page[PAGE_EDITS]) > 0:
-                    user_pages.append(page)
+        inboxes = {}
+        for page in self.iter_uploaded_pages():
+            page, edits = split_page(page)
+            if not edits and page[EDIT_COUNT]:
+                edits = self._read_page_edits(page[PAGE_NAME])
+            author = page[PAGE_AUTHOR].lower()
+            for index, edit in enumerate(edits):
+                editor = edit[EDIT_AUTHOR].lower()
+                inboxes.setdefault(editor,
+                                   empty_edit_inbox())[INBOX_OUTGOING].append(
+                                       self._outgoing_entry(page, index, edit))
+                inboxes.setdefault(author,
+                                   empty_edit_inbox())[INBOX_INCOMING].append(
+                                       self._incoming_entry(page, index, edit))
+
+        for username, scanned in inboxes.items():
+            self.content_store.update_json(
+                EDIT_INBOX_FOLDER + username,
+                lambda inbox, scanned=scanned: merge_edit_inbox(inbox, scanned))
+        self.content_store.put_json(EDIT_INBOX_MIGRATION,
+                                    {"Users": len(inboxes)})
+
+    def _migrate_edit_inboxes_once(self):
+        '''
+            Runs migrate_edit_inboxes unless the wiki was already migrated. After the first
+            check the answer is remembered, so this costs nothing per request.
 
-        return user_pages
+            Returns:
+                True if the migration ran now.
+        '''
+        if self._inboxes_migrated:
+            return False
+        with self._inbox_migration_lock:
+            if self._inboxes_migrated:
+                return False
+            migrated = not self.content_store.exists(EDIT_INBOX_MIGRATION)
+            if migrated:
+                self.migrate_edit_inboxes()
+            self._inboxes_migrated = True
+            return migrated
+
+    def _outgoing_entry(self, page_data, index, edit):
+        return {
+            PAGE_NAME: page_data[PAGE_NAME],
+            EDIT_INDEX: index,
+            PAGE_AUTHOR: page_data[PAGE_AUTHOR],
+            EDIT_STATUS: edit[EDIT_STATUS],
+            DATE: edit[DATE]
+        }
+
+    def _incoming_entry(self, page_data, index, edit):
+        return {
+            PAGE_NAME: page_data[PAGE_NAME],
+            EDIT_INDEX: index,
+            EDIT_AUTHOR: edit[EDIT_AUTHOR],
+            EDIT_STATUS: edit[EDIT_STATUS],
+            DATE: edit[DATE]
+        }
+
+    def _inbox_contents(self, entries):
+        '''
+            Rebuilds the content proposed by the edits that inbox entries refer to.
+
+            Inbox entries only hold the page name and edit index, so an inbox stays small
+            however large the pages are. Each page is read once, and revisions rebuilt for
+            one edit are reused for the others. Entries written before inboxes held
+            references still carry their content.
+
+            Returns:
+                The content of every entry, in order.
+        '''
+        pages = {}
+        contents = []
+        for entry in entries:
+            if EDIT_CONTENT in entry:
+                contents.append(entry[EDIT_CONTENT])
+                continue
+            page_name = entry[PAGE_NAME]
+            if page_name not in pages:
+                page_data, _ = self.content_store.get_json(
+                    UPLOADED_PAGES_FOLDER + page_name)
+                pages[page_name] = split_page(page_data) + ({},)
+            page_data, edits, revisions = pages[page_name]
+            index = entry[EDIT_INDEX]
+            if index < len(edits):
+                edit_data = edits[index]
+            else:
+                edit_data, _ = self.content_store.get_json(
+                    page_edit_key(page_name, index))
+            contents.append(self._edit_content(page_data, edit_data, revisions))
+        return contents
+
+    def _record_edit(self, page_data, index, edit):
+        '''
+            Adds or updates the edit at index of page_data in the editor's and the page
+            author's edit inboxes.
+        '''
+        editor = edit[EDIT_AUTHOR].lower()
+        author = page_data[PAGE_AUTHOR].lower()
+        self._update_edit_inbox(editor, INBOX_OUTGOING,
+                                self._outgoing_entry(page_data, index, edit))
+        self._update_edit_inbox(author, INBOX_INCOMING,
+                                self._incoming_entry(page_data, index, edit))
+
+    def _update_edit_inbox(self, username, box, entry):
+        self._migrate_edit_inboxes_once()
+        key = (entry[PAGE_NAME], entry[EDIT_INDEX])
+
+        def update(inbox):
+            inbox = inbox if inbox is not None else empty_edit_inbox()
+            entries = inbox[box]
+            for position, existing in enumerate(entries):
+                if (existing[PAGE_NAME], existing[EDIT_INDEX]) == key:
+                    if existing == entry:
+                        return None
+                    entries[position] = entry
+                    return inbox
+            entries.append(entry)
+            return inbox
+
+        self.content_store.update_json(EDIT_INBOX_FOLDER + username, update)
 
     def author_edit_action(self, page_name, action):
         '''
@@ -352,21 +1591,79 @@ class Backend:
             action the author of a page decides on an edit made on the page. 
 
             The author can choose to accept or decline an edit. The author_edit_action
-            sets the status of the edit to the author's decision.
+            sets the status of the edit to the author's decision. The edit's content is
+            rebuilt from its delta; accepting it makes it the page's next revision.
+
+            The edit and the page are written with generation preconditions and the whole
+            update is retried with backoff on a conflict, like in edit_page_data.
 
             Args:
                 page_name: name of the page.
                 action: the actor's decision on the edit.               
-        '''
-        page_data = self.get_wiki_page(page_name)
 
-        if action == "Accept":
-            page_data[PAGE_CONTENT] = page_data[PAGE_EDITS][-1][EDIT_CONTENT]
-            page_data[PAGE_EDITS][-1][EDIT_STATUS] = ACCEPTED
-        else:
-            page_data[PAGE_EDITS][-1][EDIT_STATUS] = DECLINED
-
-        bucket = self.storage_client.bucket(self.content_bucket)
-        blob = bucket.blob(UPLOADED_PAGES_FOLDER + page_name)
-        blob.upload_from_string(data=json.dumps(page_data),
-                                content_type="application/json")
+            Raises:
+                PreconditionFailed: if the page kept changing during every attempt.
+        '''
+        index = None
+
+        def review():
+            nonlocal index
+            page_data, generation = self._read_page(page_name)
+            if index is None:
+                # Retries review the same edit even if a newer one arrived meanwhile.
+                index = page_data[EDIT_COUNT] - 1
+            edit_key = page_edit_key(page_name, index)
+            edit_data, edit_generation = self.content_store.get_json(edit_key)
+            content = self._edit_content(page_data, edit_data)
+
+            if action == "Accept":
+                edit_data[EDIT_STATUS] = ACCEPTED
+                self._add_revision(page_data, index, edit_data, content)
+            else:
+                edit_data[EDIT_STATUS] = DECLINED
+
+            self.content_store.put_json(edit_key,
+                                        edit_data,
+                                        if_generation_match=edit_generation)
+            if index == page_data[EDIT_COUNT] - 1:
+                page_data[LAST_EDIT] = edit_header(edit_data)
+            generation = self.content_store.put_json(
+                UPLOADED_PAGES_FOLDER + page_name,
+                page_data,
+                if_generation_match=generation)
+            return page_data, generation, edit_data
+
+        page_data, generation, edit_data = self.content_store.retry(review)
+        self._update_page_indexes(page_data, generation, (index, edit_data))
+
+    def _add_revision(self, page_data, index, edit_data, content):
+        '''
+            Makes the accepted edit at index the page's next content revision. The revision
+            record only points at the edit, except every SNAPSHOT_INTERVAL revisions (and
+            when the edit was made on an older revision) where it holds the full content.
+        '''
+        page_name = page_data[PAGE_NAME]
+        current = page_data[PAGE_REVISION]
+        if current == page_data.get(UPLOAD_REVISION, 0):
+            # Uploaded content has no record yet: it becomes a snapshot.
+            self._add_snapshot(page_data)
+
+        revision = current + 1
+        record = {REVISION_EDIT: index}
+        if revision % SNAPSHOT_INTERVAL == 0 or edit_data.get(
+                EDIT_BASE, current) != current:
+            record[PAGE_CONTENT] = content
+        self.content_store.put_json(page_revision_key(page_name, revision),
+                                    record)
+        page_data[PAGE_REVISION] = revision
+        page_data[PAGE_CONTENT] = content
+
+    def _add_snapshot(self, page_data):
+        '''
+            Records the page's current content as a snapshot of its current revision, before
+            the page moves to a new one. Every writer leaving a revision records the same
+            content, so the write needs no precondition.
+        '''
+        self.content_store.put_json(
+            page_revision_key(page_data[PAGE_NAME], page_data[PAGE_REVISION]),
+            {PAGE_CONTENT: page_data[PAGE_CONTENT]})
@@ -1,134 +1,203 @@
 import pytest
-from flaskr.backend import Backend
+from flaskr.backend import Backend, UploadTooLarge, create_backend, EDIT_INBOX_FOLDER
+from flaskr.blobstore import LocalBlobStore, PreconditionFailed
+from flaskr.passwords import PasswordHasher, HasherBusy
 import os, io, hashlib, werkzeug.datastructures, json
 from unittest.mock import patch, Mock, MagicMock, mock_open
 from google.cloud import storage
 
-# TODO(Project 1): Write tests for Backend methods.
+
+@pytest.fixture
+def backend(tmp_path):
+    return Backend(user_store=LocalBlobStore(tmp_path / "user-pw-bucket"),
+                   content_store=LocalBlobStore(tmp_path / "wikis-content"),
+                   password_hasher=PasswordHasher(n=16, workers=0))
+
+
+def make_page(name="test-page", edit_count=0, last_edit=None, revision=0):
+    return {
+        "Name": name,
+        "Author": "Author's name",
+        "Content": "Women in STEM",
+        "Image": "link",
+        "Date": "Date",
+        "EditCount": edit_count,
+        "LastEdit": last_edit,
+        "Revision": revision
+    }
+
+
+def make_legacy_page(name="test-page", edits=None):
+    # Pages written before edits were moved to their own objects.
+    return {
+        "Name": name,
+        "Author": "Author's name",
+        "Content": "Women in STEM",
+        "Image": "link",
+        "Date": "Date",
+        "Edits": edits if edits is not None else []
+    }
+
+
+def put_page(backend, page_data):
+    backend.content_store.put_json("uploaded-pages/" + page_data["Name"],
+                                   page_data)
+
+
+def get_page(backend, name):
+    page_data, _ = backend.content_store.get_json("uploaded-pages/" + name)
+    return page_data
 
 
 @patch('hashlib.blake2b')
-@patch('flaskr.backend.storage.Client')
-def test_sign_in_successful(mock_client, mock_hashlib):
+def test_sign_in_successful(mock_hashlib, backend):
     mock_hashlib.return_value.hexdigest.return_value = 'amara'
-    mock_bucket = Mock()
-    mock_bucket.get_blob.return_value.download_as_text.return_value = 'amara'
-    mock_client().bucket.return_value = mock_bucket
+    backend.user_store.put_text('users-data/test_user', 'amara')
 
-    backend = Backend(user_bucket='test_user_bucket')
     signed_in, err = backend.sign_in('test_user', 'test password')
 
     assert (signed_in, err) == (True, None)
-    mock_client().bucket.assert_called_once_with('test_user_bucket')
-    mock_bucket.get_blob.assert_called_once_with('users-data/test_user')
-    mock_bucket.get_blob.return_value.download_as_text.assert_called_once()
 
 
 @patch('hashlib.blake2b')
-@patch('flaskr.backend.storage.Client')
-def test_sign_in_user_not_found(mock_client, mock_hashlib):
+def test_sign_in_rehashes_legacy_hash(mock_hashlib, backend):
+    mock_hashlib.return_value.hexdigest.return_value = 'amara'
+    backend.user_store.put_text('users-data/test_user', 'amara')
+
+    assert backend.sign_in('test_user', 'test password') == (True, None)
+
+    stored, _ = backend.user_store.get_text('users-data/test_user')
+    assert stored.startswith('scrypt$16$')
+    assert backend.sign_in('test_user', 'test password') == (True, None)
+    assert backend.sign_in('test_user', 'wrong') == (False, "Wrong password")
+
+
+def test_sign_in_scrypt(backend):
+    backend.sign_up('test_user', 'test password')
+    stored = backend.user_store.get_text('users-data/test_user')
+
+    assert backend.sign_in('test_user', 'test password') == (True, None)
+    assert backend.sign_in('test_user', 'other') == (False, "Wrong password")
+    assert backend.user_store.get_text('users-data/test_user') == stored
+
+
+def test_sign_in_upgrades_cost(backend):
+    backend.sign_up('test_user', 'test password')
+    backend.password_hasher = PasswordHasher(n=32, workers=0)
+
+    assert backend.sign_in('test_user', 'test password') == (True, None)
+
+    stored, _ = backend.user_store.get_text('users-data/test_user')
+    assert stored.startswith('scrypt$32$')
+
+
+def test_sign_in_wrong_password_keeps_legacy_hash(backend):
+    backend.user_store.put_text('users-data/test_user', 'legacy')
+
+    assert backend.sign_in('test_user', 'pw') == (False, "Wrong password")
+    assert backend.user_store.get_text('users-data/test_user')[0] == 'legacy'
+
+
+@patch('hashlib.blake2b')
+def test_sign_in_user_not_found(mock_hashlib, backend):
     mock_hashlib.return_value.hexdigest.return_value = 'amara'
-    mock_bucket = Mock()
-    mock_bucket.get_blob.return_value = None
-    mock_client().bucket.return_value = mock_bucket
 
-    backend = Backend(user_bucket='test_user_bucket')
     signed_in, err = backend.sign_in('test_user', 'test password')
 
     assert (signed_in, err) == (False, "User not found")
-    mock_client().bucket.assert_called_once_with('test_user_bucket')
-    mock_bucket.get_blob.assert_called_once_with('users-data/test_user')
 
 
 @patch('hashlib.blake2b')
-@patch('flaskr.backend.storage.Client')
-def test_sign_in_password_mismatch(mock_client, mock_hashlib):
+def test_sign_in_password_mismatch(mock_hashlib, backend):
     mock_hashlib.return_value.hexdigest.return_value = 'amara'
-    mock_bucket = Mock()
-    mock_bucket.get_blob.return_value.download_as_text.return_value = 'james'
-    mock_client().bucket.return_value = mock_bucket
+    backend.user_store.put_text('users-data/test_user', 'james')
 
-    backend = Backend(user_bucket='test_user_bucket')
     signed_in, err = backend.sign_in('test_user', 'test password')
 
     assert (signed_in, err) == (False, "Wrong password")
-    mock_client().bucket.assert_called_once_with('test_user_bucket')
-    mock_bucket.get_blob.assert_called_once_with('users-data/test_user')
-    mock_bucket.get_blob.return_value.download_as_text.assert_called_once()
+
+
+def test_sign_in_unknown_user_skips_storage(backend):
+    backend.sign_up('yvette', 'abc')
+
+    with patch.object(backend.user_store, 'get_text') as mock_get_text:
+        signed_in, err = backend.sign_in('mayo', 'abc')
+
+    assert (signed_in, err) == (False, "User not found")
+    mock_get_text.assert_not_called()
+    assert backend.username_filter.rejections == 1
+
+
+def test_sign_in_after_sign_up_in_same_process(backend):
+    assert backend.sign_in('yvette', 'abc') == (False, "User not found")
+
+    backend.sign_up('Yvette', 'abc')
+
+    assert backend.sign_in('yvette', 'abc') == (True, None)
+
+
+def test_sign_in_after_sign_up_in_other_process(backend, tmp_path, clock):
+    other = Backend(user_store=LocalBlobStore(tmp_path / "user-pw-bucket"),
+                    content_store=LocalBlobStore(tmp_path / "wikis-content"),
+                    password_hasher=PasswordHasher(n=16, workers=0))
+    backend.username_filter._clock = clock
+    assert backend.sign_in('yvette', 'abc') == (False, "User not found")
+
+    other.sign_up('yvette', 'abc')
+    clock.now = backend.username_filter.refresh_interval
+
+    assert backend.sign_in('yvette', 'abc') == (True, None)
 
 
 # Sam: Get wiki page, all page names, upload, get image (if time, not being used in general)
 
 
-@patch('json.loads')
-@patch('flaskr.backend.storage.Client')
 @patch('flaskr.backend.Backend.translate_page')
-def test_get_wiki_page(mock_translate, mock_storage_client, mock_json):
-    page_data = {
-        "Name": "name",
-        "Author": "Author's name",
-        "Content": "Content",
-        "Image": "",
-        "Date": "Date",
-        "Edits": []
-    }
+def test_get_wiki_page(mock_translate, backend):
+    page_data = make_page()
+    put_page(backend, page_data)
     mock_translate.return_value = "Content"
-    mock_json.return_value = page_data
-    mock_bucket = MagicMock()
-    mock_bucket.return_value.blob.return_value.download_as_text.return_value = '''{"Name": "name", "Author": "Author's name", "Content":  "Content",
-    "Image": "", "Date": "Date", "Edits":[]}'''
-
-    mock_storage_client.return_value.bucket.return_value = mock_bucket
 
-    backend = Backend(content_bucket="test_wikis-content")
     page_content = backend.get_wiki_page("test-page", "EN")
 
-    mock_storage_client.assert_called_once()
-    mock_storage_client.return_value.bucket.assert_called_once_with(
-        "test_wikis-content")
-    mock_bucket.blob.assert_called_once_with("uploaded-pages/test-page")
-    mock_bucket.blob.return_value.download_as_text.assert_called_once()
-    assert page_content == page_data
+    mock_translate.assert_called_once_with("Women in STEM", "EN")
+    assert page_content == dict(page_data, Content="Content")
+
+
+def test_get_page_version(backend):
+    put_page(backend, make_page())
+    backend.content_store.put_json('translations/en-es.json', {"in": "en"})
 
+    version, updated = backend.get_page_version("test-page", "EN")
+    es_version, _ = backend.get_page_version("test-page", "ES")
+    backend.add_translations("Women", "Mujeres")
 
-@patch.object(storage, 'Client')
-def test_get_all_page_names(mock_storage_client):
-    #Mock GCS
-    mock_storage_client_instance = MagicMock()
-    mock_bucket = MagicMock()
-    mock_storage_client.return_value = mock_storage_client_instance
-    mock_storage_client_instance.bucket.return_value = mock_bucket
+    assert version != es_version
+    assert backend.get_page_version("test-page", "EN")[0] == version
+    assert backend.get_page_version("test-page", "ES")[0] != es_version
+    assert updated.tzinfo is not None
+    assert backend.get_page_version("missing-page", "EN") is None
 
-    #creating Mocks to call upon
-    mock_blob1 = MagicMock()
-    mock_blob2 = MagicMock()
-    mock_blob1.name = "uploaded-pages/page1"
-    mock_blob2.name = "uploaded-pages/page2"
 
-    mock_bucket.list_blobs.return_value = [mock_blob1, mock_blob2]
+def test_get_wiki_page_not_found(backend):
+    assert backend.get_wiki_page("missing-page", "EN") is None
+
+
+def test_get_all_page_names(backend):
+    put_page(backend, make_page("page1"))
+    put_page(backend, make_page("page2"))
 
-    backend = Backend()
     page_list = backend.get_all_page_names()
 
-    #asserting
-    mock_storage_client.assert_called_once_with()
-    mock_storage_client_instance.bucket.assert_called_once_with(
-        backend.content_bucket)
-    mock_bucket.list_blobs.assert_called_once_with(prefix='uploaded-pages/')
-    assert "page1" in page_list
-    assert "page2" in page_list
-    #assert page_list == ["page1","page2"]      #get all page names uses a set() so test fails sometimes
-
-
-@patch("os.remove")
-@patch('json.dumps')
-@patch("flaskr.backend.storage.Client")
-@patch("werkzeug.datastructures.FileStorage")
-def test_upload_file_no_image(mock_file, mock_storage_client, mock_json,
-                              mock_os):
-    mock_file.filename = "test file.txt"
-    file_data = "Women in STEM"
+    assert sorted(page_list) == ["page1", "page2"]
+
+
+def make_upload(data=b"Women in STEM"):
+    return werkzeug.datastructures.FileStorage(stream=io.BytesIO(data),
+                                               filename="test file.txt")
+
 
+def test_upload_file_no_image(backend):
     fake_page = {
         "Name":
             "test-page",
@@ -140,259 +209,387 @@ def test_upload_file_no_image(mock_file, mock_storage_client, mock_json,
             "https://storage.cloud.google.com/wikis-content/DEFAULT%20IMG.png",
         "Date":
             "Date",
-        "Edits": []
+        "EditCount":
+            0,
+        "LastEdit":
+            None,
+        "Revision":
+            0,
+        "UploadRevision":
+            0
     }
 
-    json_string = '''{"Name": "test-page", "Author": "Author's name", "Content": "Women in STEM", "Image": "https://storage.cloud.google.com/wikis-content/DEFAULT%20IMG.png", "Date": "Date", "Edits": []}'''
-    mock_json.return_value = json_string
+    backend.upload_file("test-page", "Author's name", make_upload(), "Date")
 
-    mock_bucket = MagicMock()
-    mock_storage_client.return_value.bucket.return_value = mock_bucket
+    assert get_page(backend, "test-page") == fake_page
 
-    with patch("builtins.open", mock_open(read_data=file_data)) as mocked_open:
-        backend = Backend(content_bucket="test-content-bucket")
-        backend.upload_file("test-page", "Author's name", mock_file, "Date")
-
-    mocked_open.assert_called_once_with("test file.txt", "r")
-    mock_storage_client.assert_called_once()
-    mock_storage_client.return_value.bucket.assert_called_once_with(
-        "test-content-bucket")
-    mock_bucket.blob.assert_called_once_with("uploaded-pages/test-page")
-    mock_bucket.blob.return_value.upload_from_string.assert_called_once_with(
-        data=json_string, content_type='application/json')
-    mock_os.assert_called_once_with("test file.txt")
-    mock_json.assert_called_once_with(fake_page)
-    mock_file.save.assert_called_once_with("test file.txt")
-
-
-@patch("os.remove")
-@patch('json.dumps')
-@patch("flaskr.backend.storage.Client")
-@patch("werkzeug.datastructures.FileStorage")
-def test_upload_file_image(mock_file, mock_storage_client, mock_json, mock_os):
-    mock_file.filename = "test file.txt"
-    file_data = "Women in STEM"
 
+def test_upload_file_image(backend):
     fake_page = {
         "Name": "test-page",
         "Author": "Author's name",
         "Content": "Women in STEM",
         "Image": "https://image.jpg",
         "Date": "Date",
-        "Edits": []
+        "EditCount": 0,
+        "LastEdit": None,
+        "Revision": 0,
+        "UploadRevision": 0
     }
 
-    json_string = '''{"Name": "test-page", "Author": "Author's name", "Content": "Women in STEM", "Image": "https://image.jpg", "Date": "Date", "Edits": []}'''
-    mock_json.return_value = json_string
-
-    mock_bucket = MagicMock()
-    mock_storage_client.return_value.bucket.return_value = mock_bucket
-
-    with patch("builtins.open", mock_open(read_data=file_data)) as mocked_open:
-        backend = Backend(content_bucket="test-content-bucket")
-        backend.upload_file("test-page", "Author's name", mock_file, "Date",
-                            "https://image.jpg")
-
-    mocked_open.assert_called_once_with("test file.txt", "r")
-    mock_storage_client.assert_called_once()
-    mock_storage_client.return_value.bucket.assert_called_once_with(
-        "test-content-bucket")
-    mock_bucket.blob.assert_called_once_with("uploaded-pages/test-page")
-    mock_bucket.blob.return_value.upload_from_string.assert_called_once_with(
-        data=json_string, content_type='application/json')
-    mock_os.assert_called_once_with("test file.txt")
-    mock_json.assert_called_once_with(fake_page)
-    mock_file.save.assert_called_once_with("test file.txt")
-
-
-@patch('flaskr.backend.storage.Client')
-def test_get_users(mock_storage):
-    mock_storage_client = MagicMock()
-    mock_bucket = MagicMock()
-    mock_storage.return_value = mock_storage_client
-    mock_storage_client.bucket.return_value = mock_bucket
-
-    mock_user_blob = MagicMock()
-    mock_user_blob.name = 'users-data/mayo'
-    mock_bucket.list_blobs.return_value = [mock_user_blob]
-
-    backend = Backend()
+    backend.upload_file("test-page", "Author's name", make_upload(), "Date",
+                        "https://image.jpg")
+
+    assert get_page(backend, "test-page") == fake_page
+    assert not os.path.exists("test file.txt")
+
+
+def test_upload_file_over_edited_page(backend):
+    backend.upload_file("test-page", "Author's name", make_upload(), "Date")
+    backend.edit_page_data("test-page", "Women in science", "edit date",
+                           "editor")
+    backend.author_edit_action("test-page", "Decline")
+
+    backend.upload_file("test-page", "Author's name",
+                        make_upload(b"Women in tech"), "Date")
+    backend.edit_page_data("test-page", "Women in tech today", "edit date",
+                           "editor")
+
+    page_data = get_page(backend, "test-page")
+    assert (page_data["EditCount"], page_data["Revision"]) == (2, 1)
+    assert [edit["Content"] for edit in backend.get_page_edits("test-page")
+           ] == ["Women in science", "Women in tech today"]
+
+
+def test_upload_file_over_edited_page_keeps_history(backend):
+    backend.upload_file("test-page", "Author's name", make_upload(), "Date")
+    backend.edit_page_data("test-page", "Women in science", "edit date",
+                           "editor")
+    backend.author_edit_action("test-page", "Accept")
+    backend.edit_page_data("test-page", "Women in science!", "edit date",
+                           "editor")
+
+    backend.upload_file("test-page", "Author's name",
+                        make_upload(b"Women in tech"), "Date")
+    backend.edit_page_data("test-page", "Women in tech.", "edit date", "editor")
+    backend.author_edit_action("test-page", "Accept")
+    backend.edit_page_data("test-page", "Women in tech. Today", "edit date",
+                           "editor")
+    backend.author_edit_action("test-page", "Accept")
+
+    assert get_page(backend, "test-page")["Content"] == "Women in tech. Today"
+    assert [edit["Content"] for edit in backend.get_page_edits("test-page")
+           ] == [
+               "Women in science", "Women in science!", "Women in tech.",
+               "Women in tech. Today"
+           ]
+
+
+@patch('flaskr.backend.UPLOAD_CHUNK_BYTES', 4)
+def test_upload_file_too_large(backend):
+    backend.max_upload_bytes = 10
+    upload = make_upload(b"Women in STEM" * 1000)
+
+    with pytest.raises(UploadTooLarge):
+        backend.upload_file("test-page", "Author's name", upload, "Date")
+
+    # Reading stops at the first chunk past the limit.
+    assert upload.stream.tell() == 12
+    assert get_page(backend, "test-page") is None
+
+
+def test_upload_file_at_limit(backend):
+    backend.max_upload_bytes = 13
+
+    backend.upload_file("test-page", "Author's name", make_upload(), "Date")
+
+    assert get_page(backend, "test-page")["Content"] == "Women in STEM"
+
+
+def test_get_users(backend):
+    backend.user_store.put_text('users-data/mayo', 'hash')
+
     users = backend.get_users()
 
-    mock_storage.assert_called_once_with()
-    mock_bucket.list_blobs.assert_called_once_with(prefix='users-data/')
     assert users == {'mayo'}
 
 
-@patch('flaskr.backend.storage.Client')
-@patch('flaskr.backend.Backend.get_users', return_value={'mayo', 'samtest'})
-def test_is_username_unique_true(mock_users, mock_storage):
-    backend = Backend()
+def test_is_username_unique_true(backend):
+    backend.user_store.put_text('users-data/mayo', 'hash')
+    backend.user_store = MagicMock(wraps=backend.user_store)
+
     status = backend.is_username_unique('wisdom')
 
     assert status
+    backend.user_store.list.assert_not_called()
 
 
-@patch('flaskr.backend.storage.Client')
-@patch('flaskr.backend.Backend.get_users', return_value={'mayo', 'samtest'})
-def test_is_username_unique_false(mock_users, mock_storage):
-    backend = Backend()
-    status = backend.is_username_unique('mayo')
+def test_is_username_unique_false(backend):
+    backend.user_store.put_text('users-data/mayo', 'hash')
+
+    status = backend.is_username_unique('Mayo ')
 
     assert not status
 
 
 @patch('hashlib.blake2b')
-@patch('flaskr.backend.storage.Client')
-def test_hash_pwd(mock_storage, mock_hashlib):
-    backend = Backend()
+def test_hash_pwd(mock_hashlib, backend):
     mock_hashlib.return_value.hexdigest.return_value = 'mayo'
     mock_pwd = backend.hash_pwd('many', 'abc')
 
     assert mock_pwd == 'mayo'
 
 
-@patch('flaskr.backend.storage.Client')
-@patch('flaskr.backend.Backend.hash_pwd', return_value='mayo')
-def test_sign_up(mock_hash, mock_storage):
-    mock_storage_instance = MagicMock()
-    mock_bucket = MagicMock()
-    mock_user = MagicMock()
-    mock_user_blob = MagicMock()
-    mock_bucket.blob.return_value = mock_user
-    mock_user.open.return_value.__enter__.return_value = mock_user_blob
-    mock_storage_instance.bucket.return_value = mock_bucket
-    mock_storage.return_value = mock_storage_instance
+def test_sign_up(backend):
+    backend.sign_up('Yvette ', 'abcd')
+
+    stored, _ = backend.user_store.get_text('users-data/yvette')
+    assert stored.startswith('scrypt$16$8$1$')
+    assert backend.password_hasher.verify('abcd', stored)
 
-    backend = Backend()
+
+def test_sign_up_salts_each_user(backend):
     backend.sign_up('yvette', 'abcd')
+    backend.sign_up('mayo', 'abcd')
 
-    mock_user.open.assert_called_once()
-    mock_user_blob.write.assert_called_once_with('mayo')
+    first, _ = backend.user_store.get_text('users-data/yvette')
+    second, _ = backend.user_store.get_text('users-data/mayo')
+    assert first != second
 
 
-@patch('json.dumps')
-@patch('json.loads')
-@patch('flaskr.backend.storage.Client')
-def test_edit_page_data(mock_client, mock_json_loads, mock_json_dumps):
-    retrieved_page_data = {
-        "Name": "test-page",
-        "Author": "Author's name",
-        "Content": "Women in STEM",
-        "Image": "link",
-        "Date": "Date",
-        "Edits": []
+def test_sign_up_hasher_busy(backend):
+    backend.password_hasher = PasswordHasher(n=16, workers=0, max_queue=0)
+
+    with pytest.raises(HasherBusy):
+        backend.sign_up('yvette', 'abcd')
+    assert backend.is_username_unique('yvette')
+
+
+def test_sign_up_taken(backend):
+    assert backend.sign_up('yvette', 'abcd')
+    stored = backend.user_store.get_text('users-data/yvette')
+
+    assert not backend.sign_up('Yvette', 'other')
+    assert backend.user_store.get_text('users-data/yvette') == stored
+
+
+def test_add_translations(backend):
+    backend.content_store.put_json('translations/en-es.json', {"hello": "hola"})
+
+    backend.add_translations("hello", "buenas")
+    backend.add_translations("women", "mujeres")
+
+    data, _ = backend.content_store.get_json('translations/en-es.json')
+    assert data == {"hello": "hola", "women": "mujeres"}
+
+
+def test_add_translations_bulk(backend):
+    backend.content_store.put_json('translations/en-es.json', {"hello": "hola"})
+    backend.content_store = MagicMock(wraps=backend.content_store)
+    pairs = [("hello", "buenas")
+            ] + [(f"word{i}", f"palabra{i}") for i in range(1000)]
+
+    added = backend.add_translations_bulk(pairs)
+
+    data, _ = backend.content_store.get_json('translations/en-es.json')
+    assert added == 1000
+    assert len(data) == 1001
+    assert data["hello"] == "hola"
+    backend.content_store.put_json.assert_called_once()
+
+
+def test_translate_page(backend):
+    backend.content_store.put_json('translations/en-es.json', {
+        "Women": "Mujeres",
+        "in": "en"
+    })
+
+    assert backend.translate_page("Women in STEM", "ES") == "Mujeres en STEM"
+    assert backend.translate_page("Women in STEM", "EN") == "Women in STEM"
+
+
+def test_translate_page_caches_dictionary(backend):
+    backend.content_store.put_json('translations/en-es.json', {"in": "en"})
+    backend.content_store = MagicMock(wraps=backend.content_store)
+
+    backend.translate_page("Women in STEM", "ES")
+    backend.translate_page("Women in STEM", "ES")
+
+    backend.content_store.get_json.assert_called_once_with(
+        'translations/en-es.json')
+
+
+def test_add_translations_invalidates_cache(backend):
+    backend.content_store.put_json('translations/en-es.json', {"in": "en"})
+    assert backend.translate_page("Women in STEM", "ES") == "Women en STEM"
+
+    backend.add_translations("Women", "Mujeres")
+
+    assert backend.translate_page("Women in STEM", "ES") == "Mujeres en STEM"
+
+
+def test_edit_page_data(backend):
+    put_page(backend, make_page())
+
+    backend.edit_page_data("test-page", "edited content", "edit date", "editor")
+
+    assert get_page(backend, "test-page") == make_page(edit_count=1,
+                                                       last_edit={
+                                                           "Date": "edit date",
+                                                           "Status": 1,
+                                                           "Editor": "editor"
+                                                       })
+    assert backend.get_page_edits("test-page") == [{
+        "Content": "edited content",
+        "Date": "edit date",
+        "Status": 1,
+        "Editor": "editor"
+    }]
+
+
+def test_edit_page_data_appends_edit_objects(backend):
+    put_page(backend, make_page())
+
+    backend.edit_page_data("test-page", "first", "date 1", "editor")
+    backend.edit_page_data("test-page", "second", "date 2", "other")
+
+    names = [
+        info.name
+        for info in backend.content_store.list("page-edits/test-page/")
+    ]
+    assert names == [
+        "page-edits/test-page/00000000", "page-edits/test-page/00000001"
+    ]
+    assert [edit["Content"] for edit in backend.get_page_edits("test-page")
+           ] == ["first", "second"]
+    assert get_page(backend, "test-page")["Content"] == "Women in STEM"
+
+
+def test_edit_page_data_migrates_legacy_page(backend):
+    old_edit = {
+        "Content": "old content",
+        "Date": "old date",
+        "Status": 3,
+        "Editor": "editor"
     }
-    edited_page_data_string = '''{"Name": "test-page", "Author": "Author's name", "Content": "Women in STEM", "Image": "link", "Date": "Date", "Edits": [{"Content": "edited content", "Date": "edit date", "Status": 1, "Editor": "editor"}]}'''
-    retrieved_page_string = '''{"Name": "test-page", "Author": "Author's name", "Content":  "Women in STEM",
-    "Image": "link", "Date": "Date", "Edits":[]}'''
-    edited_page_data = {
-        "Name":
-            "test-page",
-        "Author":
-            "Author's name",
-        "Content":
-            "Women in STEM",
-        "Image":
-            "link",
-        "Date":
-            "Date",
-        "Edits": [{
+    put_page(backend, make_legacy_page(edits=[old_edit]))
+
+    backend.edit_page_data("test-page", "edited content", "edit date", "other")
+
+    page_data = get_page(backend, "test-page")
+    assert "Edits" not in page_data
+    assert page_data["EditCount"] == 2
+    assert page_data["LastEdit"]["Editor"] == "other"
+    assert backend.get_page_edits("test-page")[0] == old_edit
+
+
+def test_get_wiki_page_legacy(backend):
+    put_page(
+        backend,
+        make_legacy_page(edits=[{
             "Content": "edited content",
             "Date": "edit date",
             "Status": 1,
             "Editor": "editor"
-        }]
+        }]))
+
+    page_data = backend.get_wiki_page("test-page", "EN")
+
+    assert page_data == make_page(edit_count=1,
+                                  last_edit={
+                                      "Date": "edit date",
+                                      "Status": 1,
+                                      "Editor": "editor"
+                                  })
+
+
+def catalog_entry(name="test-page", size=13, status=None):
+    return {
+        "Name": name,
+        "Author": "Author's name",
+        "Date": "Date",
+        "Image": "link",
+        "Size": size,
+        "LastEditStatus": status
     }
 
-    mock_json_loads.return_value = retrieved_page_data
-    mock_json_dumps.return_value = edited_page_data_string
 
-    mock_bucket = MagicMock()
-    mock_bucket.get_blob.return_value.download_as_text.return_value = retrieved_page_string
-    mock_client.return_value.bucket.return_value = mock_bucket
+def test_page_catalog_tracks_writes(backend):
+    put_page(backend, make_page())
+    backend.content_store.put_json("catalog/pages.json", {})
 
-    backend = Backend(content_bucket="test-wikis-content")
     backend.edit_page_data("test-page", "edited content", "edit date", "editor")
+    assert backend.get_page_catalog() == [catalog_entry(status=1)]
 
-    mock_client.assert_called_once()
-    mock_client.return_value.bucket.assert_called_once_with(
-        "test-wikis-content")
-    mock_bucket.get_blob.assert_called_once_with("uploaded-pages/test-page")
-    mock_bucket.get_blob.return_value.download_as_text.assert_called_once()
-    mock_json_loads.assert_called_once_with(retrieved_page_string)
-    mock_json_dumps.assert_called_once_with(edited_page_data)
-    mock_bucket.get_blob.return_value.upload_from_string.assert_called_once_with(
-        data=edited_page_data_string, content_type='application/json')
-
-
-@patch('json.loads')
-@patch('flaskr.backend.storage.Client')
-def test_get_all_uploaded_pages(mock_client, mock_json):
-    default_mock_blob = MagicMock()
-    mock_blob = MagicMock()
-    edited_page_data_string = '''{"Name": "test-page", "Author": "Author's name", "Content": "Women in STEM", "Image": "link", "Date": "Date", "Edits": [{"Content": "edited content", "Date": "edit date", "Status": 1, "Editor": "editor"}]}'''
-    edited_page_data = {
-        "Name":
-            "test-page",
-        "Author":
-            "Author's name",
-        "Content":
-            "Women in STEM",
-        "Image":
-            "link",
-        "Date":
-            "Date",
-        "Edits": [{
-            "Content": "edited content",
-            "Date": "edit date",
-            "Status": 1,
-            "Editor": "editor"
-        }]
-    }
+    backend.author_edit_action("test-page", "Accept")
+    assert backend.get_page_catalog() == [catalog_entry(size=14, status=2)]
+
+
+def test_page_catalog_upload(backend):
+    backend.upload_file("b-page", "Author's name", make_upload(), "Date",
+                        "link")
+    backend.upload_file("a-page", "Author's name", make_upload(), "Date",
+                        "link")
+
+    backend.content_store = MagicMock(wraps=backend.content_store)
+    catalog = backend.get_page_catalog()
+
+    assert catalog == [catalog_entry("a-page"), catalog_entry("b-page")]
+    backend.content_store.get_json.assert_called_once_with("catalog/pages.json")
+    backend.content_store.list.assert_not_called()
+
+
+def test_page_catalog_rebuilt_when_missing(backend):
+    put_page(backend, make_page("page1"))
+
+    assert backend.get_page_catalog() == [catalog_entry("page1")]
+    assert backend.content_store.exists("catalog/pages.json")
+
+
+def test_page_catalog_rebuild_keeps_concurrent_writes(backend):
+    put_page(backend, make_page("a-page"))
+    scan = backend.iter_uploaded_pages
+
+    def scan_then_upload():
+        pages = list(scan())
+        backend.upload_file("b-page", "Author's name", make_upload(), "Date",
+                            "link")
+        return iter(pages)
 
-    mock_blob.download_as_text.return_value = edited_page_data_string
+    with patch.object(backend,
+                      "iter_uploaded_pages",
+                      side_effect=scan_then_upload):
+        backend.rebuild_page_catalog()
 
-    mock_client.return_value.list_blobs.return_value = [
-        default_mock_blob, mock_blob
+    assert backend.get_page_catalog() == [
+        catalog_entry("a-page"),
+        catalog_entry("b-page")
     ]
 
-    mock_json.return_value = edited_page_data
-    backend = Backend(content_bucket="test-content-bucket")
+
+def test_get_all_uploaded_pages(backend):
+    edited_page_data = make_legacy_page(edits=[{
+        "Content": "edited content",
+        "Date": "edit date",
+        "Status": 1,
+        "Editor": "editor"
+    }])
+    put_page(backend, edited_page_data)
+
     uploaded_pages = backend.get_all_uploaded_pages()
 
     assert uploaded_pages == [edited_page_data]
-    mock_blob.download_as_text.assert_called_once()
-    mock_client.assert_called_once()
-    mock_client.return_value.list_blobs.assert_called_once_with(
-        "test-content-bucket", prefix="uploaded-pages/")
-    mock_json.assert_called_once_with(edited_page_data_string)
 
 
-@patch('flaskr.backend.Backend.get_all_uploaded_pages')
-@patch('flaskr.backend.storage.Client')
-def test_get_user_edits(mock_client, mock_get_all_uploaded_pages):
-
-    edited_page_data = {
-        "Name":
-            "test-page",
-        "Author":
-            "Author's name",
-        "Content":
-            "Women in STEM",
-        "Image":
-            "link",
-        "Date":
-            "Date",
-        "Edits": [{
+def test_get_user_edits(backend):
+    put_page(
+        backend,
+        make_legacy_page(edits=[{
             "Content": "edited content",
             "Date": "edit date",
             "Status": 1,
             "Editor": "editor"
-        }]
-    }
-
-    mock_get_all_uploaded_pages.return_value = [edited_page_data]
+        }]))
 
     user_edit = {
         "Name": "test-page",
@@ -401,129 +598,609 @@ def test_get_user_edits(mock_client, mock_get_all_uploaded_pages):
         "Edit": "edited content",
         "Date": "edit date"
     }
-    backend = Backend()
-    user_edits = backend.get_user_edits("editor")
+    user_edits = backend.get_user_edits("Editor")
 
     assert [user_edit] == user_edits
-    mock_client.assert_called_once()
-    mock_get_all_uploaded_pages.assert_called_once()
+    assert backend.content_store.exists("edit-inbox/editor")
+
+
+def test_get_user_pages_edits(backend):
+    edit = {
+        "Content": "edited content",
+        "Date": "edit date",
+        "Status": 1,
+        "Editor": "editor"
+    }
+    put_page(backend, make_legacy_page(edits=[edit]))
+    put_page(backend, make_page("unedited-page"))
+
+    user_edits = backend.get_user_pages_edits("Author's name")
+
+    assert user_edits == [{
+        "Name": "test-page",
+        "Author": "author's name",
+        "Edits": [edit]
+    }]
+
+
+def test_get_all_uploaded_pages_in_order(backend):
+    names = [f"page{i:02}" for i in range(20)]
+    for name in reversed(names):
+        put_page(backend, make_page(name))
+
+    uploaded_pages = backend.get_all_uploaded_pages(max_workers=4)
+
+    assert [page["Name"] for page in uploaded_pages] == names
+
+
+def test_get_all_uploaded_pages_errors(backend):
+    put_page(backend, make_page("page1"))
+    put_page(backend, make_page("page2"))
+    backend.content_store.put_text("uploaded-pages/broken", "{not json")
+
+    with pytest.raises(json.JSONDecodeError):
+        backend.get_all_uploaded_pages()
+
+    uploaded_pages = backend.get_all_uploaded_pages(errors="skip")
+    assert [page["Name"] for page in uploaded_pages] == ["page1", "page2"]
+
+
+def test_iter_uploaded_pages_filters(backend):
+    put_page(backend, make_page("alpha-one"))
+    put_page(
+        backend,
+        make_page("alpha-two",
+                  edit_count=1,
+                  last_edit={
+                      "Date": "edit date",
+                      "Status": 1,
+                      "Editor": "editor"
+                  }))
+    other = make_page("beta")
+    other["Author"] = "someone else"
+    put_page(backend, other)
 
+    def names(**filters):
+        return [page["Name"] for page in backend.iter_uploaded_pages(**filters)]
 
-@patch('flaskr.backend.Backend.get_all_uploaded_pages')
-@patch('flaskr.backend.storage.Client')
-def test_get_user_pages_edits(mock_client, mock_get_all_uploaded_pages):
+    assert names() == ["alpha-one", "alpha-two", "beta"]
+    assert names(name_prefix="alpha") == ["alpha-one", "alpha-two"]
+    assert names(author="AUTHOR'S NAME") == ["alpha-one", "alpha-two"]
+    assert names(pending_edit=True) == ["alpha-two"]
+    assert names(pending_edit=False, author="someone else") == ["beta"]
 
-    edited_page_data = {
+
+def test_iter_uploaded_pages_skips_catalog_mismatches(backend):
+    put_page(backend, make_page("page1"))
+    put_page(backend, make_page("page2"))
+    backend.rebuild_page_catalog()
+    backend.content_store = MagicMock(wraps=backend.content_store)
+
+    pages = list(backend.iter_uploaded_pages(author="someone else"))
+
+    assert pages == []
+    backend.content_store.get_json.assert_called_once_with("catalog/pages.json")
+
+
+def test_iter_uploaded_pages_projection(backend):
+    put_page(backend, make_page("page1"))
+    backend.rebuild_page_catalog()
+    backend.content_store = MagicMock(wraps=backend.content_store)
+
+    pages = list(backend.iter_uploaded_pages(fields=["Name", "Author"]))
+    with_content = list(backend.iter_uploaded_pages(fields=["Name", "Content"]))
+
+    assert pages == [{"Name": "page1", "Author": "Author's name"}]
+    assert list(backend.iter_uploaded_pages(fields=["Size"])) == [{"Size": 13}]
+    assert with_content == [{"Name": "page1", "Content": "Women in STEM"}]
+    assert backend.content_store.get_json.call_count == 3
+
+
+def test_iter_uploaded_pages_projection_without_catalog(backend):
+    put_page(backend, make_page("page1"))
+
+    pages = list(backend.iter_uploaded_pages(fields=["Name", "Size"]))
+
+    assert pages == [{"Name": "page1", "Size": 13}]
+
+
+def test_iter_uploaded_pages_is_lazy(backend):
+    put_page(backend, make_page("page1"))
+    put_page(backend, make_page("page2"))
+    backend.content_store = MagicMock(wraps=backend.content_store)
+
+    first = next(backend.iter_uploaded_pages())
+
+    assert first["Name"] == "page1"
+    backend.content_store.get_json.assert_called_once_with(
+        "uploaded-pages/page1")
+
+
+@patch('flaskr.backend.Backend.iter_uploaded_pages')
+def test_edit_inbox_tracks_edits(mock_iter_uploaded_pages, backend):
+    put_page(backend, make_page())
+    backend.content_store.put_json("migrations/edit-inbox", {"Users": 0})
+
+    backend.edit_page_data("test-page", "edited content", "edit date", "Editor")
+    backend.author_edit_action("test-page", "Decline")
+
+    assert backend.get_user_edits("editor") == [{
+        "Name": "test-page",
+        "Author": "Author's name",
+        "Status": 3,
+        "Edit": "edited content",
+        "Date": "edit date"
+    }]
+    assert backend.get_user_pages_edits("Author's name") == [{
         "Name":
             "test-page",
         "Author":
-            "Author's name",
-        "Content":
-            "Women in STEM",
-        "Image":
-            "link",
-        "Date":
-            "Date",
+            "author's name",
         "Edits": [{
             "Content": "edited content",
             "Date": "edit date",
-            "Status": 1,
-            "Editor": "editor"
+            "Status": 3,
+            "Editor": "Editor"
         }]
-    }
+    }]
+    mock_iter_uploaded_pages.assert_not_called()
 
-    mock_get_all_uploaded_pages.return_value = [edited_page_data]
 
-    backend = Backend()
-    user_edits = backend.get_user_pages_edits("Author's name")
+def test_edit_inbox_built_once(backend):
+    put_page(backend, make_page())
+    backend.edit_page_data("test-page", "edited content", "edit date", "editor")
 
-    assert [edited_page_data] == user_edits
-    mock_client.assert_called_once()
-    mock_get_all_uploaded_pages.assert_called_once()
-
-
-@pytest.mark.parametrize("action,result,page_data", [
-    pytest.param(
-        "Accept",
-        '''{"Name": "test-page", "Author": "Author's name", "Content": "edited content", "Image": "link", "Date": "Date", "Edits": [{"Content": "edited content", "Date": "edit date", "Status": 2, "Editor": "editor"}]}''',
-        {
-            "Name":
-                "test-page",
-            "Author":
-                "Author's name",
-            "Content":
-                "edited content",
-            "Image":
-                "link",
-            "Date":
-                "Date",
-            "Edits": [{
-                "Content": "edited content",
-                "Date": "edit date",
-                "Status": 2,
-                "Editor": "editor"
-            }]
-        },
-        id="Accepted edit"),
-    pytest.param(
-        "Decline",
-        '''{"Name": "test-page", "Author": "Author's name", "Content": "Women in STEM", "Image": "link", "Date": "Date", "Edits": [{"Content": "edited content", "Date": "edit date", "Status": 3, "Editor": "editor"}]}''',
-        {
-            "Name":
-                "test-page",
-            "Author":
-                "Author's name",
-            "Content":
-                "Women in STEM",
-            "Image":
-                "link",
-            "Date":
-                "Date",
-            "Edits": [{
-                "Content": "edited content",
-                "Date": "edit date",
-                "Status": 3,
-                "Editor": "editor"
-            }]
-        },
-        id="Declined edit")
+    with patch('flaskr.backend.Backend.iter_uploaded_pages') as mock_scan:
+        backend.get_user_edits("editor")
+        backend.get_user_pages_edits("Author's name")
+
+    mock_scan.assert_not_called()
+    assert len(backend.get_user_edits("editor")) == 1
+
+
+def test_edit_inbox_holds_references(backend):
+    big_content = "Women in STEM. " * 500
+    put_page(backend, dict(make_page(), Content=big_content))
+    for i in range(5):
+        backend.edit_page_data("test-page", big_content + f"Edit {i}.",
+                               "edit date", "editor")
+
+    inbox, _ = backend.content_store.get(EDIT_INBOX_FOLDER + "editor")
+    assert len(inbox) < 1000
+    assert [edit["Edit"] for edit in backend.get_user_edits("editor")
+           ] == [big_content + f"Edit {i}." for i in reversed(range(5))]
+    page_edits = backend.get_user_pages_edits("Author's name")[0]["Edits"]
+    assert page_edits[-1]["Content"] == big_content + "Edit 4."
+
+
+def test_edit_inbox_migrated_once(backend):
+    for name in ["page1", "page2"]:
+        put_page(
+            backend,
+            make_legacy_page(name,
+                             edits=[{
+                                 "Content": "edited content",
+                                 "Date": "edit date",
+                                 "Status": 1,
+                                 "Editor": "editor"
+                             }]))
+    scan = backend.iter_uploaded_pages
+
+    with patch.object(backend, "iter_uploaded_pages",
+                      side_effect=scan) as mock_scan:
+        assert len(backend.get_user_edits("editor")) == 2
+        assert len(backend.get_user_pages_edits("Author's name")) == 2
+        assert backend.get_user_edits("newcomer") == []
+
+    mock_scan.assert_called_once()
+    assert backend.content_store.exists("migrations/edit-inbox")
+
+
+def test_edit_inbox_of_new_user_after_migration(backend):
+    put_page(backend, make_page())
+    backend.content_store.put_json("migrations/edit-inbox", {"Users": 0})
+    backend.content_store = MagicMock(wraps=backend.content_store)
+
+    assert backend.get_user_edits("newcomer") == []
+    assert backend.get_user_pages_edits("newcomer") == []
+
+    backend.content_store.list.assert_not_called()
+    backend.content_store.put.assert_not_called()
+
+
+def test_edit_inbox_migration_keeps_recorded_entries(backend):
+    put_page(
+        backend,
+        make_legacy_page(edits=[{
+            "Content": "old content",
+            "Date": "old date",
+            "Status": 3,
+            "Editor": "editor"
+        }]))
+    backend.content_store.put_json(
+        "edit-inbox/editor", {
+            "Outgoing": [{
+                "Name": "other-page",
+                "Index": 0,
+                "Author": "someone",
+                "Status": 1,
+                "Content": "new content",
+                "Date": "new date"
+            }],
+            "Incoming": []
+        })
+
+    backend.migrate_edit_inboxes()
+
+    assert [edit["Edit"] for edit in backend.get_user_edits("editor")
+           ] == ["new content", "old content"]
+
+
+@pytest.mark.parametrize("action,content,status,revision", [
+    pytest.param("Accept", "edited content", 2, 1, id="Accepted edit"),
+    pytest.param("Decline", "Women in STEM", 3, 0, id="Declined edit")
 ])
-@patch('json.dumps')
-@patch('flaskr.backend.Backend.get_wiki_page')
-@patch('flaskr.backend.storage.Client')
-def test_author_edit_action(mock_client, mock_get_wiki_page, mock_json, action,
-                            result, page_data):
+def test_author_edit_action(action, content, status, revision, backend):
+    put_page(backend, make_page())
+    backend.edit_page_data("test-page", "edited content", "edit date", "editor")
 
-    edited_page_data = {
-        "Name":
-            "test-page",
-        "Author":
-            "Author's name",
-        "Content":
-            "Women in STEM",
-        "Image":
-            "link",
-        "Date":
-            "Date",
-        "Edits": [{
+    backend.author_edit_action("test-page", action)
+
+    assert get_page(backend,
+                    "test-page") == dict(make_page(edit_count=1,
+                                                   last_edit={
+                                                       "Date": "edit date",
+                                                       "Status": status,
+                                                       "Editor": "editor"
+                                                   },
+                                                   revision=revision),
+                                         Content=content)
+    assert backend.get_page_edits("test-page") == [{
+        "Content": "edited content",
+        "Date": "edit date",
+        "Status": status,
+        "Editor": "editor"
+    }]
+
+
+def test_author_edit_action_legacy(backend):
+    put_page(
+        backend,
+        make_legacy_page(edits=[{
             "Content": "edited content",
             "Date": "edit date",
             "Status": 1,
             "Editor": "editor"
-        }]
-    }
-    mock_json.return_value = result
-    mock_get_wiki_page.return_value = edited_page_data
+        }]))
+
+    backend.author_edit_action("test-page", "Accept")
+
+    page_data = get_page(backend, "test-page")
+    assert page_data["Content"] == "edited content"
+    assert page_data["LastEdit"]["Status"] == 2
+    assert backend.get_page_edits("test-page")[0]["Status"] == 2
+
+
+def test_edit_page_data_stores_delta(backend):
+    page_data = make_page()
+    page_data["Content"] = "".join(
+        f"Sentence number {i} about women in STEM. " for i in range(500))
+    put_page(backend, page_data)
+    edited = page_data["Content"].replace("number 250 ", "two hundred fifty ")
+
+    backend.edit_page_data("test-page", edited, "edit date", "editor")
+
+    edit_data, _ = backend.content_store.get_json(
+        "page-edits/test-page/00000000")
+    assert "Content" not in edit_data
+    assert edit_data["Base"] == 0
+    assert len(json.dumps(edit_data)) < len(edited) / 10
+    assert backend.get_page_edits("test-page")[0]["Content"] == edited
+
+
+@patch('flaskr.backend.SNAPSHOT_INTERVAL', 3)
+def test_author_edit_action_revisions(backend):
+    put_page(backend, make_page())
+    contents = [f"Women in STEM. Revision {i}." for i in range(1, 8)]
+    for content in contents:
+        backend.edit_page_data("test-page", content, "edit date", "editor")
+        backend.author_edit_action("test-page", "Accept")
+        backend.edit_page_data("test-page", content + " Declined.", "edit date",
+                               "other")
+        backend.author_edit_action("test-page", "Decline")
+
+    page_data = get_page(backend, "test-page")
+    snapshots = [
+        revision for revision in range(8)
+        if "Content" in backend.content_store.get_json(
+            f"page-revisions/test-page/{revision:08d}")[0]
+    ]
+    edits = backend.get_page_edits("test-page")
+    assert page_data["Revision"] == 7
+    assert page_data["Content"] == contents[-1]
+    assert snapshots == [0, 3, 6]
+    assert [edit["Content"] for edit in edits[::2]] == contents
+    assert [edit["Content"] for edit in edits[1::2]
+           ] == [content + " Declined." for content in contents]
+
+
+def race_first_read(backend, race):
+    # Runs race right after the first page read, before that caller writes back.
+    read_page = backend._read_page
+    raced = []
+
+    def read_then_race(page_name):
+        result = read_page(page_name)
+        if not raced:
+            raced.append(page_name)
+            race()
+        return result
+
+    return patch.object(backend, "_read_page", side_effect=read_then_race)
+
+
+def test_edit_page_data_skips_orphaned_edit(backend):
+    put_page(backend, make_page())
+    # Left behind by an editor whose header write never happened.
+    backend.content_store.put_json(
+        "page-edits/test-page/00000000", {
+            "Base": 0,
+            "Delta": ["orphan"],
+            "Date": "edit date",
+            "Status": 1,
+            "Editor": "other"
+        })
 
-    mock_bucket = MagicMock()
-    mock_client.return_value.bucket.return_value = mock_bucket
+    backend.edit_page_data("test-page", "my content", "edit date", "editor")
+    backend.edit_page_data("test-page", "more content", "edit date", "editor")
 
-    backend = Backend(content_bucket="test-content-bucket")
-    backend.author_edit_action("test-page", action)
+    page_data = get_page(backend, "test-page")
+    assert page_data["EditCount"] == 3
+    assert backend.get_page_edits("test-page")[-1]["Content"] == "more content"
+
+
+def test_edit_page_data_catalog_conflict(backend):
+    put_page(backend, make_page())
+
+    with patch.object(backend,
+                      "_update_page_catalog",
+                      side_effect=PreconditionFailed("catalog")):
+        backend.edit_page_data("test-page", "edited content", "edit date",
+                               "editor")
+
+    assert get_page(backend, "test-page")["EditCount"] == 1
+    assert [edit["Edit"] for edit in backend.get_user_edits("editor")
+           ] == ["edited content"]
+
+
+@patch('flaskr.blobstore.time.sleep')
+def test_edit_page_data_keeps_later_slots(mock_sleep, backend):
+    put_page(backend, make_page())
+    create_edit = backend._create_edit
+    raced = []
+
+    def create_then_race(*args):
+        # Another editor takes the next slot and counts it before our header write.
+        created = create_edit(*args)
+        if not raced:
+            raced.append(True)
+            backend.edit_page_data("test-page", "their content", "edit date",
+                                   "other")
+        return created
+
+    with patch.object(backend, "_create_edit", side_effect=create_then_race):
+        backend.edit_page_data("test-page", "my content", "edit date", "editor")
+
+    page_data = get_page(backend, "test-page")
+    assert page_data["EditCount"] == 2
+    assert page_data["LastEdit"]["Editor"] == "other"
+    assert [edit["Content"] for edit in backend.get_page_edits("test-page")
+           ] == ["my content", "their content"]
+
+
+@patch('flaskr.blobstore.time.sleep')
+def test_edit_page_data_concurrent_edit(mock_sleep, backend):
+    put_page(backend, make_page())
+
+    with race_first_read(
+            backend, lambda: backend.edit_page_data(
+                "test-page", "their content", "edit date", "other")):
+        backend.edit_page_data("test-page", "my content", "edit date", "editor")
+
+    page_data = get_page(backend, "test-page")
+    assert page_data["EditCount"] == 2
+    assert page_data["LastEdit"]["Editor"] == "editor"
+    assert [edit["Content"] for edit in backend.get_page_edits("test-page")
+           ] == ["their content", "my content"]
+    assert backend.get_write_conflicts() == 1
+
+
+@patch('flaskr.blobstore.time.sleep')
+def test_author_edit_action_concurrent_edit(mock_sleep, backend):
+    put_page(backend, make_page())
+    backend.edit_page_data("test-page", "edited content", "edit date", "editor")
 
-    mock_client.assert_called_once()
-    mock_get_wiki_page.assert_called_once_with("test-page")
-    mock_bucket.blob.assert_called_once_with('uploaded-pages/test-page')
-    mock_bucket.blob.return_value.upload_from_string(
-        data=result, content_type="application/json")
-    mock_json.assert_called_once_with(page_data)
+    with race_first_read(
+            backend, lambda: backend.edit_page_data(
+                "test-page", "newer content", "edit date", "other")):
+        backend.author_edit_action("test-page", "Accept")
+
+    page_data = get_page(backend, "test-page")
+    edits = backend.get_page_edits("test-page")
+    assert page_data["Content"] == "edited content"
+    assert page_data["LastEdit"]["Status"] == 1
+    assert [edit["Status"] for edit in edits] == [2, 1]
+    assert edits[1]["Content"] == "newer content"
+    assert backend.get_write_conflicts() == 1
+
+
+@pytest.fixture
+def precompute_backend(backend):
+    backend.precompute_translations = True
+    backend.content_store.put_json('translations/en-es.json', {
+        "Women": "Mujeres",
+        "in": "en"
+    })
+    return backend
+
+
+def test_precomputed_translation(precompute_backend):
+    backend = precompute_backend
+    backend.upload_file("test-page", "Author's name", make_upload(), "Date",
+                        "link")
+    backend.get_translator()
+    backend.content_store = MagicMock(wraps=backend.content_store)
+
+    with patch('flaskr.backend.Backend.translate_page') as mock_translate:
+        page_data = backend.get_wiki_page("test-page", "ES")
+
+    mock_translate.assert_not_called()
+    backend.content_store.get_json.assert_called_once_with(
+        "page-variants/ES/test-page")
+    backend.content_store.stat.assert_called_once_with(
+        "uploaded-pages/test-page")
+    assert page_data == dict(make_page(),
+                             Content="Mujeres en STEM",
+                             UploadRevision=0)
+
+
+def test_precomputed_translation_follows_edits(precompute_backend):
+    backend = precompute_backend
+    backend.upload_file("test-page", "Author's name", make_upload(), "Date",
+                        "link")
+
+    backend.edit_page_data("test-page", "Women in science", "edit date",
+                           "editor")
+    pending = backend.get_wiki_page("test-page", "ES")
+    backend.author_edit_action("test-page", "Accept")
+    accepted = backend.get_wiki_page("test-page", "ES")
+
+    assert pending["Content"] == "Mujeres en STEM"
+    assert pending["LastEdit"]["Status"] == 1
+    assert accepted["Content"] == "Mujeres en science"
+    assert accepted["LastEdit"]["Status"] == 2
+
+
+def test_precomputed_translation_refreshed(precompute_backend):
+    backend = precompute_backend
+    backend.upload_file("test-page", "Author's name", make_upload(), "Date",
+                        "link")
+    backend.upload_file("other-page", "Author's name",
+                        make_upload(b"Grace Hopper"), "Date", "link")
+    backend.content_store = MagicMock(wraps=backend.content_store)
+
+    backend.add_translations("STEM", "CTIM")
+    backend.wait_for_page_variants()
+    with patch('flaskr.backend.Backend.translate_page') as mock_translate:
+        other = backend.get_wiki_page("other-page", "ES")
+    mock_translate.assert_not_called()
+    page_data = backend.get_wiki_page("test-page", "ES")
+    backend.wait_for_page_variants()
+
+    assert other["Content"] == "Grace Hopper"
+    assert page_data["Content"] == "Mujeres en CTIM"
+    variant, _ = backend.content_store.get_json("page-variants/ES/test-page")
+    assert variant["Content"] == "Mujeres en CTIM"
+    backend.content_store.list.assert_not_called()
+    assert backend.content_store.stat(
+        "page-variants/ES/other-page").generation < backend.content_store.stat(
+            "translations/en-es.json").generation
+
+
+def test_precomputed_translation_several_changes(precompute_backend):
+    backend = precompute_backend
+    backend.upload_file("test-page", "Author's name", make_upload(), "Date",
+                        "link")
+    backend.upload_file("other-page", "Author's name",
+                        make_upload(b"Grace Hopper"), "Date", "link")
+
+    backend.add_translations("STEM", "CTIM")
+    backend.add_translations("Grace", "Gracia")
+
+    with patch('flaskr.backend.Backend.translate_page') as mock_translate:
+        mock_translate.return_value = "translated"
+        backend.get_wiki_page("test-page", "ES")
+        backend.get_wiki_page("other-page", "ES")
+    assert mock_translate.call_count == 2
+    backend.wait_for_page_variants()
+
+    with patch('flaskr.backend.Backend.translate_page') as mock_translate:
+        test_page = backend.get_wiki_page("test-page", "ES")
+        other = backend.get_wiki_page("other-page", "ES")
+    mock_translate.assert_not_called()
+    assert test_page["Content"] == "Mujeres en CTIM"
+    assert other["Content"] == "Gracia Hopper"
+
+
+def test_precomputed_translation_unrecorded_change(precompute_backend):
+    backend = precompute_backend
+    backend.upload_file("other-page", "Author's name",
+                        make_upload(b"Grace Hopper"), "Date", "link")
+
+    backend.content_store.put_json('translations/en-es.json', {
+        "Grace": "Gracia",
+    })
+    backend._invalidate_translations('translations/en-es.json')
+    page_data = backend.get_wiki_page("other-page", "ES")
+
+    assert page_data["Content"] == "Gracia Hopper"
+
+
+def test_precomputed_translation_outdated_page(precompute_backend):
+    backend = precompute_backend
+    backend.upload_file("test-page", "Author's name", make_upload(), "Date",
+                        "link")
+
+    with patch('flaskr.backend.Backend._store_page_variants'):
+        backend.edit_page_data("test-page", "Women in science", "edit date",
+                               "editor")
+        backend.author_edit_action("test-page", "Accept")
+    page_data = backend.get_wiki_page("test-page", "ES")
+
+    assert page_data["Content"] == "Mujeres en science"
+
+
+def test_precomputed_translation_outdated(precompute_backend):
+    backend = precompute_backend
+    backend.upload_file("test-page", "Author's name", make_upload(), "Date",
+                        "link")
+    backend.precompute_translations = False
+    backend.add_translations("STEM", "CTIM")
+    backend.precompute_translations = True
+
+    page_data = backend.get_wiki_page("test-page", "ES")
+
+    assert page_data["Content"] == "Mujeres en CTIM"
+    assert backend.refresh_page_variants() == 1
+    variant, _ = backend.content_store.get_json("page-variants/ES/test-page")
+    assert variant["Content"] == "Mujeres en CTIM"
+
+
+def test_create_backend_local(tmp_path):
+    backend = create_backend({
+        "STORAGE_ENGINE": "local",
+        "STORAGE_ROOT": str(tmp_path)
+    })
+
+    assert backend.user_store.root == str(tmp_path / "user-pw-bucket")
+    assert backend.content_store.root == str(tmp_path / "wikis-content")
+    assert backend.content_store.compress
+    assert not backend.precompute_translations
+    assert not backend.user_store.compress
+
+
+@patch('flaskr.backend.make_gcs_client')
+def test_create_backend_gcs(mock_make_client):
+    backend = create_backend({
+        "CONTENT_BUCKET": "test-content-bucket",
+        "STORAGE_POOL_SIZE": 32
+    })
+
+    mock_make_client.assert_called_once_with(32)
+    mock_make_client.return_value.bucket.assert_any_call("user-pw-bucket")
+    mock_make_client.return_value.bucket.assert_any_call("test-content-bucket")
+
+
+def test_create_backend_unknown_engine():
+    with pytest.raises(ValueError):
+        create_backend({"STORAGE_ENGINE": "ftp"})
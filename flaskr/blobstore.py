@@ -0,0 +1,448 @@
+from google.cloud import storage
+from google.api_core import exceptions as gcs_exceptions
+from google.auth.transport.requests import AuthorizedSession
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from requests.adapters import HTTPAdapter
+import google.auth
+import fcntl, gzip, json, logging, os, random, tempfile, threading, time
+
+# Number of times update_json re-reads and retries after losing a write race.
+MAX_WRITE_ATTEMPTS = 5
+
+# Retries after a lost write race wait a random delay of up to
+# RETRY_BASE_DELAY * 2 ** attempt seconds (capped at RETRY_MAX_DELAY), so
+# writers that collided do not collide again in lockstep.
+RETRY_BASE_DELAY = 0.01
+RETRY_MAX_DELAY = 0.5
+
+# Folder used by the local engine for in-flight writes. It lives next to the
+# stored keys so that os.replace() stays on the same filesystem.
+LOCAL_STAGING_FOLDER = ".staging"
+
+# File in the staging folder that the local engine locks around conditional writes, so
+# processes sharing a root serialize them too.
+LOCAL_LOCK_FILE = "lock"
+
+# Browser URL of objects for signed in google users, used when the client's credentials
+# cannot sign URLs.
+GCS_BROWSER_URL = "https://storage.cloud.google.com/{bucket}/{key}"
+
+# Stores created with compress=True gzip objects of at least MIN_COMPRESS_BYTES.
+# Reads recognise gzip data by its magic number, so compressed and plain objects
+# can live side by side (our objects are text or json, which never start with it).
+GZIP_MAGIC = b"\x1f\x8b"
+GZIP_ENCODING = "gzip"
+MIN_COMPRESS_BYTES = 256
+COMPRESS_LEVEL = 6
+
+BlobInfo = namedtuple("BlobInfo",
+                      ["name", "generation", "size", "updated", "content_type"])
+
+
+def make_gcs_client(pool_size=10):
+    '''
+        Make_gcs_client creates a google cloud storage client whose HTTP session keeps up to
+        pool_size keep-alive connections open, so concurrent requests reuse TLS connections
+        instead of opening new ones.
+
+        Credentials are discovered once here; the returned client should be shared by the
+        whole process.
+
+        Args:
+            pool_size: maximum number of pooled connections to the storage API.
+
+        Returns:
+            A google.cloud.storage.Client.
+    '''
+    credentials, project = google.auth.default()
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    return storage.Client(project=project,
+                          credentials=credentials,
+                          _http=session)
+
+
+def retry_delay(attempt):
+    '''
+        Retry_delay returns the jittered backoff, in seconds, before retry number attempt
+        (starting at 0).
+    '''
+    return random.uniform(0, min(RETRY_MAX_DELAY,
+                                 RETRY_BASE_DELAY * 2**attempt))
+
+
+def decode_blob(data):
+    '''
+        Decode_blob returns the stored bytes of an object, decompressing them if they
+        were written gzip compressed.
+    '''
+    if data is not None and data.startswith(GZIP_MAGIC):
+        return gzip.decompress(data)
+    return data
+
+
+class PreconditionFailed(Exception):
+    '''
+        Raised when a conditional write is rejected because the stored generation
+        no longer matches the one the caller expected.
+    '''
+
+
+class BlobStore(ABC):
+    '''
+        BlobStore is the storage interface used by the Backend and the flashcard helpers.
+
+        Objects are addressed by keys that follow our bucket layout (for example
+        "uploaded-pages/<name>" or "users-data/<username>"). Every stored object has a
+        generation number which changes on each write; a missing object has generation 0,
+        which mirrors the google cloud storage precondition semantics.
+
+        Subclasses implement the abstract get, put, list, stat and signed_url. The json/text
+        helpers are shared.
+
+        When compress is set, put gzips the data before it is stored and get transparently
+        decompresses it, so callers always see the original bytes. Sizes reported by list
+        and stat are the stored (compressed) sizes.
+    '''
+
+    compress = False
+
+    # Number of writes rejected because of a concurrent writer (see retry).
+    conflicts = 0
+    _conflicts_lock = threading.Lock()
+
+    def _encode(self, data):
+        '''
+            Returns the bytes to store for data and their content encoding (None if the
+            data is stored as-is).
+        '''
+        if not self.compress or len(data) < MIN_COMPRESS_BYTES:
+            return data, None
+        return gzip.compress(data, compresslevel=COMPRESS_LEVEL,
+                             mtime=0), GZIP_ENCODING
+
+    @abstractmethod
+    def get(self, key):
+        '''
+            Get downloads the object stored under key.
+
+            Returns:
+                A tuple of the object's bytes and its generation, or (None, 0) if
+                the object does not exist.
+        '''
+
+    @abstractmethod
+    def put(self,
+            key,
+            data,
+            content_type="text/plain",
+            if_generation_match=None):
+        '''
+            Put stores data under key.
+
+            Args:
+                key: key of the object.
+                data: bytes to store.
+                content_type: content type recorded with the object.
+                if_generation_match: if set, the write only succeeds when the current
+                    generation of the object matches it (0 means "must not exist").
+
+            Returns:
+                The generation of the newly written object.
+
+            Raises:
+                PreconditionFailed: if if_generation_match did not match.
+        '''
+
+    @abstractmethod
+    def list(self, prefix=""):
+        '''
+            List returns a BlobInfo for every object whose key starts with prefix.
+            Folder placeholder objects (keys ending in "/") are skipped.
+        '''
+
+    @abstractmethod
+    def stat(self, key):
+        '''
+            Stat returns the BlobInfo of a single object without downloading it,
+            or None if the object does not exist.
+        '''
+
+    @abstractmethod
+    def signed_url(self, key, expires_seconds):
+        '''
+            Signed_url returns a URL browsers can download the object from directly for
+            the next expires_seconds seconds, or None if the store cannot serve objects
+            by URL. Making the URL does not access the stored object.
+        '''
+
+    def exists(self, key):
+        return self.stat(key) is not None
+
+    def get_text(self, key):
+        data, generation = self.get(key)
+        if data is None:
+            return None, generation
+        return data.decode("utf-8"), generation
+
+    def put_text(self, key, text, if_generation_match=None):
+        return self.put(key,
+                        text.encode("utf-8"),
+                        content_type="text/plain",
+                        if_generation_match=if_generation_match)
+
+    def get_json(self, key):
+        data, generation = self.get(key)
+        if data is None:
+            return None, generation
+        return json.loads(data), generation
+
+    def put_json(self, key, value, if_generation_match=None):
+        return self.put(key,
+                        json.dumps(value).encode("utf-8"),
+                        content_type="application/json",
+                        if_generation_match=if_generation_match)
+
+    def retry(self, operation, attempts=MAX_WRITE_ATTEMPTS):
+        '''
+            Retry runs an optimistic read-modify-write operation until it completes.
+
+            operation reads the objects it needs together with their generations and
+            writes them back with if_generation_match. When one of those writes raises
+            PreconditionFailed, the conflict is counted, a jittered backoff (see
+            retry_delay) is waited and operation is called again from the start.
+
+            Args:
+                operation: function without arguments doing one attempt.
+                attempts: maximum number of attempts.
+
+            Returns:
+                What the successful call of operation returned.
+
+            Raises:
+                PreconditionFailed: if every attempt lost against a concurrent writer.
+        '''
+        for attempt in range(attempts):
+            try:
+                return operation()
+            except PreconditionFailed:
+                with self._conflicts_lock:
+                    self.conflicts += 1
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(retry_delay(attempt))
+
+    def update_json(self, key, mutate, attempts=MAX_WRITE_ATTEMPTS):
+        '''
+            Update_json applies mutate to the json object stored under key in one
+            read-modify-write.
+
+            The write is conditional on the generation that was read, so concurrent
+            writers never overwrite each other: if another write lands in between, the
+            object is read again and mutate is re-applied (see retry).
+
+            Args:
+                key: key of the json object.
+                mutate: function called with the current value (None if the object does
+                    not exist). It returns the value to store, or None to leave the
+                    object unchanged.
+                attempts: maximum number of read-modify-write attempts.
+
+            Returns:
+                A tuple of the stored value and its generation.
+
+            Raises:
+                PreconditionFailed: if every attempt lost against a concurrent writer.
+        '''
+
+        def attempt():
+            value, generation = self.get_json(key)
+            new_value = mutate(value)
+            if new_value is None:
+                return value, generation
+            return new_value, self.put_json(key,
+                                            new_value,
+                                            if_generation_match=generation)
+
+        return self.retry(attempt, attempts)
+
+
+class GcsBlobStore(BlobStore):
+    '''
+        GcsBlobStore stores objects in a google cloud storage bucket.
+
+        Compressed objects are uploaded with Content-Encoding: gzip and downloaded raw, so
+        they cross the network compressed and are only decompressed here.
+
+        Attributes:
+            client: google cloud storage client used for all requests.
+            bucket: the bucket holding the objects.
+            compress: whether put gzips the objects it writes.
+    '''
+
+    def __init__(self, client, bucket_name, compress=False):
+        self.client = client
+        self.bucket = client.bucket(bucket_name)
+        self.compress = compress
+
+    def get(self, key):
+        blob = self.bucket.blob(key)
+        try:
+            data = blob.download_as_bytes(raw_download=True)
+        except gcs_exceptions.NotFound:
+            return None, 0
+        return decode_blob(data), int(blob.generation or 0)
+
+    def put(self,
+            key,
+            data,
+            content_type="text/plain",
+            if_generation_match=None):
+        blob = self.bucket.blob(key)
+        data, blob.content_encoding = self._encode(data)
+        try:
+            blob.upload_from_string(data,
+                                    content_type=content_type,
+                                    if_generation_match=if_generation_match)
+        except gcs_exceptions.PreconditionFailed as err:
+            raise PreconditionFailed(key) from err
+        return int(blob.generation or 0)
+
+    def list(self, prefix=""):
+        return [
+            self._info(blob)
+            for blob in self.bucket.list_blobs(prefix=prefix)
+            if not blob.name.endswith("/")
+        ]
+
+    def stat(self, key):
+        blob = self.bucket.get_blob(key)
+        if blob is None:
+            return None
+        return self._info(blob)
+
+    def signed_url(self, key, expires_seconds):
+        try:
+            return self.bucket.blob(key).generate_signed_url(
+                version="v4",
+                expiration=timedelta(seconds=expires_seconds),
+                method="GET")
+        except AttributeError:
+            # Raised by the storage library when the credentials hold no private key.
+            logging.warning(
+                "Storage credentials cannot sign URLs, using browser URLs")
+            return GCS_BROWSER_URL.format(bucket=self.bucket.name, key=key)
+
+    def _info(self, blob):
+        return BlobInfo(blob.name, int(blob.generation or 0), blob.size,
+                        blob.updated, blob.content_type)
+
+
+class LocalBlobStore(BlobStore):
+    '''
+        LocalBlobStore stores objects as files below a root directory, using the same
+        key layout as the bucket (a key "uploaded-pages/page" becomes the file
+        "<root>/uploaded-pages/page").
+
+        It is meant for single-node deployments, tests and benchmarks. Generations are
+        the files' modification times in nanoseconds, kept strictly increasing per key.
+        Writes are serialized by a per-store thread lock and an fcntl.flock on a lock
+        file below the root, so conditional writes stay atomic across worker processes
+        sharing the directory (on a local filesystem; flock is not reliable over NFS).
+
+        Attributes:
+            root: directory holding the objects.
+            compress: whether put gzips the objects it writes.
+    '''
+
+    def __init__(self, root, compress=False):
+        self.root = os.path.abspath(root)
+        self.compress = compress
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        parts = key.split("/")
+        if not key or key.endswith("/") or any(
+                part in ("", ".", "..")
+                for part in parts) or parts[0] == LOCAL_STAGING_FOLDER:
+            raise ValueError(f"Invalid object key: {key!r}")
+        return os.path.join(self.root, *parts)
+
+    def _generation(self, path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+                generation = os.fstat(f.fileno()).st_mtime_ns
+        except (FileNotFoundError, IsADirectoryError):
+            return None, 0
+        return decode_blob(data), generation
+
+    def put(self,
+            key,
+            data,
+            content_type="text/plain",
+            if_generation_match=None):
+        path = self._path(key)
+        data, _ = self._encode(data)
+        staging = os.path.join(self.root, LOCAL_STAGING_FOLDER)
+        os.makedirs(staging, exist_ok=True)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with self._lock, open(os.path.join(staging, LOCAL_LOCK_FILE),
+                              "ab") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            previous = self._generation(path)
+            if if_generation_match is not None and if_generation_match != previous:
+                raise PreconditionFailed(key)
+
+            fd, tmp_path = tempfile.mkstemp(dir=staging)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+
+            # Stamp the generation before the rename so readers never observe the
+            # new content with the old generation.
+            generation = self._generation(tmp_path)
+            if generation <= previous:
+                generation = previous + 1
+                os.utime(tmp_path, ns=(generation, generation))
+            os.replace(tmp_path, path)
+            return generation
+
+    def list(self, prefix=""):
+        directory = os.path.join(self.root, *prefix.split("/")[:-1])
+        infos = []
+        for dirpath, dirnames, filenames in os.walk(directory):
+            if dirpath == self.root and LOCAL_STAGING_FOLDER in dirnames:
+                dirnames.remove(LOCAL_STAGING_FOLDER)
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    infos.append(self._info(key, path))
+        infos.sort(key=lambda info: info.name)
+        return infos
+
+    def stat(self, key):
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return None
+        return self._info(key, path)
+
+    def signed_url(self, key, expires_seconds):
+        # Local objects are not reachable by URL.
+        return None
+
+    def _info(self, key, path):
+        stat = os.stat(path)
+        updated = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+        return BlobInfo(key, stat.st_mtime_ns, stat.st_size, updated, None)
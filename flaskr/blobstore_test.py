@@ -0,0 +1,342 @@
+import pytest, json, multiprocessing, threading
+from flaskr.blobstore import BlobStore, GcsBlobStore, LocalBlobStore, PreconditionFailed, make_gcs_client, retry_delay
+from google.api_core import exceptions as gcs_exceptions
+from datetime import timedelta
+from unittest.mock import patch, MagicMock
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalBlobStore(tmp_path)
+
+
+def test_blobstore_is_abstract():
+    with pytest.raises(TypeError):
+        BlobStore()
+
+
+def test_local_get_missing(store):
+    assert store.get("uploaded-pages/missing") == (None, 0)
+    assert not store.exists("uploaded-pages/missing")
+
+
+def test_local_put_get(store):
+    generation = store.put("uploaded-pages/page", b"data")
+
+    assert store.get("uploaded-pages/page") == (b"data", generation)
+    assert store.exists("uploaded-pages/page")
+
+
+def test_local_generation_increases(store):
+    first = store.put("uploaded-pages/page", b"one")
+    second = store.put("uploaded-pages/page", b"two")
+
+    assert second > first > 0
+    assert store.stat("uploaded-pages/page").generation == second
+
+
+def test_local_conditional_put(store):
+    generation = store.put("users-data/mayo", b"hash", if_generation_match=0)
+
+    with pytest.raises(PreconditionFailed):
+        store.put("users-data/mayo", b"other", if_generation_match=0)
+    with pytest.raises(PreconditionFailed):
+        store.put("users-data/mayo", b"other", if_generation_match=1)
+
+    store.put("users-data/mayo", b"new", if_generation_match=generation)
+    assert store.get_text("users-data/mayo")[0] == "new"
+
+
+def test_local_list(store):
+    store.put_text("flashcards/ada-lovelace", "Ada")
+    store.put_text("flashcards/grace-hopper", "Grace")
+    store.put_text("uploaded-pages/page", "page")
+
+    names = [info.name for info in store.list("flashcards/")]
+    partial = [info.name for info in store.list("flashcards/g")]
+
+    assert names == ["flashcards/ada-lovelace", "flashcards/grace-hopper"]
+    assert partial == ["flashcards/grace-hopper"]
+    assert store.list("missing/") == []
+
+
+def test_local_json_roundtrip(store):
+    store.put_json("translations/en-es.json", {"hello": "hola"})
+
+    assert store.get_json("translations/en-es.json")[0] == {"hello": "hola"}
+
+
+@pytest.mark.parametrize("key",
+                         ["", "pages/", "../secret", "a//b", ".staging/x"])
+def test_local_invalid_key(store, key):
+    with pytest.raises(ValueError):
+        store.put(key, b"data")
+
+
+def test_local_compressed_roundtrip(tmp_path):
+    store = LocalBlobStore(tmp_path, compress=True)
+    page = {"Content": "Women in STEM. " * 200}
+
+    store.put_json("uploaded-pages/page", page)
+
+    assert store.get_json("uploaded-pages/page")[0] == page
+    assert store.stat("uploaded-pages/page").size < len(json.dumps(page)) / 3
+    with open(tmp_path / "uploaded-pages" / "page", "rb") as f:
+        assert f.read(2) == b"\x1f\x8b"
+
+
+def test_local_compressed_reads_plain_objects(tmp_path):
+    LocalBlobStore(tmp_path).put_text("flashcards/ada", "Ada " * 100)
+    store = LocalBlobStore(tmp_path, compress=True)
+    store.put_text("users-data/mayo", "hash")
+
+    assert store.get_text("flashcards/ada")[0] == "Ada " * 100
+    # Objects below MIN_COMPRESS_BYTES are stored as-is.
+    assert store.stat("users-data/mayo").size == 4
+
+
+def test_gcs_get():
+    mock_client = MagicMock()
+    mock_blob = mock_client.bucket.return_value.blob.return_value
+    mock_blob.download_as_bytes.return_value = b"data"
+    mock_blob.generation = "12"
+
+    store = GcsBlobStore(mock_client, "test-bucket")
+
+    assert store.get("uploaded-pages/page") == (b"data", 12)
+    mock_blob.download_as_bytes.assert_called_once_with(raw_download=True)
+    mock_client.bucket.assert_called_once_with("test-bucket")
+    mock_client.bucket.return_value.blob.assert_called_once_with(
+        "uploaded-pages/page")
+
+
+def test_gcs_get_missing():
+    mock_client = MagicMock()
+    mock_blob = mock_client.bucket.return_value.blob.return_value
+    mock_blob.download_as_bytes.side_effect = gcs_exceptions.NotFound("gone")
+
+    store = GcsBlobStore(mock_client, "test-bucket")
+
+    assert store.get("uploaded-pages/page") == (None, 0)
+
+
+def test_gcs_put_precondition_failed():
+    mock_client = MagicMock()
+    mock_blob = mock_client.bucket.return_value.blob.return_value
+    mock_blob.upload_from_string.side_effect = gcs_exceptions.PreconditionFailed(
+        "changed")
+
+    store = GcsBlobStore(mock_client, "test-bucket")
+
+    with pytest.raises(PreconditionFailed):
+        store.put("users-data/mayo", b"hash", if_generation_match=0)
+    mock_blob.upload_from_string.assert_called_once_with(
+        b"hash", content_type="text/plain", if_generation_match=0)
+
+
+def test_gcs_compressed_put_get():
+    mock_client = MagicMock()
+    mock_blob = mock_client.bucket.return_value.blob.return_value
+    store = GcsBlobStore(mock_client, "test-bucket", compress=True)
+    text = "Women in STEM. " * 100
+
+    store.put_text("uploaded-pages/page", text)
+    uploaded = mock_blob.upload_from_string.call_args[0][0]
+    mock_blob.download_as_bytes.return_value = uploaded
+
+    assert mock_blob.content_encoding == "gzip"
+    assert len(uploaded) < len(text)
+    assert store.get_text("uploaded-pages/page")[0] == text
+
+
+def test_gcs_list_skips_folders():
+    mock_client = MagicMock()
+    folder = MagicMock()
+    folder.name = "flashcards/"
+    card = MagicMock()
+    card.name = "flashcards/ada-lovelace"
+    card.generation = 3
+    mock_client.bucket.return_value.list_blobs.return_value = [folder, card]
+
+    store = GcsBlobStore(mock_client, "test-bucket")
+    infos = store.list("flashcards/")
+
+    assert [info.name for info in infos] == ["flashcards/ada-lovelace"]
+    mock_client.bucket.return_value.list_blobs.assert_called_once_with(
+        prefix="flashcards/")
+
+
+def test_gcs_signed_url():
+    mock_client = MagicMock()
+    mock_blob = mock_client.bucket.return_value.blob.return_value
+    mock_blob.generate_signed_url.return_value = "https://signed"
+
+    store = GcsBlobStore(mock_client, "test-bucket")
+
+    assert store.signed_url("About-content/sam.jpg", 60) == "https://signed"
+    mock_blob.generate_signed_url.assert_called_once_with(
+        version="v4", expiration=timedelta(seconds=60), method="GET")
+
+
+def test_gcs_signed_url_without_signing_key():
+    mock_client = MagicMock()
+    mock_client.bucket.return_value.name = "test-bucket"
+    mock_blob = mock_client.bucket.return_value.blob.return_value
+    mock_blob.generate_signed_url.side_effect = AttributeError
+
+    store = GcsBlobStore(mock_client, "test-bucket")
+
+    assert store.signed_url(
+        "About-content/sam.jpg", 60
+    ) == "https://storage.cloud.google.com/test-bucket/About-content/sam.jpg"
+
+
+def test_local_signed_url(store):
+    store.put("About-content/sam.jpg", b"jpg")
+
+    assert store.signed_url("About-content/sam.jpg", 60) is None
+
+
+@patch('flaskr.blobstore.storage.Client')
+@patch('flaskr.blobstore.AuthorizedSession')
+@patch('flaskr.blobstore.google.auth.default')
+def test_make_gcs_client(mock_default, mock_session, mock_client):
+    mock_credentials = MagicMock()
+    mock_default.return_value = (mock_credentials, "test-project")
+
+    client = make_gcs_client(pool_size=4)
+
+    assert client == mock_client.return_value
+    mock_session.assert_called_once_with(mock_credentials)
+    adapter = mock_session.return_value.mount.call_args[0][1]
+    assert adapter._pool_maxsize == 4
+    mock_client.assert_called_once_with(project="test-project",
+                                        credentials=mock_credentials,
+                                        _http=mock_session.return_value)
+
+
+def test_update_json(store):
+    store.put_json("translations/en-es.json", {"hello": "hola"})
+
+    value, generation = store.update_json(
+        "translations/en-es.json", lambda data: dict(data, women="mujeres"))
+
+    assert value == {"hello": "hola", "women": "mujeres"}
+    assert store.get_json("translations/en-es.json") == (value, generation)
+
+
+def test_update_json_missing_object(store):
+    value, _ = store.update_json("catalog/pages.json", lambda data: data or {})
+
+    assert value == {}
+    assert store.exists("catalog/pages.json")
+
+
+def test_update_json_unchanged(store):
+    generation = store.put_json("translations/en-es.json", {"hello": "hola"})
+
+    assert store.update_json("translations/en-es.json", lambda data: None) == ({
+        "hello": "hola"
+    }, generation)
+    assert store.stat("translations/en-es.json").generation == generation
+
+
+def test_update_json_retries_on_conflict(store):
+    store.put_json("translations/en-es.json", {})
+    calls = []
+
+    def mutate(data):
+        calls.append(dict(data))
+        if len(calls) == 1:
+            # A concurrent writer lands between our read and our write.
+            store.put_json("translations/en-es.json", {"hello": "hola"})
+        return dict(data, women="mujeres")
+
+    value, _ = store.update_json("translations/en-es.json", mutate)
+
+    assert calls == [{}, {"hello": "hola"}]
+    assert value == {"hello": "hola", "women": "mujeres"}
+
+
+@patch('flaskr.blobstore.time.sleep')
+def test_update_json_gives_up(mock_sleep, store):
+
+    def mutate(data):
+        store.put_json("translations/en-es.json", {})
+        return {"hello": "hola"}
+
+    with pytest.raises(PreconditionFailed):
+        store.update_json("translations/en-es.json", mutate, attempts=2)
+    assert store.conflicts == 2
+    mock_sleep.assert_called_once()
+
+
+@patch('flaskr.blobstore.time.sleep')
+def test_retry_counts_conflicts(mock_sleep, store):
+    results = iter([PreconditionFailed("a"), PreconditionFailed("b"), "done"])
+
+    def operation():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert store.retry(operation) == "done"
+    assert store.conflicts == 2
+    assert mock_sleep.call_count == 2
+
+
+@pytest.mark.parametrize("attempt", [0, 3, 10])
+def test_retry_delay(attempt):
+    delays = [retry_delay(attempt) for _ in range(100)]
+
+    assert all(0 <= delay <= 0.5 for delay in delays)
+    assert all(delay <= 0.01 * 2**attempt for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_update_json_concurrent_writers(store):
+    store.put_json("counter.json", 0)
+
+    def increment():
+        for _ in range(10):
+            store.update_json("counter.json",
+                              lambda value: value + 1,
+                              attempts=100)
+
+    threads = [threading.Thread(target=increment) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert store.get_json("counter.json")[0] == 40
+
+
+def create_if_absent(root, key, barrier, results):
+    store = LocalBlobStore(root)
+    barrier.wait()
+    try:
+        store.put(key, b"mine", if_generation_match=0)
+        results.put(True)
+    except PreconditionFailed:
+        results.put(False)
+
+
+def test_local_create_if_absent_across_processes(tmp_path):
+    context = multiprocessing.get_context("fork")
+    for trial in range(10):
+        barrier = context.Barrier(4)
+        results = context.Queue()
+        processes = [
+            context.Process(target=create_if_absent,
+                            args=(str(tmp_path), f"key{trial}", barrier,
+                                  results)) for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        assert sorted(
+            results.get() for _ in processes) == [False, False, False, True]
@@ -0,0 +1,19 @@
+import pytest
+
+
+class FakeClock:
+    '''
+        FakeClock stands in for time.monotonic in tests. Tests move time forward by
+        setting now.
+    '''
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
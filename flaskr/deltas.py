@@ -0,0 +1,109 @@
+from collections import Counter
+from difflib import SequenceMatcher
+import re
+
+# Pages are diffed sentence by sentence: a segment ends after sentence punctuation
+# (with the spaces following it) or after a line break. Joining the segments gives
+# back the original text.
+SEGMENT_PATTERN = re.compile(r"[^\n.!?]*(?:[.!?]+[ \t]*|\n)|[^\n.!?]+")
+
+# Most segment comparisons make_delta lets the matcher do. Matching costs about one
+# comparison per pair of equal segments (one in each text), which grows quadratically
+# when segments repeat, like blank lines do. Changes over the budget are stored as one
+# insert of the changed text.
+MAX_MATCH_WORK = 200000
+
+
+def split_segments(text):
+    '''
+        Split_segments splits text into the sentence and line segments that deltas are
+        made of.
+    '''
+    return SEGMENT_PATTERN.findall(text)
+
+
+def make_delta(base, new):
+    '''
+        Make_delta encodes new as a list of changes against base.
+
+        The delta is a json friendly list whose items are either [start, end], meaning
+        "copy base segments start to end", or a string inserted as-is. Unchanged parts of
+        the page therefore cost a couple of integers instead of a copy of the text.
+
+        Args:
+            base: the text the change was made on.
+            new: the changed text.
+
+        The segments both texts start and end with are copied without matching. If the
+        rest would take more than MAX_MATCH_WORK comparisons to match, it is stored as a
+        single insert, so making a delta stays linear in the size of the page.
+
+        Returns:
+            The delta, to be passed to apply_delta together with base.
+    '''
+    base_segments = split_segments(base)
+    new_segments = split_segments(new)
+    prefix = 0
+    limit = min(len(base_segments), len(new_segments))
+    while prefix < limit and base_segments[prefix] == new_segments[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and base_segments[
+            -1 - suffix] == new_segments[-1 - suffix]:
+        suffix += 1
+    base_middle = base_segments[prefix:len(base_segments) - suffix]
+    new_middle = new_segments[prefix:len(new_segments) - suffix]
+
+    delta = [[0, prefix]] if prefix else []
+    if _match_work(base_middle, new_middle) > MAX_MATCH_WORK:
+        if new_middle:
+            delta.append("".join(new_middle))
+    else:
+        matcher = SequenceMatcher(None, base_middle, new_middle, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                delta.append([prefix + i1, prefix + i2])
+            elif j1 < j2:
+                delta.append("".join(new_middle[j1:j2]))
+    if suffix:
+        delta.append([len(base_segments) - suffix, len(base_segments)])
+    return _merge_copies(delta)
+
+
+def _match_work(base_segments, new_segments):
+    new_counts = Counter(new_segments)
+    return sum(count * new_counts[segment]
+               for segment, count in Counter(base_segments).items())
+
+
+def _merge_copies(delta):
+    merged = []
+    for change in delta:
+        if (merged and not isinstance(change, str) and
+                not isinstance(merged[-1], str) and merged[-1][1] == change[0]):
+            merged[-1] = [merged[-1][0], change[1]]
+        else:
+            merged.append(change)
+    return merged
+
+
+def apply_delta(base, delta):
+    '''
+        Apply_delta rebuilds the text encoded by delta (see make_delta).
+
+        Args:
+            base: the text the delta was made against.
+            delta: the list of changes returned by make_delta.
+
+        Returns:
+            The rebuilt text.
+    '''
+    base_segments = split_segments(base)
+    pieces = []
+    for change in delta:
+        if isinstance(change, str):
+            pieces.append(change)
+        else:
+            start, end = change
+            pieces.extend(base_segments[start:end])
+    return "".join(pieces)
@@ -0,0 +1,62 @@
+import pytest, time
+from flaskr.deltas import apply_delta, make_delta, split_segments
+
+
+@pytest.mark.parametrize("text", [
+    "", "Women in STEM", "One. Two! Three?\nFour\n\nFive...  Six",
+    "Trailing newline.\n", "No punctuation at all"
+])
+def test_split_segments_roundtrip(text):
+    assert "".join(split_segments(text)) == text
+
+
+@pytest.mark.parametrize("base,new", [
+    pytest.param("", "Women in STEM.", id="from empty"),
+    pytest.param("Women in STEM.", "", id="to empty"),
+    pytest.param("One. Two. Three.", "One. Deux. Three.", id="replace"),
+    pytest.param("One. Three.", "One. Two. Three.", id="insert"),
+    pytest.param("One. Two. Three.", "One. Three.", id="delete"),
+    pytest.param("Line one\nLine two\n", "Line two\nLine one\n", id="reorder"),
+])
+def test_apply_delta(base, new):
+    assert apply_delta(base, make_delta(base, new)) == new
+
+
+def test_make_delta_copies_unchanged_text():
+    base = "".join(f"Sentence {i}. " for i in range(100))
+    new = base.replace("Sentence 50. ", "Changed sentence. ")
+
+    delta = make_delta(base, new)
+
+    assert delta == [[0, 50], "Changed sentence. ", [51, 100]]
+
+
+@pytest.mark.parametrize("base", [
+    pytest.param("".join(f"Paragraph {i}.\n\n" for i in range(3000)),
+                 id="blank lines"),
+    pytest.param("Women in STEM. " * 20000, id="repeated sentences"),
+])
+def test_make_delta_large_repetitive_page(base):
+    edits = [
+        base[:len(base) // 3] + "Inserted. " + base[len(base) // 2:],
+        "Title.\n" + base.replace("9.", "Nine.") + "The end."
+    ]
+
+    for new in edits:
+        start = time.perf_counter()
+        delta = make_delta(base, new)
+        elapsed = time.perf_counter() - start
+
+        assert apply_delta(base, delta) == new
+        assert elapsed < 1
+        assert sum(len(change)
+                   for change in delta
+                   if isinstance(change, str)) <= len(new)
+
+
+def test_make_delta_over_work_budget(monkeypatch):
+    monkeypatch.setattr("flaskr.deltas.MAX_MATCH_WORK", 1)
+    base = "Start. One. Two. End."
+    new = "Start. Two. One. End."
+
+    assert make_delta(base, new) == [[0, 1], "Two. One. ", [3, 4]]
@@ -1,7 +1,23 @@
 from flaskr.backend import Backend
+from flaskr.blobstore import PreconditionFailed
+from concurrent.futures import ThreadPoolExecutor
+import csv, io, json
 import string
 import random
 
+# Per-row results of import_cards
+CARD_CREATED = "created"
+CARD_EXISTS = "exists"
+CARD_DUPLICATE = "duplicate"
+CARD_INVALID = "invalid"
+
+# First-row cells recognised as a header in card import files.
+CARD_HEADER_NAMES = {"firstname", "first name", "first"}
+CARD_FIELDS = ["firstname", "lastname", "contribution"]
+
+# Letters with a deck of their own; every other first character shares the "_" deck.
+DECK_LETTERS = string.ascii_lowercase + string.digits
+
 
 def format_cardname(firstname, lastname):
     '''
@@ -22,24 +38,207 @@ def create_card(Backend, firstname, lastname, contribution):
     '''
     This method stores the details of a new card created by a user.
 
+    The card is created with a single conditional write that only succeeds if no card with
+    the same name exists, so two users creating the same card at once cannot overwrite
+    each other.
+
     Args:
         Backend
         firstname: firstname is entered by the user.
         lastname: lastname is entered by the user.
         contribution: contribution is entered by the user.
+
+    Returns:
+        True if the card was created, False if a card with this name already exists.
     '''
     card_name = format_cardname(firstname, lastname)
-    bucket = Backend.storage_client.bucket(Backend.content_bucket)
-    cardblob = bucket.blob(Backend.card_prefix + card_name)
+    try:
+        Backend.content_store.put_text(Backend.card_prefix + card_name,
+                                       contribution,
+                                       if_generation_match=0)
+    except PreconditionFailed:
+        return False
+    add_to_deck(Backend, {card_name: contribution})
+    return True
+
+
+def import_cards(Backend, rows, max_workers=None):
+    '''
+    This method creates many flashcards at once, for example from an uploaded file (see
+    parse_card_file).
+
+    Rows are validated and de-duplicated against the existing cards (one listing of the
+    flashcard folder) and against each other first. The remaining cards are written
+    concurrently by a bounded pool of workers, each with the same conditional write as
+    create_card, and every deck is then updated once.
+
+    Args:
+        Backend
+        rows: iterable of (firstname, lastname, contribution) tuples.
+        max_workers: number of cards written in parallel. Defaults to Backend.fetch_workers.
+
+    Returns:
+        A list with one dictionary per row holding its row number ("Row"), card name
+        ("Card") and status ("Status": created, exists, duplicate or invalid).
+    '''
+    existing = get_flashcards(Backend)
+    results = []
+    pending = {}
+    for number, row in enumerate(rows, start=1):
+        result = {"Row": number, "Card": None, "Status": CARD_INVALID}
+        results.append(result)
+        if len(row) != 3 or not all(
+                isinstance(cell, str) and cell.strip() for cell in row):
+            continue
+        firstname, lastname, contribution = row
+        card_name = format_cardname(firstname, lastname)
+        result["Card"] = card_name
+        if card_name in existing:
+            result["Status"] = CARD_EXISTS
+        elif card_name in pending:
+            result["Status"] = CARD_DUPLICATE
+        else:
+            pending[card_name] = (result, contribution.strip())
+
+    def write(card_name):
+        result, contribution = pending[card_name]
+        try:
+            Backend.content_store.put_text(Backend.card_prefix + card_name,
+                                           contribution,
+                                           if_generation_match=0)
+        except PreconditionFailed:
+            result["Status"] = CARD_EXISTS
+        else:
+            result["Status"] = CARD_CREATED
+
+    with ThreadPoolExecutor(
+            max_workers=max_workers or Backend.fetch_workers) as executor:
+        list(executor.map(write, pending))
+
+    decks = {}
+    for card_name, (result, contribution) in pending.items():
+        if result["Status"] == CARD_CREATED:
+            decks.setdefault(deck_key(Backend, card_name[0]),
+                             {})[card_name] = contribution
+    for cards in decks.values():
+        add_to_deck(Backend, cards)
+    return results
+
+
+def parse_card_file(filename, data):
+    '''
+    This method reads flashcard rows from an uploaded file.
+
+    A .csv file holds one "firstname,lastname,contribution" row per card, optionally
+    preceded by a header row. A .json file holds a list of objects with firstname, lastname
+    and contribution keys, or a list of [firstname, lastname, contribution] lists.
+
+    Args:
+        filename: name of the uploaded file, used to pick the format.
+        data: the file's bytes.
+
+    Returns:
+        A list of rows, to be passed to import_cards. Malformed rows are kept so that
+        import_cards reports them as invalid.
+
+    Raises:
+        ValueError: if the file type is not supported or the file cannot be parsed.
+    '''
+    text = data.decode("utf-8-sig")
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+
+    if extension == "json":
+        value = json.loads(text)
+        if not isinstance(value, list):
+            raise ValueError("Card files must hold a list of cards")
+        rows = []
+        for row in value:
+            if isinstance(row, dict):
+                row = [row.get(field) for field in CARD_FIELDS]
+            rows.append(tuple(row) if isinstance(row, list) else ())
+        return rows
+    if extension == "csv":
+        rows = [tuple(row) for row in csv.reader(io.StringIO(text)) if row]
+        if rows and rows[0][0].strip().lower() in CARD_HEADER_NAMES:
+            rows = rows[1:]
+        return rows
+    raise ValueError("Card files must be .csv or .json")
+
+
+def deck_key(Backend, letter):
+    '''
+    This method returns the key of the deck holding the cards that begin with letter.
+    Only the first character of letter is used. Cards that do not begin with a letter
+    from a to z or a digit share the "_" deck, so there are at most 37 decks.
+    '''
+    letter = letter[:1].lower()
+    if not letter or letter not in DECK_LETTERS:
+        letter = "_"
+    return Backend.deck_prefix + letter
+
+
+def get_deck(Backend, letter):
+    '''
+    This method returns the deck of cards that begin with letter.
+
+    Cards are grouped in one small object per letter, so picking a card reads a single
+    object however many cards exist. Decks missing from storage (cards created before
+    decks existed) are built once from the flashcard folder.
+
+    Args:
+        Backend
+        letter: first letter of the cards (see deck_key).
+
+    Returns:
+        A dictionary mapping card names to contributions, empty if letter is empty.
+    '''
+    if not letter:
+        return {}
+    deck, _ = Backend.content_store.get_json(deck_key(Backend, letter))
+    if deck is None:
+        deck, _ = Backend.content_store.update_json(
+            deck_key(Backend, letter), lambda deck: scan_deck(Backend, letter)
+            if deck is None else None)
+    return deck
 
-    with cardblob.open("w") as f:
-        f.write(contribution)
+
+def scan_deck(Backend, letter):
+    '''
+    This method builds the deck of a letter from the cards stored in the flashcard folder.
+    '''
+    deck = {}
+    for cardblob in Backend.content_store.list(Backend.card_prefix):
+        card_name = cardblob.name.removeprefix(Backend.card_prefix)
+        if card_name and deck_key(Backend, card_name[0]) == deck_key(
+                Backend, letter):
+            deck[card_name], _ = Backend.content_store.get_text(cardblob.name)
+    return deck
+
+
+def add_to_deck(Backend, cards):
+    '''
+    This method adds cards that share a deck to it in one write.
+
+    Args:
+        Backend
+        cards: dictionary mapping card names to contributions.
+    '''
+    letter = next(iter(cards))[0]
+
+    def add(deck):
+        if deck is None:
+            deck = scan_deck(Backend, letter)
+        deck.update(cards)
+        return deck
+
+    Backend.content_store.update_json(deck_key(Backend, letter), add)
 
 
 def does_flashcard_exist(Backend, firstname, lastname):
     '''
     This method is used to check if a flashcard with a cardname already exists.
     If the flashcard exists, it returns True, otherwise, it returns False.
+    The check is a single lookup of the card's key.
 
     Args:
         Backend
@@ -50,28 +249,21 @@ def does_flashcard_exist(Backend, firstname, lastname):
         A boolean indicating if the flashcard exists or not.
     '''
     card_name = format_cardname(firstname, lastname)
-    flashcards = get_flashcards(Backend)
-
-    if card_name in flashcards:
-        return True
-
-    return False
+    return Backend.content_store.exists(Backend.card_prefix + card_name)
 
 
-def get_alert_message(Backend, firstname, lastname):
+def get_alert_message(created):
     '''
     This method is used to get an appropriate alert message after a user attempts to create a card.
 
     Args:
-        Backend
-        firstname: Obtained from the form filled by the user.
-        lastname: Obtained from the form filled by the user.
+        created: the result of create_card.
     
     Returns:
         A string containing a success or failure message for the card creation.
     '''
 
-    if does_flashcard_exist(Backend, firstname, lastname):
+    if not created:
         alert_message = "Ooops, there is a flashcard with this name."
 
     else:
@@ -91,10 +283,8 @@ def get_flashcards(Backend):
         A set containing all the card names stored in the flashcard folder.
     '''
     cards = set()
-    bucket = Backend.storage_client.bucket(Backend.content_bucket)
-    cardblobs = list(bucket.list_blobs(prefix=Backend.card_prefix))
-    print(cardblobs)
-    for flashcard in cardblobs[1:]:
+    cardblobs = Backend.content_store.list(Backend.card_prefix)
+    for flashcard in cardblobs:
         cards.add(flashcard.name.removeprefix(Backend.card_prefix))
 
     return cards
@@ -112,19 +302,33 @@ def get_card_name(Backend, letter):
     Returns:
         The cardname for a flashcard as a string.
     '''
+    card_name, _ = get_random_card(Backend, letter)
+    return card_name
+
+
+def get_random_card(Backend, letter):
+    '''
+    This method randomly picks a flashcard that begins with letter and returns its name and
+    display information, reading only that letter's deck.
+
+    Args:
+        Backend
+        letter: This is passed in from the users click on the card
+
+    Returns:
+        A tuple of the cardname and its display information. If there are no cards for that
+        letter, a default message and default information are returned.
+    '''
     no_card_name = "Oops! There is no flashcard for this letter yet."
-    flashcards = get_flashcards(Backend)
-    cards = []
-    for name in flashcards:
-        if name and letter.lower() == name[0]:
-            cards.append(name)
+    default_info = "..."
+    deck = get_deck(Backend, letter)
+    cards = list(deck)
 
     if not cards:
-        return no_card_name
+        return no_card_name, default_info
 
-    random_index = random.randint(0, len(cards) - 1)
-    name = cards[random_index]
-    return name
+    name = random.choice(cards)
+    return name, deck[name]
 
 
 def get_formatted_display_name(Backend, cardname):
@@ -162,9 +366,7 @@ def get_card_display_info(Backend, cardname):
     if "Oops!" in cardname:
         return default_info
 
-    bucket = Backend.storage_client.bucket(Backend.content_bucket)
-    cardblob = bucket.blob(Backend.card_prefix + cardname)
-
-    with cardblob.open("r") as f:
-        card_display_info = (f.read())
-        return card_display_info
\ No newline at end of file
+    card_display_info = get_deck(Backend, cardname[0]).get(cardname)
+    if card_display_info is None:
+        return default_info
+    return card_display_info
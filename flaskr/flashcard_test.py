@@ -0,0 +1,154 @@
+import pytest
+from flaskr.backend import Backend
+from flaskr.blobstore import LocalBlobStore
+from flaskr.flashcard import *
+from unittest.mock import MagicMock
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return Backend(user_store=LocalBlobStore(tmp_path / "user-pw-bucket"),
+                   content_store=LocalBlobStore(tmp_path / "wikis-content"))
+
+
+def test_create_card_updates_deck(backend):
+    create_card(backend, "Ada", "Lovelace", "First programmer")
+    create_card(backend, "Alice", "Ball", "Leprosy treatment")
+    create_card(backend, "Grace", "Hopper", "COBOL")
+
+    assert get_deck(backend, "A") == {
+        "ada-lovelace": "First programmer",
+        "alice-ball": "Leprosy treatment"
+    }
+    assert get_deck(backend, "g") == {"grace-hopper": "COBOL"}
+
+
+def test_get_random_card_single_read(backend):
+    create_card(backend, "Ada", "Lovelace", "First programmer")
+    backend.content_store = MagicMock(wraps=backend.content_store)
+
+    card = get_random_card(backend, "A")
+
+    assert card == ("ada-lovelace", "First programmer")
+    backend.content_store.get_json.assert_called_once_with("flashcard-decks/a")
+    backend.content_store.list.assert_not_called()
+
+
+def test_get_random_card_empty_deck(backend):
+    assert get_random_card(
+        backend,
+        "Z") == ("Oops! There is no flashcard for this letter yet.", "...")
+    assert get_card_display_info(
+        backend, "Oops! There is no flashcard for this letter yet.") == "..."
+
+
+def test_deck_keys_are_bounded(backend):
+    create_card(backend, "Ada", "Lovelace", "First programmer")
+    create_card(backend, "Émilie", "du Châtelet", "Translated Newton")
+
+    assert get_deck(backend, "abc") == {"ada-lovelace": "First programmer"}
+    assert get_deck(backend, "Ω") == {"émilie-du châtelet": "Translated Newton"}
+    assert get_deck(backend, "") == {}
+    assert get_random_card(backend, "123456")[1] == "..."
+    assert sorted(
+        blob.name
+        for blob in backend.content_store.list("flashcard-decks/")) == [
+            "flashcard-decks/1", "flashcard-decks/_", "flashcard-decks/a"
+        ]
+
+
+def test_deck_built_from_existing_cards(backend):
+    backend.content_store.put_text("flashcards/ada-lovelace",
+                                   "First programmer")
+    backend.content_store.put_text("flashcards/grace-hopper", "COBOL")
+
+    create_card(backend, "Alice", "Ball", "Leprosy treatment")
+
+    assert get_deck(backend, "a") == {
+        "ada-lovelace": "First programmer",
+        "alice-ball": "Leprosy treatment"
+    }
+    assert get_card_display_info(backend, "grace-hopper") == "COBOL"
+    assert backend.content_store.exists("flashcard-decks/g")
+
+
+def test_create_card_once(backend):
+    assert not does_flashcard_exist(backend, "Ada", "Lovelace")
+
+    assert create_card(backend, "Ada", "Lovelace", "First programmer")
+    assert not create_card(backend, " ada", "LOVELACE ", "Someone else")
+
+    assert does_flashcard_exist(backend, "Ada", "Lovelace")
+    assert get_card_display_info(backend, "ada-lovelace") == "First programmer"
+
+
+def test_create_card_single_write(backend):
+    create_card(backend, "Alice", "Ball", "Leprosy treatment")
+    backend.content_store = MagicMock(wraps=backend.content_store)
+
+    create_card(backend, "Ada", "Lovelace", "First programmer")
+
+    backend.content_store.list.assert_not_called()
+    backend.content_store.put_text.assert_called_once_with(
+        "flashcards/ada-lovelace", "First programmer", if_generation_match=0)
+
+
+@pytest.mark.parametrize("created,message", [
+    (True,
+     "You have successfully created your flashcard! Create another card!"),
+    (False, "Ooops, there is a flashcard with this name."),
+])
+def test_get_alert_message(created, message):
+    assert get_alert_message(created) == message
+
+
+def test_import_cards(backend):
+    create_card(backend, "Ada", "Lovelace", "First programmer")
+    rows = [("Grace", "Hopper", "COBOL"), ("Ada", "Lovelace", "Again"),
+            ("", "Ball", "Leprosy treatment"), ("Alice", "Ball", "Leprosy"),
+            ("alice ", "BALL", "Duplicate"), ("Katherine", "Johnson")]
+
+    results = import_cards(backend, rows, max_workers=2)
+
+    assert [(result["Card"], result["Status"]) for result in results
+           ] == [("grace-hopper", "created"), ("ada-lovelace", "exists"),
+                 (None, "invalid"), ("alice-ball", "created"),
+                 ("alice-ball", "duplicate"), (None, "invalid")]
+    assert get_deck(backend, "a") == {
+        "ada-lovelace": "First programmer",
+        "alice-ball": "Leprosy"
+    }
+    assert get_card_display_info(backend, "grace-hopper") == "COBOL"
+
+
+def test_import_cards_many(backend):
+    rows = [(f"Woman{i}", "Scientist", f"Contribution {i}") for i in range(200)]
+    backend.content_store = MagicMock(wraps=backend.content_store)
+
+    results = import_cards(backend, rows)
+
+    assert all(result["Status"] == "created" for result in results)
+    assert len(get_deck(backend, "w")) == 200
+    backend.content_store.update_json.assert_called_once()
+
+
+@pytest.mark.parametrize("filename,data", [
+    ("cards.csv", b"firstname,lastname,contribution\nAda,Lovelace,First\n"),
+    ("cards.csv", b"Ada,Lovelace,First\n\n"),
+    ("cards.json",
+     b'[{"firstname": "Ada", "lastname": "Lovelace", "contribution": "First"}]'
+    ),
+    ("cards.json", b'[["Ada", "Lovelace", "First"]]'),
+])
+def test_parse_card_file(filename, data):
+    assert parse_card_file(filename, data) == [("Ada", "Lovelace", "First")]
+
+
+@pytest.mark.parametrize("filename,data", [
+    ("cards.txt", b"Ada,Lovelace,First"),
+    ("cards.json", b'{"firstname": "Ada"}'),
+    ("cards.json", b"not json"),
+])
+def test_parse_card_file_invalid(filename, data):
+    with pytest.raises(ValueError):
+        parse_card_file(filename, data)
@@ -0,0 +1,84 @@
+from collections import namedtuple
+import threading, time
+
+# Defaults of the about page image cache: seconds a listing is reused
+# (ABOUT_IMAGES_TTL_SECONDS config key) and lifetime of the signed image URLs
+# (SIGNED_URL_SECONDS config key). URLs must outlive the listing they are cached with.
+IMAGE_LIST_TTL = 300
+SIGNED_URL_SECONDS = 3600
+
+# An image as shown on a page: its file name (the key without the folder), the URL
+# browsers load it from (None if the store cannot serve it by URL), its size and
+# when it was last written.
+Image = namedtuple("Image", ["name", "url", "size", "updated"])
+
+
+class ImageCache:
+    '''
+        ImageCache keeps the images of one folder, with URLs browsers can load them from
+        directly, so showing them costs no storage calls while the cache is fresh.
+
+        The folder is listed at most every ttl seconds, and the metadata comes straight
+        from the listing. Every image gets a time limited signed URL, which is reused
+        across listings as long as the image's generation is unchanged and the URL stays
+        valid for at least another ttl seconds.
+
+        Attributes:
+            store: BlobStore holding the images.
+            prefix: folder of the images (for example "About-content/").
+            ttl: seconds a listing is reused.
+            url_seconds: lifetime of the signed URLs.
+    '''
+
+    def __init__(self,
+                 store,
+                 prefix,
+                 ttl=IMAGE_LIST_TTL,
+                 url_seconds=SIGNED_URL_SECONDS,
+                 clock=time.monotonic):
+        if url_seconds <= ttl:
+            raise ValueError("Signed URLs must outlive the cached listing")
+        self.store = store
+        self.prefix = prefix
+        self.ttl = ttl
+        self.url_seconds = url_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._images = None
+        self._listed_at = None
+        self._urls = {}
+
+    def get(self):
+        '''
+            Get returns the folder's images as a list of Image tuples sorted by name,
+            listing the folder again first if the cached listing is missing or expired.
+        '''
+        with self._lock:
+            now = self._clock()
+            if self._images is None or now - self._listed_at >= self.ttl:
+                self._load(now)
+            return self._images
+
+    def invalidate(self):
+        '''
+            Invalidate drops the cached listing so the next get() lists the folder again.
+        '''
+        with self._lock:
+            self._images = None
+
+    def _load(self, now):
+        urls = {}
+        images = []
+        for info in self.store.list(self.prefix):
+            version = (info.name, info.generation)
+            url, expires_at = self._urls.get(version, (None, now))
+            if expires_at - now <= self.ttl:
+                url = self.store.signed_url(info.name, self.url_seconds)
+                expires_at = now + self.url_seconds
+            urls[version] = (url, expires_at)
+            images.append(
+                Image(info.name.removeprefix(self.prefix), url, info.size,
+                      info.updated))
+        self._urls = urls
+        self._images = images
+        self._listed_at = now
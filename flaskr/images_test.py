@@ -0,0 +1,75 @@
+import pytest
+from flaskr.blobstore import LocalBlobStore
+from flaskr.images import ImageCache
+from unittest.mock import patch
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalBlobStore(tmp_path)
+    store.put("About-content/sam.jpg", b"sam")
+    store.put("About-content/mayo.jpg", b"mayo!")
+    return store
+
+
+def signed(key, expires_seconds):
+    return f"https://signed/{key}"
+
+
+def test_get(store, clock):
+    images = ImageCache(store, "About-content/", ttl=10, clock=clock)
+
+    with patch.object(store, "signed_url", side_effect=signed):
+        pics = images.get()
+
+    assert [(pic.name, pic.url, pic.size) for pic in pics] == [
+        ("mayo.jpg", "https://signed/About-content/mayo.jpg", 5),
+        ("sam.jpg", "https://signed/About-content/sam.jpg", 3),
+    ]
+
+
+def test_get_cached(store, clock):
+    images = ImageCache(store, "About-content/", ttl=10, clock=clock)
+    images.get()
+
+    with patch.object(store, "list") as mock_list, \
+            patch.object(store, "signed_url") as mock_signed_url:
+        clock.now = 9
+        images.get()
+
+    mock_list.assert_not_called()
+    mock_signed_url.assert_not_called()
+
+
+def test_urls_reused_until_close_to_expiry(store, clock):
+    images = ImageCache(store,
+                        "About-content/",
+                        ttl=10,
+                        url_seconds=30,
+                        clock=clock)
+    with patch.object(store, "signed_url", side_effect=signed) as mock_signed:
+        images.get()
+        clock.now = 10
+        images.get()
+        assert mock_signed.call_count == 2
+
+        clock.now = 20
+        images.get()
+        assert mock_signed.call_count == 4
+
+
+def test_changed_image_gets_new_url(store, clock):
+    images = ImageCache(store, "About-content/", ttl=10, clock=clock)
+    images.get()
+    store.put("About-content/sam.jpg", b"new sam")
+    clock.now = 10
+
+    with patch.object(store, "signed_url", side_effect=signed) as mock_signed:
+        images.get()
+
+    mock_signed.assert_called_once_with("About-content/sam.jpg", 3600)
+
+
+def test_urls_must_outlive_listing(store):
+    with pytest.raises(ValueError):
+        ImageCache(store, "About-content/", ttl=60, url_seconds=60)
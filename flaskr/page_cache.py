@@ -0,0 +1,81 @@
+from collections import OrderedDict
+import threading
+
+# Default memory budget of the rendered page cache (PAGE_CACHE_BYTES config key).
+PAGE_CACHE_BYTES = 32 * 1024 * 1024
+
+
+class PageCache:
+    '''
+        PageCache is a thread safe, size bounded LRU cache for rendered pages.
+
+        Every entry is stored with its size in bytes; when the total goes over max_bytes the
+        least recently used entries are evicted. Keys should include everything the value
+        depends on (for wiki pages: name, language, page generation and dictionary
+        generation), so entries never need to be invalidated, they just stop being used and
+        age out.
+
+        Attributes:
+            max_bytes: memory budget of the cache.
+            hits: number of lookups that found an entry.
+            misses: number of lookups that did not.
+            evictions: number of entries dropped to stay within max_bytes.
+    '''
+
+    def __init__(self, max_bytes=PAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        '''
+            Get returns the value cached under key, or None, and counts a hit or a miss.
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        '''
+            Put caches value under key. Values larger than max_bytes are not cached.
+
+            Args:
+                key: hashable cache key.
+                value: the value to cache.
+                size: size of the value in bytes.
+        '''
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        '''
+            Stats returns the cache counters and its current size as a dictionary.
+        '''
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes
+            }
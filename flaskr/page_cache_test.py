@@ -0,0 +1,57 @@
+from flaskr.page_cache import PageCache
+
+
+def test_get_put():
+    cache = PageCache(max_bytes=100)
+
+    assert cache.get("page") is None
+    cache.put("page", "html", 10)
+
+    assert cache.get("page") == "html"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used():
+    cache = PageCache(max_bytes=30)
+    cache.put("a", "A", 10)
+    cache.put("b", "B", 10)
+    cache.put("c", "C", 10)
+    cache.get("a")
+
+    cache.put("d", "D", 10)
+
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["A", "C", "D"]
+    assert cache.evictions == 1
+
+
+def test_evicts_by_size():
+    cache = PageCache(max_bytes=30)
+    cache.put("a", "A", 10)
+    cache.put("b", "B", 10)
+
+    cache.put("big", "BIG", 25)
+
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert cache.stats()["bytes"] == 25
+
+
+def test_replace_entry():
+    cache = PageCache(max_bytes=30)
+    cache.put("a", "A", 20)
+
+    cache.put("a", "AA", 5)
+
+    assert cache.get("a") == "AA"
+    assert cache.stats()["bytes"] == 5
+    assert cache.evictions == 0
+
+
+def test_skips_values_over_budget():
+    cache = PageCache(max_bytes=10)
+
+    cache.put("big", "BIG", 11)
+
+    assert cache.get("big") is None
+    assert cache.stats()["entries"] == 0
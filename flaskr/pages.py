@@ -1,14 +1,108 @@
-from flask import render_template, request, session, redirect, url_for
-from flaskr.backend import Backend
+from flask import render_template, request, session, redirect, url_for, abort, jsonify, current_app, Request
+from werkzeug.exceptions import RequestEntityTooLarge
 from flaskr.flashcard import *
 from functools import wraps
 from flaskr.custom_filters import get_status_color, get_status_name
+from flaskr.translations import parse_translation_file
+from flaskr.page_cache import PageCache, PAGE_CACHE_BYTES
+from flaskr.rate_limit import TokenBucketLimiter, RATE_LIMITS, RATE_LIMIT_KEYS
+from collections import namedtuple
 from datetime import date
-import time
+import hashlib, io, math, time
 
-PAGE_EDITS = "Edits"
-EDIT_STATUS = "Status"
-PENDING = 1
+from flaskr.backend import UploadTooLarge, has_pending_edit
+from flaskr.blobstore import PreconditionFailed
+from flaskr.passwords import HasherBusy
+
+# Shown when the password hashing queue is full.
+BUSY_MESSAGE = "We are busy right now, please try again in a moment."
+
+# Returned when a page kept changing while an edit or review was being saved.
+CONFLICT_MESSAGE = "Someone else is changing this page right now, please try again."
+
+# Room left in a page upload request for the other form fields and the multipart framing.
+UPLOAD_FORM_BYTES = 16 * 1024
+
+# A wiki page as cached by the rendered page cache: the session independent part of the
+# page (rendered from page_body.html), the displayed content, needed by the edit form,
+# and whether the edit button is shown.
+RenderedPage = namedtuple("RenderedPage", ["body", "content", "edit_button"])
+
+
+def page_etag(curpage, version, username):
+    '''
+        Page_etag builds the ETag of a rendered wiki page. The rendered page depends on the
+        page's version (see Backend.get_page_version) and on who is logged in.
+    '''
+    validator = f"{curpage}|{version}|{username or ''}"
+    return hashlib.blake2b(validator.encode("utf-8"),
+                           digest_size=16).hexdigest()
+
+
+def conditional_headers(response, etag, last_modified):
+    '''
+        Conditional_headers adds the validators of a rendered wiki page to its response.
+    '''
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Pages depend on the logged in user: browsers may keep them but must revalidate,
+    # and shared caches must not store them.
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+class CappedFileStream(io.BytesIO):
+    '''
+        CappedFileStream keeps an uploaded file in memory and stops the request parser
+        with a 413 as soon as the file grows past limit bytes.
+    '''
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+
+    def write(self, data):
+        if self.tell() + len(data) > self.limit:
+            raise RequestEntityTooLarge()
+        return super().write(data)
+
+
+class UploadRequest(Request):
+    '''
+        UploadRequest applies the backend's max_upload_bytes while page uploads are parsed,
+        before the view runs.
+
+        Requests whose Content-Length is over the limit (plus UPLOAD_FORM_BYTES for the
+        other fields) are rejected without being parsed, and the file part is kept in a
+        CappedFileStream instead of werkzeug's spooled temporary file, so uploads without
+        a Content-Length stop at the limit too. Other routes are not affected.
+    '''
+
+    @property
+    def max_content_length(self):
+        limit = self._upload_limit()
+        configured = super().max_content_length
+        if limit is None:
+            return configured
+        limit += UPLOAD_FORM_BYTES
+        return limit if configured is None else min(limit, configured)
+
+    def _get_file_stream(self,
+                         total_content_length,
+                         content_type,
+                         filename=None,
+                         content_length=None):
+        limit = self._upload_limit()
+        if limit is None:
+            return super()._get_file_stream(total_content_length, content_type,
+                                            filename, content_length)
+        return CappedFileStream(limit)
+
+    def _upload_limit(self):
+        if self.endpoint != "upload_post":
+            return None
+        return current_app.extensions["backend"].max_upload_bytes
 
 
 def is_logged_in(function):
@@ -34,16 +128,83 @@ def is_logged_in(function):
 
 
 #> Ibby: Please add method-level comments for all public methods
-def make_endpoints(app):
+def make_endpoints(app, back_end):
     '''
-        Make_endpoints 
+        Make_endpoints registers the wiki routes on app.
+
+        Rendered wiki pages are cached in a PageCache of PAGE_CACHE_BYTES (config key)
+        bytes, stored in app.extensions["page_cache"].
+
+        The login, signup and card creation routes are rate limited per client IP and per
+        username with the token buckets configured by RATE_LIMITS (see flaskr/rate_limit.py),
+        stored in app.extensions["rate_limiters"]. Their counters, and the other cache and
+        storage counters, are served as json on /metrics.
+
+        Requests are parsed as UploadRequest, so page uploads over the backend's
+        max_upload_bytes are rejected with a 413 while they are being read.
+
+        Args:
+            app: the flask app.
+            back_end: the Backend shared by all requests.
     '''
-    back_end = Backend()
+
+    app.request_class = UploadRequest
 
     #Custom template filters to assign the appropriate color and name to a specific status.
     app.add_template_filter(get_status_color)
     app.add_template_filter(get_status_name)
 
+    page_cache = PageCache(app.config.get("PAGE_CACHE_BYTES", PAGE_CACHE_BYTES))
+    app.extensions["page_cache"] = page_cache
+
+    max_keys = app.config.get("RATE_LIMIT_KEYS", RATE_LIMIT_KEYS)
+    rate_limiters = {
+        route: TokenBucketLimiter(burst, rate, max_keys)
+        for route, (burst,
+                    rate) in app.config.get("RATE_LIMITS", RATE_LIMITS).items()
+    }
+    app.extensions["rate_limiters"] = rate_limiters
+
+    def rate_limited(route, username_field=None):
+        '''
+            Rate_limited is a decorator that rejects requests over route's rate limit with a
+            429 response, before the wrapped function (and the backend) is called.
+
+            Requests are counted against the client's IP (taken from X-Forwarded-For behind
+            PROXY_FIX_X_FOR proxies, see create_app) and, if one is known, the username:
+            the form field username_field, or else the logged in user.
+
+            Args:
+                route: name of the route's entry in RATE_LIMITS.
+                username_field: form field holding the username the request is about.
+        '''
+
+        def decorator(function):
+
+            @wraps(function)
+            def wrapped_function(*args, **kwargs):
+                limiter = rate_limiters.get(route)
+                if limiter is None:
+                    return function(*args, **kwargs)
+                keys = [("ip", request.remote_addr)]
+                username = request.form.get(
+                    username_field) if username_field else session.get(
+                        "username")
+                if username:
+                    keys.append(("user", username.strip().lower()))
+                allowed, retry_after = limiter.allow(keys)
+                if not allowed:
+                    # A route with a rate of 0 never lets the client in again.
+                    headers = {} if math.isinf(retry_after) else {
+                        "Retry-After": str(math.ceil(retry_after))
+                    }
+                    return "Too many requests, please try again later.", 429, headers
+                return function(*args, **kwargs)
+
+            return wrapped_function
+
+        return decorator
+
     # Flask uses the "app.route" decorator to call methods when users
     # go to a specific route on the project's website.
 
@@ -80,24 +241,55 @@ def make_endpoints(app):
     def upload_post():
         #Ibby> Consider splitting into separate methods for get and post
 
-        backend = Backend()
         page_name = request.form["page_name"]
         image_url = request.form["image_url"]
         user_file = request.files['file']
         username = session['username'].lower()
         upload_date = date.today().strftime("%m/%d/%Y")
 
-        if image_url:
-            backend.upload_file(page_name, username, user_file, upload_date,
-                                image_url)
-        else:
-            backend.upload_file(page_name, username, user_file, upload_date)
-            #>Ibby consider passing in the page header name instead of defining it in the template.
+        try:
+            if image_url:
+                back_end.upload_file(page_name, username, user_file,
+                                     upload_date, image_url)
+            else:
+                back_end.upload_file(page_name, username, user_file,
+                                     upload_date)
+                #>Ibby consider passing in the page header name instead of defining it in the template.
+        except UploadTooLarge:
+            return render_template(
+                '/upload.html',
+                display_text="The file is too large to upload."), 413
+        except UnicodeDecodeError:
+            return render_template(
+                '/upload.html',
+                display_text="Please upload a UTF-8 text file."), 400
         return render_template('/upload.html')
 
+    @app.route('/metrics')
+    def metrics():
+        '''
+            Metrics returns the app's counters as json: the requests let through and rejected
+            by every rate limiter, the rendered page cache statistics, the sign ins rejected
+            by the username filter and the number of conditional storage writes that had to
+            be retried.
+        '''
+        return jsonify({
+            "rate_limits": {
+                route: limiter.stats()
+                for route, limiter in rate_limiters.items()
+            },
+            "page_cache": page_cache.stats(),
+            "username_filter": back_end.username_filter.stats(),
+            "write_conflicts": back_end.get_write_conflicts()
+        })
+
     @app.route('/about')
     def about():
-        pics = back_end.get_image()
+        '''
+            About renders about.html with the authors' pictures, keyed by file name (see
+            Backend.get_image).
+        '''
+        pics = {pic.name: pic for pic in back_end.get_image()}
         return render_template('about.html', pics=pics)
 
     @app.route('/signup', methods=['GET'])
@@ -106,31 +298,43 @@ def make_endpoints(app):
         return render_template('/signup.html')
 
     @app.route('/signup', methods=['POST'])
+    @rate_limited("signup", username_field="name")
     def signup_post():
         display_text = ''
 
         username = request.form['name']
         password = request.form['pwd']
 
-        if not username or not password:
-            display_text = "Please fill all required fields"
+        try:
+            if not username or not password:
+                display_text = "Please fill all required fields"
 
-        elif not back_end.is_username_unique(username):
-            display_text = "Ooops, that username is taken."
+            elif not back_end.is_username_unique(
+                    username) or not back_end.sign_up(username, password):
+                display_text = "Ooops, that username is taken."
 
-        else:
-            initialize_sessions(username)
-            back_end.sign_up(username, password)
-            display_text = "Successfully registered!"
-            return render_template('main.html',
-                                   signed_in=True,
-                                   username=username)
+            else:
+                initialize_sessions(username)
+                display_text = "Successfully registered!"
+                return render_template('main.html',
+                                       signed_in=True,
+                                       username=username)
+        except HasherBusy:
+            return render_template('/signup.html',
+                                   display_text=BUSY_MESSAGE), 503
 
         return render_template('/signup.html', display_text=display_text)
 
     @app.route('/pages', methods=['GET', 'PUT'])
     def page_index():
-        page_list = back_end.get_all_page_names()
+        '''
+            Page_index lists the uploaded pages with their author, date and whether an edit
+            is pending, all read from the page catalog in a single request.
+
+            Returns:
+                A template rendered from the page_index.html file.
+        '''
+        page_list = back_end.get_page_catalog()
         return render_template('/page_index.html', page_list=page_list)
 
     @app.route('/pages/<curpage>', methods=['GET', 'PUT'])
@@ -146,50 +350,75 @@ def make_endpoints(app):
             author of the page hasn't reviewed, the edit button would be disabled. 
             This is so that a page can only have a single pending edit.
 
+            Responses carry an ETag and a Last-Modified header. When the browser's
+            If-None-Match still matches, a 304 is returned after a single metadata request,
+            without downloading or rendering the page.
+
             Args:
                 curpage: the name of the page.
 
             Returns:
                 A template rendered from pages.html file with the page's data.     
         '''
-        backend = Backend()
         page = curpage
-        page_data = backend.get_wiki_page(page, "EN")
-
-        if page_data[PAGE_EDITS] and page_data[PAGE_EDITS][-1][
-                EDIT_STATUS] == PENDING:
-            edit_button = False
-        else:
-            edit_button = True
-
-        return render_template('/pages.html',
-                               content=page_data["Content"],
-                               author=page_data["Author"],
-                               image=page_data["Image"],
-                               date=page_data["Date"],
-                               pagename=page,
-                               edit_button=edit_button)
+        version = back_end.get_page_version(page, "EN")
+        etag = None
+        if version is not None:
+            etag = page_etag(page, version[0], session.get("username"))
+            if request.if_none_match.contains(etag):
+                response = app.make_response(("", 304))
+                return conditional_headers(response, etag, version[1])
+
+        response = app.make_response(render_wiki_page(page, "EN", version))
+        if etag is None:
+            return response
+        return conditional_headers(response, etag, version[1])
 
     @app.route('/pages/<curpage>', methods=['POST'])
     def show_wiki_post(curpage):
-        backend = Backend()
         page = curpage
         lang = request.form['lang']
-        page_data = backend.get_wiki_page(page, lang=lang)
+        return render_wiki_page(page, lang,
+                                back_end.get_page_version(page, lang))
+
+    def render_wiki_page(page, lang, version):
+        '''
+            Render_wiki_page renders pages.html for a page shown in lang.
 
-        if page_data[PAGE_EDITS] and page_data[PAGE_EDITS][-1][
-                EDIT_STATUS] == PENDING:
-            edit_button = False
-        else:
-            edit_button = True
+            The session independent part of the page is taken from the page cache when
+            possible. Its key holds the page's version (see Backend.get_page_version), so a
+            cache hit never downloads or translates the page, and entries of older versions
+            are simply not looked up again.
+
+            Args:
+                page: name of the page.
+                lang: language the page is shown in.
+                version: the page's version, or None to bypass the cache.
+        '''
+        key = (page, lang, version[0]) if version is not None else None
+        rendered = page_cache.get(key) if key is not None else None
+        if rendered is None:
+            page_data = back_end.get_wiki_page(page, lang=lang)
+            if page_data is None:
+                abort(404)
+            body = render_template('/page_body.html',
+                                   content=page_data["Content"],
+                                   author=page_data["Author"],
+                                   image=page_data["Image"],
+                                   date=page_data["Date"],
+                                   pagename=page)
+            rendered = RenderedPage(body, page_data["Content"],
+                                    not has_pending_edit(page_data))
+            if key is not None:
+                size = len(body.encode("utf-8")) + len(
+                    rendered.content.encode("utf-8"))
+                page_cache.put(key, rendered, size)
 
         return render_template('/pages.html',
-                               content=page_data["Content"],
-                               author=page_data["Author"],
-                               image=page_data["Image"],
-                               date=page_data["Date"],
+                               page_body=rendered.body,
+                               content=rendered.content,
                                pagename=page,
-                               edit_button=edit_button)
+                               edit_button=rendered.edit_button)
 
     @app.route('/quotes')
     def quotes():
@@ -211,6 +440,7 @@ def make_endpoints(app):
         return render_template('login.html')
 
     @app.route('/login', methods=['POST'])
+    @rate_limited("login", username_field="name")
     def login_post():
         """
             Login_post function authenticates a user and renders an html file to the assigned route when the Flask API call is a POST method.
@@ -223,11 +453,15 @@ def make_endpoints(app):
                 If the user successfully logs in, redirects the user to the home page, route "/"
                 If the user is unsucessful, renders the template for the login.html to the "/login" route and passes the error message
                 to that route.
+                If too many passwords are being hashed already, renders login.html with a 503 status.
         """
         username = request.form.get("name").lower()
         password = request.form.get("password")
 
-        signed_in, err = back_end.sign_in(username, password)
+        try:
+            signed_in, err = back_end.sign_in(username, password)
+        except HasherBusy:
+            return render_template('login.html', err_message=BUSY_MESSAGE), 503
 
         if signed_in:
             initialize_sessions(username)
@@ -300,9 +534,8 @@ def make_endpoints(app):
         current_card = request.form['current']
         show_modal = request.form['showModal']
 
-        card_name = get_card_name(back_end, current_card)
+        card_name, matching_info = get_random_card(back_end, current_card)
         matching_card = get_formatted_display_name(back_end, card_name)
-        matching_info = get_card_display_info(back_end, card_name)
 
         return render_template('/fun.html',
                                card_list=card_list,
@@ -315,22 +548,46 @@ def make_endpoints(app):
         return render_template('/createcard.html')
 
     @app.route('/createcard', methods=['POST'])
+    @rate_limited("createcard")
     def createcard_post():
 
         firstname = request.form['firstname']
         lastname = request.form['lastname']
         card_content = request.form['contribution']
 
-        if does_flashcard_exist(back_end, firstname, lastname):
-            display_text = get_alert_message(back_end, firstname, lastname)
+        created = create_card(back_end, firstname, lastname, card_content)
+        display_text = get_alert_message(created)
 
-        else:
-            display_text = get_alert_message(back_end, firstname, lastname)
-            create_card(back_end, firstname, lastname, card_content)
+        return render_template('/createcard.html', display_text=display_text)
+
+    @app.route('/createcard/import', methods=['POST'])
+    @is_logged_in
+    @rate_limited("createcard")
+    def import_cards_post():
+        '''
+            Import_cards_post creates the flashcards listed in an uploaded .csv or .json
+            file (see parse_card_file and import_cards).
+
+            Returns:
+                The createcard.html template with the status of every row of the file.
+        '''
+        card_file = request.files.get("file")
+        if not card_file or not card_file.filename:
+            return render_template(
+                '/createcard.html',
+                display_text="Please choose a file to import."), 400
+        try:
+            rows = parse_card_file(card_file.filename, card_file.read())
+        except ValueError as err:
             return render_template('/createcard.html',
-                                   display_text=display_text)
+                                   display_text=str(err)), 400
 
-        return render_template('/createcard.html', display_text=display_text)
+        results = import_cards(back_end, rows)
+        created = sum(result["Status"] == CARD_CREATED for result in results)
+        return render_template(
+            '/createcard.html',
+            display_text=f"Imported {created} of {len(results)} cards.",
+            import_results=results)
 
     @app.route('/edit-form', methods=['POST'])
     @is_logged_in
@@ -341,7 +598,10 @@ def make_endpoints(app):
         content = request.form["content"]
         edit_date = date.today().strftime("%m/%d/%Y")
 
-        back_end.edit_page_data(page_name, content, edit_date, editor)
+        try:
+            back_end.edit_page_data(page_name, content, edit_date, editor)
+        except PreconditionFailed:
+            return CONFLICT_MESSAGE, 409, {"Retry-After": "1"}
 
         page_url = f"/pages/{page_name}"
 
@@ -364,6 +624,58 @@ def make_endpoints(app):
     def upload_translation():
         return render_template("translation.html")
 
+    @app.route('/translation', methods=['POST'])
+    @is_logged_in
+    def upload_translation_post():
+        '''
+            Upload_translation_post adds the submitted translations to the English-Spanish
+            dictionary.
+
+            Translations can be entered one at a time in the form or uploaded in bulk as a
+            .csv or .json file (see parse_translation_file). All of them are applied in a
+            single write.
+
+            Returns:
+                The translation.html template with a message describing the result.
+        '''
+        from_lang = request.form.get("from", "English")
+        to_lang = request.form.get("to", "Spanish")
+        word = request.form.get("word", "").strip()
+        translation = request.form.get("translation", "").strip()
+        translation_file = request.files.get("file")
+
+        if from_lang == to_lang:
+            return render_template(
+                "translation.html",
+                display_text="Please choose two different languages."), 400
+
+        pairs = []
+        if word and translation:
+            pairs.append((word, translation))
+        if translation_file and translation_file.filename:
+            try:
+                pairs.extend(
+                    parse_translation_file(translation_file.filename,
+                                           translation_file.read()))
+            except ValueError as err:
+                return render_template("translation.html",
+                                       display_text=str(err)), 400
+
+        if not pairs:
+            return render_template(
+                "translation.html",
+                display_text="Please enter a translation or upload a file."
+            ), 400
+
+        # The dictionary maps English words to Spanish ones.
+        if from_lang == "Spanish":
+            pairs = [(english, spanish) for spanish, english in pairs]
+
+        added = back_end.add_translations_bulk(pairs)
+        return render_template(
+            "translation.html",
+            display_text=f"Added {added} of {len(pairs)} translations.")
+
     @app.route('/show-user-edits')
     @is_logged_in
     def show_user_edits():
@@ -385,10 +697,21 @@ def make_endpoints(app):
         page_name = request.form['edit-page-name']
         edit_action = request.form['edit-action']
 
-        back_end.author_edit_action(page_name, edit_action)
+        try:
+            back_end.author_edit_action(page_name, edit_action)
+        except PreconditionFailed:
+            return CONFLICT_MESSAGE, 409, {"Retry-After": "1"}
 
         return redirect("/edit-page")
 
     @app.errorhandler(404)
     def page_not_found(e):
         return render_template('404.html'), 404
+
+    @app.errorhandler(RequestEntityTooLarge)
+    def request_too_large(e):
+        if request.endpoint != "upload_post":
+            return e
+        return render_template(
+            '/upload.html',
+            display_text="The file is too large to upload."), 413
@@ -3,16 +3,24 @@ from unittest.mock import patch, MagicMock, Mock
 from flask import session
 from flaskr.pages import is_logged_in
 from flaskr.backend import Backend
-import pytest, io
+from flaskr.flashcard import create_card
+from flaskr.passwords import HasherBusy
+from flaskr.blobstore import PreconditionFailed
+import pytest, io, werkzeug.datastructures
 from google.cloud import storage
 
 
 # See https://flask.palletsprojects.com/en/2.2.x/testing/
 # for more info on testing
 @pytest.fixture
-def app():
+def app(tmp_path):
     app = create_app({
         'TESTING': True,
+        'STORAGE_ENGINE': 'local',
+        'STORAGE_ROOT': str(tmp_path),
+        'MAX_UPLOAD_BYTES': 1024,
+        'PASSWORD_HASH_COST': 16,
+        'PASSWORD_HASH_WORKERS': 0,
     })
     return app
 
@@ -31,6 +39,15 @@ def mock_get_all_page_names():
         mock_get_all_page_names.return_value = mock_instance
 
 
+def test_backend_created_once(app):
+    backend = app.extensions["backend"]
+
+    assert backend.content_store.root.endswith("wikis-content")
+    with patch("flaskr.backend.Backend.__init__") as mock_init:
+        app.test_client().get("/pages/missing-page")
+        mock_init.assert_not_called()
+
+
 def test_home_page(client):
     resp = client.get("/")
     assert resp.status_code == 200
@@ -135,6 +152,25 @@ def ignored_test_page_index(client, mock_get_all_page_names):
     #mock_get_all_page_names.assert_called_once_with()
 
 
+@patch("flaskr.backend.Backend.get_page_catalog")
+def test_page_index(mock_catalog, client):
+    mock_catalog.return_value = [{
+        "Name": "Page1",
+        "Author": "mayo",
+        "Date": "04/12/2023",
+        "Image": "link",
+        "Size": 10,
+        "LastEditStatus": 1
+    }]
+
+    resp = client.get("/pages")
+
+    assert resp.status_code == 200
+    assert b'Pages contained in this Wiki' in resp.data
+    assert b'Page1' in resp.data
+    assert b'edit pending' in resp.data
+
+
 def test_upload_get(client):
     with client.session_transaction() as session:
         session["username"] = "user"
@@ -175,18 +211,100 @@ def test_upload_post_image(mock_backend, mock_storage, client):
     assert b"Upload" in resp.data
 
 
-def ignored_test_about(client):
+def test_upload_post_too_large(client):
+    with client.session_transaction() as session:
+        session["username"] = "user"
+    resp = client.post("/upload",
+                       data={
+                           "page_name": "test",
+                           "image_url": "",
+                           "file": (io.BytesIO(b"x" * 2048), "file.txt")
+                       })
+    assert resp.status_code == 413
+    assert b"too large" in resp.data
+    assert client.get("/pages/test").status_code == 404
+
+
+@patch("flaskr.backend.Backend.upload_file")
+def test_upload_post_rejected_while_parsing(mock_upload, client):
+    with client.session_transaction() as session:
+        session["username"] = "user"
+    with patch("werkzeug.wrappers.request.Request._get_file_stream") as spool:
+        resp = client.post("/upload",
+                           data={
+                               "page_name": "test",
+                               "image_url": "",
+                               "file": (io.BytesIO(b"x" * 2048), "file.txt")
+                           })
+    assert resp.status_code == 413
+    assert b"too large" in resp.data
+    spool.assert_not_called()
+    mock_upload.assert_not_called()
+
+
+@patch("flaskr.backend.Backend.upload_file")
+def test_upload_post_large_request_not_parsed(mock_upload, client):
+    with client.session_transaction() as session:
+        session["username"] = "user"
+    with patch("werkzeug.formparser.MultiPartParser.parse") as parse:
+        resp = client.post(
+            "/upload",
+            data={
+                "page_name": "test",
+                "image_url": "",
+                "file": (io.BytesIO(b"x" * 5 * 1024 * 1024), "file.txt")
+            })
+    assert resp.status_code == 413
+    parse.assert_not_called()
+    mock_upload.assert_not_called()
+
+
+def test_large_request_allowed_elsewhere(client):
+    resp = client.post("/login",
+                       data={
+                           "name": "nobody",
+                           "password": "x" * 64 * 1024
+                       })
+    assert resp.status_code == 200
+
+
+def test_about(client):
     resp = client.get("/about")
     assert resp.status_code == 200
     assert b"About this Wiki" in resp.data
 
 
+def test_about_images_cached(app, client):
+    store = app.extensions["backend"].content_store
+    store.put("About-content/sam.jpg", b"jpg")
+
+    with patch.object(store, "signed_url", return_value="https://signed/sam"):
+        first = client.get("/about")
+    with patch.object(store, "list") as mock_list:
+        second = client.get("/about")
+
+    assert b'src="https://signed/sam"' in first.data
+    assert b'src="https://signed/sam"' in second.data
+    assert b"Mayo Oyefeso" in second.data
+    mock_list.assert_not_called()
+
+
 @patch("flaskr.backend.storage")
-@patch("flaskr.backend.json")
+@patch("flaskr.backend.Backend.get_wiki_page")
 @patch("flaskr.backend.Backend.edit_page_data")
 @patch("flaskr.pages.date")
-def test_edit_form(mock_date, mock_edit_data, mock_json, mock_backend, client):
+def test_edit_form(mock_date, mock_edit_data, mock_get_wiki_page, mock_backend,
+                   client):
     mock_date.return_value.today.return_value.strftime = "4/12/23"
+    mock_get_wiki_page.return_value = {
+        "Name": "test",
+        "Author": "Author's name",
+        "Content": "Women in STEM",
+        "Image": "link",
+        "Date": "Date",
+        "EditCount": 0,
+        "LastEdit": None
+    }
     with client.session_transaction() as session:
         session["username"] = "user"
     resp = client.post("/edit-form",
@@ -204,11 +322,10 @@ def test_edit_form(mock_date, mock_edit_data, mock_json, mock_backend, client):
 
 
 @patch("flaskr.backend.storage")
-@patch("flaskr.backend.json")
 @patch("flaskr.backend.Backend.get_user_edits")
 @patch("flaskr.backend.Backend.get_user_pages_edits")
-def test_edit_page_user_edits(mock_pages_edit, mock_user_edits, mock_json,
-                              mock_backend, client):
+def test_edit_page_user_edits(mock_pages_edit, mock_user_edits, mock_backend,
+                              client):
 
     user_edit = {
         "Name": "test-page",
@@ -249,11 +366,10 @@ def test_edit_page_user_edits(mock_pages_edit, mock_user_edits, mock_json,
 
 
 @patch("flaskr.backend.storage")
-@patch("flaskr.backend.json")
 @patch("flaskr.backend.Backend.get_user_edits")
 @patch("flaskr.backend.Backend.get_user_pages_edits")
 def test_edit_page_author_pages_edits(mock_pages_edit, mock_user_edits,
-                                      mock_json, mock_backend, client):
+                                      mock_backend, client):
 
     user_edit = {
         "Name": "test-page",
@@ -333,12 +449,213 @@ def test_signup_user_exist(mock_backend, client):
     assert b"Ooops, that username is taken." in resp.data
 
 
+def test_signup_post_taken_concurrently(client):
+    with patch("flaskr.backend.Backend.is_username_unique", return_value=True):
+        first = client.post("/signup", data={'name': 'yvette', 'pwd': 'abc'})
+        second = client.post("/signup", data={'name': 'Yvette', 'pwd': 'xyz'})
+
+    assert b"Hi, yvette" in first.data
+    assert b"Ooops, that username is taken." in second.data
+
+
+def test_signup_then_login(client):
+    client.post("/signup", data={'name': 'Yvette', 'pwd': 'abc'})
+    client.get("/logout")
+
+    resp = client.post("/login", data={"name": "Yvette", "password": "abc"})
+
+    assert resp.status_code == 302
+
+
+@patch("flaskr.backend.Backend.sign_up", side_effect=HasherBusy)
+def test_signup_hasher_busy(mock_sign_up, client):
+    resp = client.post("/signup", data={'name': 'yvette', 'pwd': 'abc'})
+
+    assert resp.status_code == 503
+    assert b"try again" in resp.data
+
+
+@patch("flaskr.backend.Backend.sign_in", side_effect=HasherBusy)
+def test_login_hasher_busy(mock_sign_in, client):
+    resp = client.post("/login", data={"name": "yvette", "password": "abc"})
+
+    assert resp.status_code == 503
+    assert b"try again" in resp.data
+
+
+@patch("flaskr.backend.Backend.sign_in", return_value=(False, "Wrong password"))
+def test_login_rate_limited(mock_sign_in, app):
+    app.extensions["rate_limiters"]["login"].burst = 2
+    client = app.test_client()
+
+    statuses = [
+        client.post("/login", data={
+            "name": "yvette",
+            "password": "abc"
+        }).status_code for _ in range(3)
+    ]
+
+    assert statuses == [200, 200, 429]
+    assert mock_sign_in.call_count == 2
+
+
+@patch("flaskr.backend.Backend.is_username_unique", return_value=False)
+def test_signup_rate_limited_per_username(mock_is_unique, app):
+    app.extensions["rate_limiters"]["signup"].burst = 1
+    client = app.test_client()
+
+    client.post("/signup",
+                data={
+                    'name': 'yvette',
+                    'pwd': 'abc'
+                },
+                environ_base={"REMOTE_ADDR": "10.0.0.1"})
+    resp = client.post("/signup",
+                       data={
+                           'name': 'Yvette',
+                           'pwd': 'abc'
+                       },
+                       environ_base={"REMOTE_ADDR": "10.0.0.2"})
+
+    assert resp.status_code == 429
+    assert int(resp.headers["Retry-After"]) > 0
+    assert mock_is_unique.call_count == 1
+
+
+@patch("flaskr.backend.Backend.sign_in", return_value=(False, "Wrong password"))
+def test_login_rate_limited_per_forwarded_ip(mock_sign_in, app):
+    app.extensions["rate_limiters"]["login"].burst = 1
+    client = app.test_client()
+
+    statuses = [
+        client.post("/login",
+                    data={
+                        "name": f"user{i}",
+                        "password": "abc"
+                    },
+                    headers={
+                        "X-Forwarded-For": address
+                    },
+                    environ_base={
+                        "REMOTE_ADDR": "10.0.0.1"
+                    }).status_code
+        for i, address in enumerate(["1.2.3.4", "5.6.7.8", "1.2.3.4"])
+    ]
+
+    assert statuses == [200, 200, 429]
+
+
+def test_proxy_fix_disabled(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'STORAGE_ENGINE': 'local',
+        'STORAGE_ROOT': str(tmp_path),
+        'PROXY_FIX_X_FOR': 0,
+    })
+    app.extensions["rate_limiters"]["login"].burst = 1
+    client = app.test_client()
+
+    statuses = [
+        client.post("/login",
+                    data={
+                        "name": "yvette",
+                        "password": "abc"
+                    },
+                    headers={
+                        "X-Forwarded-For": address
+                    }).status_code for address in ["1.2.3.4", "5.6.7.8"]
+    ]
+
+    assert statuses == [200, 429]
+
+
+def test_rate_limited_without_refill(app):
+    limiter = app.extensions["rate_limiters"]["login"]
+    limiter.burst = 0
+    limiter.rate = 0
+
+    resp = app.test_client().post("/login",
+                                  data={
+                                      "name": "yvette",
+                                      "password": "abc"
+                                  })
+
+    assert resp.status_code == 429
+    assert "Retry-After" not in resp.headers
+
+
+def test_metrics(app, client):
+    client.post("/login", data={"name": "yvette", "password": "abc"})
+
+    metrics = client.get("/metrics").get_json()
+
+    assert metrics["rate_limits"]["login"] == {
+        "allowed": 1,
+        "rejected": 0,
+        "keys": 2
+    }
+    assert metrics["page_cache"]["hits"] == 0
+    assert metrics["username_filter"]["rejections"] == 1
+    assert metrics["write_conflicts"] == 0
+
+
 def test_fun_get(client):
     resp = client.get("/fun")
     assert resp.status_code == 200
     assert b"Have fun learning about notable women in STEM" in resp.data
 
 
+def test_fun_post(app, client):
+    create_card(app.extensions["backend"], "Ada", "Lovelace",
+                "First programmer")
+
+    resp = client.post("/fun", data={"current": "A", "showModal": "block"})
+
+    assert resp.status_code == 200
+    assert b"Ada Lovelace" in resp.data
+    assert b"First programmer" in resp.data
+
+
+def test_createcard_post(client):
+    form = {
+        "firstname": "Ada",
+        "lastname": "Lovelace",
+        "contribution": "First programmer"
+    }
+
+    created = client.post("/createcard", data=form)
+    duplicate = client.post("/createcard", data=form)
+
+    assert b"successfully created" in created.data
+    assert b"there is a flashcard with this name" in duplicate.data
+
+
+def test_import_cards_post(client):
+    with client.session_transaction() as session:
+        session["username"] = "user"
+
+    resp = client.post(
+        "/createcard/import",
+        data={"file": (io.BytesIO(b"Ada,Lovelace,First\n,,\n"), "cards.csv")})
+
+    assert resp.status_code == 200
+    assert b"Imported 1 of 2 cards." in resp.data
+    assert b"ada-lovelace" in resp.data
+    assert b"invalid" in resp.data
+
+
+def test_import_cards_post_invalid_file(client):
+    with client.session_transaction() as session:
+        session["username"] = "user"
+
+    resp = client.post(
+        "/createcard/import",
+        data={"file": (io.BytesIO(b"Ada,Lovelace,First"), "cards.txt")})
+
+    assert resp.status_code == 400
+    assert b"Card files must be .csv or .json" in resp.data
+
+
 def test_createcard_get(client):
     resp = client.get('/createcard')
     assert resp.status_code == 200
@@ -346,11 +663,10 @@ def test_createcard_get(client):
 
 
 @patch("flaskr.backend.storage")
-@patch("flaskr.backend.json")
 @patch("flaskr.backend.Backend.get_user_edits")
 @patch("flaskr.backend.Backend.get_user_pages_edits")
-def test_show_user_edits(mock_pages_edit, mock_user_edits, mock_json,
-                         mock_backend, client):
+def test_show_user_edits(mock_pages_edit, mock_user_edits, mock_backend,
+                         client):
 
     with client.session_transaction() as sess:
         sess["username"] = "user"
@@ -366,11 +682,10 @@ def test_show_user_edits(mock_pages_edit, mock_user_edits, mock_json,
 
 
 @patch("flaskr.backend.storage")
-@patch("flaskr.backend.json")
 @patch("flaskr.backend.Backend.get_user_edits")
 @patch("flaskr.backend.Backend.get_user_pages_edits")
-def test_show_page_edits(mock_pages_edit, mock_user_edits, mock_json,
-                         mock_backend, client):
+def test_show_page_edits(mock_pages_edit, mock_user_edits, mock_backend,
+                         client):
 
     with client.session_transaction() as sess:
         sess["username"] = "user"
@@ -386,12 +701,11 @@ def test_show_page_edits(mock_pages_edit, mock_user_edits, mock_json,
 
 
 @patch("flaskr.backend.storage")
-@patch("flaskr.backend.json")
 @patch("flaskr.backend.Backend.get_user_edits")
 @patch("flaskr.backend.Backend.get_user_pages_edits")
 @patch("flaskr.backend.Backend.author_edit_action")
 def test_upload_edit_accepted(mock_edit_action, mock_pages_edit,
-                              mock_user_edits, mock_json, mock_backend, client):
+                              mock_user_edits, mock_backend, client):
 
     user_edit = {
         "Name": "test",
@@ -422,12 +736,11 @@ def test_upload_edit_accepted(mock_edit_action, mock_pages_edit,
 
 
 @patch("flaskr.backend.storage")
-@patch("flaskr.backend.json")
 @patch("flaskr.backend.Backend.get_user_edits")
 @patch("flaskr.backend.Backend.get_user_pages_edits")
 @patch("flaskr.backend.Backend.author_edit_action")
 def test_upload_edit_declined(mock_edit_action, mock_pages_edit,
-                              mock_user_edits, mock_json, mock_backend, client):
+                              mock_user_edits, mock_backend, client):
 
     user_edit = {
         "Name": "test",
@@ -457,6 +770,98 @@ def test_upload_edit_declined(mock_edit_action, mock_pages_edit,
     assert b"Declined" in resp.data
 
 
+def upload_page(app, name="test", content=b"Women in STEM"):
+    backend = app.extensions["backend"]
+    backend.upload_file(
+        name, "author",
+        werkzeug.datastructures.FileStorage(stream=io.BytesIO(content),
+                                            filename="page.txt"), "Date")
+
+
+def test_show_wiki_conditional_get(app, client):
+    upload_page(app)
+
+    resp = client.get("/pages/test")
+    etag = resp.headers["ETag"]
+    assert resp.status_code == 200
+    assert resp.headers["Last-Modified"]
+    assert "no-cache" in resp.headers["Cache-Control"]
+
+    with patch("flaskr.backend.Backend.get_wiki_page") as mock_get_wiki_page:
+        resp = client.get("/pages/test", headers={"If-None-Match": etag})
+
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+    mock_get_wiki_page.assert_not_called()
+
+
+def test_show_wiki_etag_changes(app, client):
+    upload_page(app)
+    etag = client.get("/pages/test").headers["ETag"]
+
+    with client.session_transaction() as session:
+        session["username"] = "user"
+    user_etag = client.get("/pages/test").headers["ETag"]
+    upload_page(app, content=b"Women in STEM and beyond")
+    resp = client.get("/pages/test", headers={"If-None-Match": user_etag})
+
+    assert user_etag != etag
+    assert resp.status_code == 200
+    assert b"beyond" in resp.data
+    assert resp.headers["ETag"] not in (etag, user_etag)
+
+
+def test_show_wiki_cached(app, client):
+    upload_page(app)
+    page_cache = app.extensions["page_cache"]
+
+    first = client.get("/pages/test")
+    with patch("flaskr.backend.Backend.get_wiki_page") as mock_get_wiki_page:
+        second = client.get("/pages/test")
+
+    mock_get_wiki_page.assert_not_called()
+    assert second.data == first.data
+    assert (page_cache.hits, page_cache.misses) == (1, 1)
+
+
+def test_show_wiki_cache_keyed_by_version(app, client):
+    upload_page(app)
+    client.get("/pages/test")
+    upload_page(app, content=b"Women in STEM and beyond")
+
+    resp = client.get("/pages/test")
+
+    assert b"beyond" in resp.data
+    assert app.extensions["page_cache"].misses == 2
+
+
+def test_show_wiki_cached_per_language(app, client):
+    upload_page(app)
+    app.extensions["backend"].add_translations("Women", "Mujeres")
+
+    english = client.post("/pages/test", data={"lang": "EN"})
+    spanish = client.post("/pages/test", data={"lang": "ES"})
+    cached = client.post("/pages/test", data={"lang": "ES"})
+
+    assert b"Women in STEM" in english.data
+    assert b"Mujeres in STEM" in spanish.data
+    assert cached.data == spanish.data
+    assert app.extensions["page_cache"].hits == 1
+
+
+def test_show_wiki_cached_page_keeps_session(app, client):
+    upload_page(app)
+    client.get("/pages/test")
+
+    with client.session_transaction() as session:
+        session["username"] = "user"
+    resp = client.get("/pages/test")
+
+    assert b'id="editModal"' in resp.data
+    assert b'value="user"' in resp.data
+    assert app.extensions["page_cache"].hits == 1
+
+
 def test_page_not_found(client):
     resp = client.get("/random-page")
     assert resp.status_code == 404
@@ -482,3 +887,129 @@ def test_upload_translation(client):
     assert resp.request.path == "/translation"
     assert resp.status_code == 200
     assert b"Please enter new translations:" in resp.data
+
+
+@patch("flaskr.backend.Backend.add_translations_bulk", return_value=2)
+def test_upload_translation_post(mock_add, client):
+    with client.session_transaction() as session:
+        session["username"] = "user"
+
+    resp = client.post("/translation",
+                       data={
+                           "from": "English",
+                           "to": "Spanish",
+                           "word": "hello",
+                           "translation": "hola",
+                           "file": (io.BytesIO(b"women,mujeres"), "words.csv")
+                       })
+
+    assert resp.status_code == 200
+    assert b"Added 2 of 2 translations." in resp.data
+    mock_add.assert_called_once_with([("hello", "hola"), ("women", "mujeres")])
+
+
+@patch("flaskr.backend.Backend.add_translations_bulk", return_value=1)
+def test_upload_translation_post_from_spanish(mock_add, client):
+    with client.session_transaction() as session:
+        session["username"] = "user"
+
+    resp = client.post("/translation",
+                       data={
+                           "from": "Spanish",
+                           "to": "English",
+                           "word": "hola",
+                           "translation": "hello"
+                       })
+
+    assert resp.status_code == 200
+    mock_add.assert_called_once_with([("hello", "hola")])
+
+
+@patch("flaskr.backend.Backend.add_translations_bulk")
+def test_upload_translation_post_invalid_file(mock_add, client):
+    with client.session_transaction() as session:
+        session["username"] = "user"
+
+    resp = client.post("/translation",
+                       data={
+                           "from": "English",
+                           "to": "Spanish",
+                           "file": (io.BytesIO(b"hello"), "words.txt")
+                       })
+
+    assert resp.status_code == 400
+    assert b"Translation files must be .csv or .json" in resp.data
+    mock_add.assert_not_called()
+
+
+@patch("flaskr.backend.Backend.add_translations_bulk")
+def test_upload_translation_post_json_scalar(mock_add, client):
+    with client.session_transaction() as session:
+        session["username"] = "user"
+
+    resp = client.post("/translation",
+                       data={
+                           "from": "English",
+                           "to": "Spanish",
+                           "file": (io.BytesIO(b"42"), "words.json")
+                       })
+
+    assert resp.status_code == 400
+    mock_add.assert_not_called()
+
+
+@patch("flaskr.backend.Backend.edit_page_data",
+       side_effect=PreconditionFailed("page"))
+def test_edit_form_conflict(mock_edit, client):
+    with client.session_transaction() as session:
+        session["username"] = "user"
+
+    resp = client.post("/edit-form",
+                       data={
+                           "page-name": "test",
+                           "editor": "user",
+                           "content": "content"
+                       })
+
+    assert resp.status_code == 409
+    assert b"try again" in resp.data
+
+
+def test_edit_form_catalog_conflict(app, client):
+    backend = app.extensions["backend"]
+    backend.upload_file(
+        "test", "author",
+        werkzeug.datastructures.FileStorage(io.BytesIO(b"content"), "file.txt"),
+        "date")
+    with client.session_transaction() as session:
+        session["username"] = "user"
+
+    with patch.object(backend,
+                      "_update_page_catalog",
+                      side_effect=PreconditionFailed("catalog")):
+        resp = client.post("/edit-form",
+                           data={
+                               "page-name": "test",
+                               "editor": "user",
+                               "content": "edited content"
+                           })
+
+    assert resp.status_code == 302
+    assert len(backend.get_page_edits("test")) == 1
+    assert len(backend.get_user_edits("user")) == 1
+
+
+@patch("flaskr.backend.Backend.author_edit_action",
+       side_effect=PreconditionFailed("page"))
+def test_update_edit_conflict(mock_action, client):
+    with client.session_transaction() as session:
+        session["username"] = "user"
+
+    resp = client.post("/update-edit",
+                       data={
+                           "edit-page-name": "test",
+                           "edit-action": "Accept"
+                       })
+
+    assert resp.status_code == 409
+    assert b"try again" in resp.data
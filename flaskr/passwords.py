@@ -0,0 +1,150 @@
+from concurrent.futures import ProcessPoolExecutor
+import base64, hashlib, hmac, multiprocessing, os, threading
+
+# Stored hashes look like "scrypt$<n>$<r>$<p>$<salt>$<key>" (salt and key in base64),
+# so every hash records the parameters it was made with.
+HASH_SCHEME = "scrypt"
+SCRYPT_N = 2**14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+# Defaults of the hashing worker pool (PASSWORD_HASH_WORKERS and PASSWORD_HASH_QUEUE)
+HASH_WORKERS = 2
+HASH_QUEUE_LIMIT = 32
+
+
+class HasherBusy(Exception):
+    '''
+        Raised when a password cannot be hashed because too many hashes are already
+        queued. Callers should ask the user to try again later.
+    '''
+
+
+def derive_key(password, salt, n, r, p):
+    '''
+        Derive_key runs scrypt. It is a module level function so the worker processes
+        can run it.
+    '''
+    return hashlib.scrypt(password.encode("utf-8"),
+                          salt=salt,
+                          n=n,
+                          r=r,
+                          p=p,
+                          maxmem=256 * n * r,
+                          dklen=KEY_BYTES)
+
+
+def is_scrypt_hash(stored):
+    '''
+        Is_scrypt_hash returns True if stored was made by PasswordHasher, as opposed to a
+        legacy blake2b hash.
+    '''
+    return stored.startswith(HASH_SCHEME + "$")
+
+
+class PasswordHasher:
+    '''
+        PasswordHasher hashes passwords with scrypt and a random per-user salt.
+
+        scrypt is deliberately slow and memory hard, so the work runs in a pool of worker
+        processes instead of the request threads, which keep serving pages during login
+        bursts. At most max_queue hashes may be waiting or running; further requests fail
+        fast with HasherBusy instead of piling up.
+
+        Attributes:
+            n, r, p: scrypt cost parameters used for new hashes.
+            workers: number of worker processes. 0 hashes in the calling thread.
+            max_queue: maximum number of hashes waiting or running at once.
+    '''
+
+    def __init__(self,
+                 n=SCRYPT_N,
+                 r=SCRYPT_R,
+                 p=SCRYPT_P,
+                 workers=HASH_WORKERS,
+                 max_queue=HASH_QUEUE_LIMIT):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.workers = workers
+        self.max_queue = max_queue
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def hash(self, password):
+        '''
+            Hash returns the encoded scrypt hash of password with a new random salt.
+
+            Raises:
+                HasherBusy: if the hashing queue is full.
+        '''
+        salt = os.urandom(SALT_BYTES)
+        key = self._derive(password, salt, self.n, self.r, self.p)
+        return "$".join([
+            HASH_SCHEME,
+            str(self.n),
+            str(self.r),
+            str(self.p),
+            base64.b64encode(salt).decode("ascii"),
+            base64.b64encode(key).decode("ascii")
+        ])
+
+    def verify(self, password, stored):
+        '''
+            Verify returns True if password matches the encoded hash stored, using the
+            parameters recorded in it.
+
+            Raises:
+                HasherBusy: if the hashing queue is full.
+        '''
+        try:
+            scheme, n, r, p, salt, key = stored.split("$")
+            n, r, p = int(n), int(r), int(p)
+            salt, key = base64.b64decode(salt), base64.b64decode(key)
+        except ValueError:
+            return False
+        if scheme != HASH_SCHEME:
+            return False
+        return hmac.compare_digest(self._derive(password, salt, n, r, p), key)
+
+    def needs_rehash(self, stored):
+        '''
+            Needs_rehash returns True if stored is a legacy hash or was made with other
+            cost parameters than the current ones.
+        '''
+        if not is_scrypt_hash(stored):
+            return True
+        return stored.split("$")[1:4] != [str(self.n), str(self.r), str(self.p)]
+
+    def shutdown(self):
+        '''
+            Shutdown stops the worker processes.
+        '''
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _derive(self, password, salt, n, r, p):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            if not self.workers:
+                return derive_key(password, salt, n, r, p)
+            return self._pool().submit(derive_key, password, salt, n, r,
+                                       p).result()
+        finally:
+            self._slots.release()
+
+    def _pool(self):
+        with self._executor_lock:
+            if self._executor is None:
+                # Worker processes are spawned rather than forked: forking a process
+                # that runs request threads can copy locks held by other threads.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
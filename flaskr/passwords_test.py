@@ -0,0 +1,59 @@
+import pytest
+from flaskr.passwords import PasswordHasher, HasherBusy, is_scrypt_hash
+
+
+@pytest.fixture
+def hasher():
+    return PasswordHasher(n=16, workers=0)
+
+
+def test_hash_records_parameters(hasher):
+    stored = hasher.hash("abc")
+
+    scheme, n, r, p, salt, key = stored.split("$")
+    assert (scheme, n, r, p) == ("scrypt", "16", "8", "1")
+    assert is_scrypt_hash(stored)
+
+
+def test_hash_uses_new_salt(hasher):
+    assert hasher.hash("abc") != hasher.hash("abc")
+
+
+def test_verify(hasher):
+    stored = hasher.hash("abc")
+
+    assert hasher.verify("abc", stored)
+    assert not hasher.verify("abd", stored)
+
+
+def test_verify_uses_stored_parameters(hasher):
+    stored = PasswordHasher(n=32, r=4, workers=0).hash("abc")
+
+    assert hasher.verify("abc", stored)
+
+
+@pytest.mark.parametrize("stored", ["", "legacyhexdigest", "scrypt$16$8$1$!!$"])
+def test_verify_malformed(hasher, stored):
+    assert not hasher.verify("abc", stored)
+
+
+def test_needs_rehash(hasher):
+    assert not hasher.needs_rehash(hasher.hash("abc"))
+    assert hasher.needs_rehash(PasswordHasher(n=32, workers=0).hash("abc"))
+    assert hasher.needs_rehash("legacyhexdigest")
+
+
+def test_queue_limit():
+    hasher = PasswordHasher(n=16, workers=0, max_queue=0)
+
+    with pytest.raises(HasherBusy):
+        hasher.hash("abc")
+
+
+def test_worker_pool():
+    hasher = PasswordHasher(n=16, workers=1)
+    try:
+        stored = hasher.hash("abc")
+        assert hasher.verify("abc", stored)
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,93 @@
+from collections import OrderedDict
+import threading, time
+
+# Default admission limits of the rate limited routes (RATE_LIMITS config key). Each route
+# maps to a burst, the number of requests a client may make at once, and a rate, the
+# number of requests per second it gets back afterwards.
+RATE_LIMITS = {
+    "login": (10, 0.2),
+    "signup": (5, 0.05),
+    "createcard": (20, 0.5),
+}
+
+# Number of clients whose buckets are remembered per route (RATE_LIMIT_KEYS config key).
+RATE_LIMIT_KEYS = 10000
+
+
+class TokenBucketLimiter:
+    '''
+        TokenBucketLimiter is a thread safe token bucket rate limiter with one bucket per
+        key (for example a client IP or a username).
+
+        Every bucket holds up to burst tokens and refills at rate tokens per second; a
+        request takes one token from each of its keys' buckets and is rejected if any of
+        them is empty. Only the max_keys most recently seen keys are remembered, so the
+        limiter's memory stays bounded however many clients it sees; a forgotten key
+        starts again with a full bucket.
+
+        Attributes:
+            burst: size of every bucket.
+            rate: tokens per second added back to every bucket.
+            max_keys: number of buckets kept.
+            allowed: number of requests let through.
+            rejected: number of requests rejected.
+    '''
+
+    def __init__(self,
+                 burst,
+                 rate,
+                 max_keys=RATE_LIMIT_KEYS,
+                 clock=time.monotonic):
+        self.burst = burst
+        self.rate = rate
+        self.max_keys = max_keys
+        self.allowed = 0
+        self.rejected = 0
+        self._clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, keys):
+        '''
+            Allow takes a token from the bucket of every key if all of them have one.
+
+            Args:
+                keys: the keys the request is counted against.
+
+            Returns:
+                A tuple of whether the request is allowed and, if it is not, the number of
+                seconds until it would be.
+        '''
+        now = self._clock()
+        with self._lock:
+            levels = [self._level(key, now) for key in keys]
+            if all(level >= 1 for level in levels):
+                for key, level in zip(keys, levels):
+                    self._buckets[key] = (level - 1, now)
+                self.allowed += 1
+                return True, 0
+            for key, level in zip(keys, levels):
+                self._buckets[key] = (level, now)
+            self.rejected += 1
+            wait = max(1 - level for level in levels)
+            return False, wait / self.rate if self.rate else float("inf")
+
+    def stats(self):
+        '''
+            Stats returns the limiter's counters as a dictionary.
+        '''
+        with self._lock:
+            return {
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+                "keys": len(self._buckets)
+            }
+
+    def _level(self, key, now):
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            while len(self._buckets) >= self.max_keys:
+                self._buckets.popitem(last=False)
+            return self.burst
+        tokens, updated = bucket
+        return min(self.burst, tokens + (now - updated) * self.rate)
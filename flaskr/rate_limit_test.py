@@ -0,0 +1,46 @@
+import pytest
+from flaskr.rate_limit import TokenBucketLimiter
+
+
+def test_allows_burst(clock):
+    limiter = TokenBucketLimiter(3, 1, clock=clock)
+
+    results = [limiter.allow(["a"])[0] for _ in range(4)]
+
+    assert results == [True, True, True, False]
+    assert limiter.stats() == {"allowed": 3, "rejected": 1, "keys": 1}
+
+
+def test_refills(clock):
+    limiter = TokenBucketLimiter(1, 0.5, clock=clock)
+    limiter.allow(["a"])
+
+    assert limiter.allow(["a"]) == (False, 2)
+    clock.now = 2
+    assert limiter.allow(["a"]) == (True, 0)
+
+
+def test_keys_are_independent(clock):
+    limiter = TokenBucketLimiter(1, 1, clock=clock)
+
+    assert limiter.allow(["a"])[0]
+    assert limiter.allow(["b"])[0]
+    assert not limiter.allow(["a"])[0]
+
+
+def test_rejection_takes_no_token(clock):
+    limiter = TokenBucketLimiter(1, 1, clock=clock)
+    limiter.allow([("ip", "1.2.3.4")])
+
+    assert not limiter.allow([("ip", "1.2.3.4"), ("user", "ada")])[0]
+    assert limiter.allow([("ip", "5.6.7.8"), ("user", "ada")])[0]
+
+
+def test_max_keys(clock):
+    limiter = TokenBucketLimiter(1, 1, max_keys=2, clock=clock)
+    for key in ["a", "b", "c"]:
+        limiter.allow([key])
+
+    assert limiter.stats()["keys"] == 2
+    assert limiter.allow(["a"])[0]
+    assert not limiter.allow(["c"])[0]
@@ -0,0 +1,202 @@
+import csv, io, json, re, threading, time
+
+# Words are runs of letters/digits, optionally joined by apostrophes or hyphens
+# ("don't", "state-of-the-art"). Everything between words is kept as-is.
+WORD_PATTERN = re.compile(r"\w+(?:['’-]\w+)*")
+
+# First-row cells recognised as a CSV header rather than a translation.
+CSV_HEADER_NAMES = {"word", "english", "en"}
+
+# Trie key marking the end of a dictionary phrase. Words are never empty, so it
+# cannot clash with a word key.
+PHRASE_END = ""
+
+
+class Translator:
+    '''
+        Translator is a compiled form of a translation dictionary.
+
+        Dictionary keys are split into words and stored in a word trie, so a page is
+        translated in one left-to-right pass: at each word the longest dictionary phrase
+        starting there is replaced by its translation, and whitespace and punctuation
+        around it are copied from the original content. Words of a multi-word phrase
+        must be separated by whitespace only.
+
+        The work per word is bounded by the length (in words) of the longest phrase, so
+        translation time grows linearly with the page, independent of dictionary size.
+    '''
+
+    def __init__(self, dictionary):
+        self._trie = {}
+        for phrase, translation in dictionary.items():
+            words = WORD_PATTERN.findall(phrase)
+            if not words:
+                continue
+            node = self._trie
+            for word in words:
+                node = node.setdefault(word, {})
+            node[PHRASE_END] = translation
+
+    def translate(self, content):
+        '''
+            Translate returns content with every dictionary phrase replaced.
+
+            Args:
+                content: text to translate.
+
+            Returns:
+                The translated text.
+        '''
+        words = list(WORD_PATTERN.finditer(content))
+        pieces = []
+        copied = 0
+        i = 0
+        while i < len(words):
+            node = self._trie
+            match = None
+            j = i
+            while j < len(words) and words[j].group() in node:
+                if j > i and not content[words[j - 1].end():words[j].start(
+                )].isspace():
+                    break
+                node = node[words[j].group()]
+                j += 1
+                if PHRASE_END in node:
+                    match = (j, node[PHRASE_END])
+
+            if match is None:
+                i += 1
+                continue
+
+            end, translation = match
+            pieces.append(content[copied:words[i].start()])
+            pieces.append(translation)
+            copied = words[end - 1].end()
+            i = end
+
+        pieces.append(content[copied:])
+        return "".join(pieces)
+
+
+class TranslationCache:
+    '''
+        TranslationCache keeps the parsed translation dictionary of one blob in memory,
+        together with the Translator compiled from it.
+
+        The dictionary is downloaded once and then revalidated with a metadata-only stat
+        call at most every refresh_interval seconds; it is downloaded again only when the
+        blob's generation has changed. Writers in this process call invalidate() so their
+        changes are visible on the next lookup.
+
+        Attributes:
+            store: BlobStore holding the dictionary.
+            key: key of the dictionary blob (for example "translations/en-es.json").
+            refresh_interval: seconds between generation checks.
+    '''
+
+    def __init__(self, store, key, refresh_interval=30, clock=time.monotonic):
+        self.store = store
+        self.key = key
+        self.refresh_interval = refresh_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data = None
+        self._translator = None
+        self._generation = 0
+        self._checked_at = None
+
+    def get(self):
+        '''
+            Get returns the current dictionary and its generation, refreshing them first
+            if the cached copy is missing or due for revalidation.
+
+            Returns:
+                A tuple of the dictionary and the generation of the blob it was read from
+                (0 if the blob does not exist).
+        '''
+        with self._lock:
+            self._refresh()
+            return self._data, self._generation
+
+    def get_translator(self):
+        '''
+            Get_translator returns the Translator compiled from the current dictionary and
+            the dictionary's generation. The Translator is only rebuilt when the dictionary
+            changes.
+        '''
+        with self._lock:
+            self._refresh()
+            return self._translator, self._generation
+
+    def invalidate(self):
+        '''
+            Invalidate drops the cached dictionary so the next get() downloads it again.
+        '''
+        with self._lock:
+            self._data = None
+            self._checked_at = None
+
+    def _refresh(self):
+        now = self._clock()
+        if self._data is None:
+            self._load()
+        elif now - self._checked_at >= self.refresh_interval:
+            info = self.store.stat(self.key)
+            generation = info.generation if info else 0
+            if generation != self._generation:
+                self._load()
+        self._checked_at = now
+
+    def _load(self):
+        data, generation = self.store.get_json(self.key)
+        self._data = data if data is not None else {}
+        self._generation = generation
+        self._translator = Translator(self._data)
+
+
+def parse_translation_file(filename, data):
+    '''
+        Parse_translation_file reads translation pairs from an uploaded file.
+
+        A .json file holds either an object mapping words to translations or a list of
+        [word, translation] pairs. A .csv file holds one "word,translation" row per pair,
+        optionally preceded by a header row such as "english,spanish".
+
+        Args:
+            filename: name of the uploaded file, used to pick the format.
+            data: the file's bytes.
+
+        Returns:
+            A list of (word, translation) tuples.
+
+        Raises:
+            ValueError: if the file type is not supported or a row is malformed.
+    '''
+    text = data.decode("utf-8-sig")
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+
+    if extension == "json":
+        value = json.loads(text)
+        if not isinstance(value, (dict, list)):
+            raise ValueError(
+                "Translation files must hold an object or a list of pairs")
+        rows = value.items() if isinstance(value, dict) else value
+    elif extension == "csv":
+        rows = list(csv.reader(io.StringIO(text)))
+        if rows and rows[0] and rows[0][0].strip().lower() in CSV_HEADER_NAMES:
+            rows = rows[1:]
+    else:
+        raise ValueError("Translation files must be .csv or .json")
+
+    pairs = []
+    for number, row in enumerate(rows, start=1):
+        if not row:
+            continue
+        if not isinstance(row, (list, tuple)) or len(row) != 2 or not all(
+                isinstance(cell, str) for cell in row):
+            raise ValueError(
+                f"Row {number} must hold a word and its translation")
+        word, translation = row[0].strip(), row[1].strip()
+        if word and translation:
+            pairs.append((word, translation))
+    return pairs
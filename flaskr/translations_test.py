@@ -0,0 +1,138 @@
+import pytest
+from flaskr.translations import TranslationCache, Translator, parse_translation_file
+from flaskr.blobstore import LocalBlobStore
+from unittest.mock import MagicMock
+
+KEY = "translations/en-es.json"
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MagicMock(wraps=LocalBlobStore(tmp_path))
+    store.put_json(KEY, {"hello": "hola"})
+    store.reset_mock()
+    return store
+
+
+def test_cache_downloads_once(store, clock):
+    cache = TranslationCache(store, KEY, refresh_interval=30, clock=clock)
+
+    first, generation = cache.get()
+    clock.now = 10
+    second, _ = cache.get()
+
+    assert first == second == {"hello": "hola"}
+    assert generation > 0
+    store.get_json.assert_called_once_with(KEY)
+    store.stat.assert_not_called()
+
+
+def test_cache_revalidates_by_generation(store, clock):
+    cache = TranslationCache(store, KEY, refresh_interval=30, clock=clock)
+    cache.get()
+
+    clock.now = 30
+    assert cache.get()[0] == {"hello": "hola"}
+    store.stat.assert_called_once_with(KEY)
+    store.get_json.assert_called_once()
+
+    store.put_json(KEY, {"hello": "buenas"})
+    clock.now = 60
+    assert cache.get()[0] == {"hello": "buenas"}
+    assert store.get_json.call_count == 2
+
+
+def test_cache_invalidate(store, clock):
+    cache = TranslationCache(store, KEY, refresh_interval=30, clock=clock)
+    cache.get()
+
+    store.put_json(KEY, {"hello": "buenas"})
+    cache.invalidate()
+
+    assert cache.get()[0] == {"hello": "buenas"}
+
+
+def test_cache_missing_blob(tmp_path):
+    cache = TranslationCache(LocalBlobStore(tmp_path), KEY)
+
+    assert cache.get() == ({}, 0)
+
+
+@pytest.mark.parametrize("content,expected", [
+    pytest.param("Women in STEM", "Mujeres en STEM", id="single words"),
+    pytest.param("She studied computer science.",
+                 "She studied ciencias de la computación.",
+                 id="phrase keeps punctuation"),
+    pytest.param("computer  labs\n\nin   science",
+                 "computadora  labs\n\nen   ciencia",
+                 id="keeps whitespace"),
+    pytest.param("computer, science",
+                 "computadora, ciencia",
+                 id="phrase words must be separated by whitespace only"),
+    pytest.param("", "", id="empty content"),
+])
+def test_translator(content, expected):
+    translator = Translator({
+        "Women": "Mujeres",
+        "in": "en",
+        "computer": "computadora",
+        "science": "ciencia",
+        "computer science": "ciencias de la computación",
+    })
+
+    assert translator.translate(content) == expected
+
+
+def test_translator_longest_match_falls_back():
+    translator = Translator({
+        "New": "Nueva",
+        "New York City": "Ciudad de Nueva York",
+    })
+
+    assert translator.translate("New York") == "Nueva York"
+    assert translator.translate("New York City") == "Ciudad de Nueva York"
+
+
+def test_cache_rebuilds_translator_on_change(store, clock):
+    cache = TranslationCache(store, KEY, refresh_interval=30, clock=clock)
+
+    translator, _ = cache.get_translator()
+    assert cache.get_translator()[0] is translator
+
+    store.put_json(KEY, {"hello": "buenas"})
+    clock.now = 30
+    assert cache.get_translator()[0].translate("hello") == "buenas"
+
+
+@pytest.mark.parametrize("filename,data,expected", [
+    pytest.param("words.json",
+                 b'{"hello": "hola", "women": "mujeres"}',
+                 [("hello", "hola"), ("women", "mujeres")],
+                 id="json object"),
+    pytest.param("words.json",
+                 b'[["hello", "hola"]]', [("hello", "hola")],
+                 id="json pairs"),
+    pytest.param("words.CSV",
+                 b"english,spanish\nhello, hola\n\nwomen,mujeres\n",
+                 [("hello", "hola"), ("women", "mujeres")],
+                 id="csv with header"),
+    pytest.param(
+        "words.csv",
+        b"\xef\xbb\xbfcomputer science,ciencias de la computaci\xc3\xb3n",
+        [("computer science", "ciencias de la computación")],
+        id="csv with byte order mark"),
+])
+def test_parse_translation_file(filename, data, expected):
+    assert parse_translation_file(filename, data) == expected
+
+
+@pytest.mark.parametrize("filename,data", [
+    pytest.param("words.txt", b"hello,hola", id="unsupported type"),
+    pytest.param("words.csv", b"hello,hola,extra", id="too many columns"),
+    pytest.param("words.json", b'[["hello"]]', id="missing translation"),
+    pytest.param("words.json", b'42', id="json scalar"),
+    pytest.param("words.json", b'[1, 2]', id="json scalar rows"),
+])
+def test_parse_translation_file_invalid(filename, data):
+    with pytest.raises(ValueError):
+        parse_translation_file(filename, data)
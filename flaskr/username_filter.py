@@ -0,0 +1,184 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib, math, threading, time
+
+# Defaults of the username filter (USERNAME_FILTER_* config keys): the false positive rate
+# it is sized for, its memory budget in bytes and the seconds between rebuilds.
+FILTER_FP_RATE = 0.01
+FILTER_MAX_BYTES = 1024 * 1024
+FILTER_REFRESH_SECONDS = 60
+
+# Room left for sign ups between rebuilds: filters are sized for twice the users listed,
+# and at least MIN_FILTER_CAPACITY.
+FILTER_HEADROOM = 2
+MIN_FILTER_CAPACITY = 1024
+
+
+class BloomFilter:
+    '''
+        BloomFilter is a set of strings that may answer "maybe present" for an absent
+        string, but never "absent" for an added one.
+
+        It is sized for capacity strings at a false positive rate of fp_rate, using at most
+        max_bytes bytes; if that is not enough for the requested rate, the budget is used
+        and the rate gets worse.
+    '''
+
+    def __init__(self, capacity, fp_rate, max_bytes=FILTER_MAX_BYTES):
+        bits = math.ceil(-capacity * math.log(fp_rate) / math.log(2)**2)
+        bits = max(8, min(bits, max_bytes * 8))
+        self.size = bits
+        self.hash_count = max(1, round(bits / capacity * math.log(2)))
+        self._bits = bytearray(math.ceil(bits / 8))
+
+    def add(self, item):
+        '''
+            Add adds item to the filter.
+        '''
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(item))
+
+    def byte_size(self):
+        '''
+            Byte_size returns the memory used by the filter's bits.
+        '''
+        return len(self._bits)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return (
+            (first + i * second) % self.size for i in range(self.hash_count))
+
+
+class UsernameFilter:
+    '''
+        UsernameFilter keeps a BloomFilter of the existing usernames, so sign in attempts for
+        unknown names can be rejected without a storage round trip.
+
+        The filter is built from a listing of the users folder when it is first used, and
+        rebuilt at most every refresh_interval seconds after that. Rebuilds run in the
+        background and the new filter is swapped in when the listing is done. Sign ups in
+        this process are added right away (to both filters during a rebuild).
+
+        Accounts created by other processes are missing from the filter until the next
+        rebuild, so once the filter is older than refresh_interval (or while it is being
+        rebuilt) it only answers "may exist": a new account's sign in is at most delayed
+        by a storage read, never turned away.
+
+        Attributes:
+            store: BlobStore holding the users.
+            prefix: folder of the user objects (for example "users-data/").
+            fp_rate: false positive rate the filter is sized for.
+            max_bytes: memory budget of the filter.
+            refresh_interval: seconds between rebuilds.
+            rejections: number of lookups answered "absent" by the filter.
+    '''
+
+    def __init__(self,
+                 store,
+                 prefix,
+                 fp_rate=FILTER_FP_RATE,
+                 max_bytes=FILTER_MAX_BYTES,
+                 refresh_interval=FILTER_REFRESH_SECONDS,
+                 clock=time.monotonic):
+        self.store = store
+        self.prefix = prefix
+        self.fp_rate = fp_rate
+        self.max_bytes = max_bytes
+        self.refresh_interval = refresh_interval
+        self.rejections = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._filter = None
+        self._built_at = None
+        self._rebuilding = False
+        self._added = None
+
+    def might_exist(self, username):
+        '''
+            Might_exist returns False if username certainly has no account, True if it may
+            have one.
+        '''
+        bloom, fresh = self._current_filter()
+        with self._lock:
+            if not fresh or username in bloom:
+                return True
+            self.rejections += 1
+            return False
+
+    def add(self, username):
+        '''
+            Add records a new account, so it is found before the next rebuild.
+        '''
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(username)
+            if self._added is not None:
+                self._added.append(username)
+
+    def wait_for_rebuild(self):
+        '''
+            Wait_for_rebuild blocks until a background rebuild that was already started is
+            done.
+        '''
+        self._executor.submit(lambda: None).result()
+
+    def stats(self):
+        '''
+            Stats returns the filter's counters and size as a dictionary.
+        '''
+        with self._lock:
+            return {
+                "rejections": self.rejections,
+                "bytes": self._filter.byte_size() if self._filter else 0
+            }
+
+    def _current_filter(self):
+        with self._lock:
+            if self._filter is not None:
+                stale = self._clock() - self._built_at >= self.refresh_interval
+                if stale and not self._rebuilding:
+                    self._rebuilding = True
+                    self._executor.submit(self._build)
+                return self._filter, not (stale or self._rebuilding)
+        # Nothing to answer with yet: the first build runs on the caller's thread.
+        self._build()
+        with self._lock:
+            return self._filter, True
+
+    def _build(self):
+        with self._build_lock:
+            with self._lock:
+                if self._filter is not None and not self._rebuilding:
+                    return
+                started = self._clock()
+                self._added = []
+            try:
+                usernames = [
+                    blob.name.removeprefix(self.prefix)
+                    for blob in self.store.list(self.prefix)
+                ]
+            except Exception:
+                with self._lock:
+                    self._rebuilding = False
+                    self._added = None
+                raise
+            capacity = max(MIN_FILTER_CAPACITY,
+                           FILTER_HEADROOM * len(usernames))
+            bloom = BloomFilter(capacity, self.fp_rate, self.max_bytes)
+            for username in usernames:
+                bloom.add(username)
+            with self._lock:
+                for username in self._added:
+                    bloom.add(username)
+                self._filter = bloom
+                self._built_at = started
+                self._rebuilding = False
+                self._added = None
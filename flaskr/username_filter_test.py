@@ -0,0 +1,116 @@
+import pytest, threading
+from unittest.mock import patch
+from flaskr.blobstore import LocalBlobStore
+from flaskr.username_filter import BloomFilter, UsernameFilter
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalBlobStore(tmp_path)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(100, 0.01)
+    names = [f"user{i}" for i in range(100)]
+    for name in names:
+        bloom.add(name)
+
+    assert all(name in bloom for name in names)
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom.add(f"user{i}")
+
+    false_positives = sum(f"other{i}" in bloom for i in range(10000))
+
+    assert false_positives < 300
+
+
+def test_bloom_filter_memory_budget():
+    bloom = BloomFilter(1000000, 0.001, max_bytes=1024)
+
+    assert bloom.byte_size() == 1024
+
+
+def test_username_filter(store):
+    store.put_text("users-data/yvette", "hash")
+    usernames = UsernameFilter(store, "users-data/")
+
+    assert usernames.might_exist("yvette")
+    assert not usernames.might_exist("mayo")
+    assert usernames.stats()["rejections"] == 1
+
+
+def test_username_filter_add(store):
+    usernames = UsernameFilter(store, "users-data/")
+    usernames.might_exist("yvette")
+
+    usernames.add("yvette")
+
+    assert usernames.might_exist("yvette")
+
+
+def test_username_filter_rebuilds(store, clock):
+    usernames = UsernameFilter(store,
+                               "users-data/",
+                               refresh_interval=60,
+                               clock=clock)
+    assert not usernames.might_exist("yvette")
+
+    store.put_text("users-data/yvette", "hash")
+    assert not usernames.might_exist("yvette")
+    clock.now = 60
+    assert usernames.might_exist("yvette")
+    usernames.wait_for_rebuild()
+    assert usernames.might_exist("yvette")
+    assert not usernames.might_exist("mayo")
+
+
+def test_username_filter_rebuilds_in_background(store, clock):
+    usernames = UsernameFilter(store,
+                               "users-data/",
+                               refresh_interval=60,
+                               clock=clock)
+    usernames.might_exist("yvette")
+    store.put_text("users-data/yvette", "hash")
+    listing = threading.Event()
+    release = threading.Event()
+    list_users = store.list
+
+    def slow_list(prefix):
+        listing.set()
+        release.wait()
+        return list_users(prefix)
+
+    clock.now = 60
+    with patch.object(store, "list", side_effect=slow_list):
+        assert usernames.might_exist("yvette")
+        listing.wait()
+        assert usernames.might_exist("ada")
+        usernames.add("mayo")
+        release.set()
+        usernames.wait_for_rebuild()
+
+    assert usernames.might_exist("yvette")
+    assert usernames.might_exist("mayo")
+    assert not usernames.might_exist("ada")
+
+
+def test_username_filter_rebuild_failure(store, clock):
+    usernames = UsernameFilter(store,
+                               "users-data/",
+                               refresh_interval=60,
+                               clock=clock)
+    usernames.might_exist("yvette")
+    store.put_text("users-data/yvette", "hash")
+
+    clock.now = 60
+    with patch.object(store, "list", side_effect=OSError):
+        assert usernames.might_exist("yvette")
+        usernames.wait_for_rebuild()
+    usernames.might_exist("yvette")
+    usernames.wait_for_rebuild()
+
+    assert usernames.might_exist("yvette")